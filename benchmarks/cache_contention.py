@@ -0,0 +1,59 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import argparse
+import time
+from threading import Thread, Barrier
+from typing import List
+from splitter.cache import SplitCache
+from splitter.split_record import SplitRecord
+
+
+"""Measures split cache throughput with many threads hammering cache hits at once, comparing a single
+stripe (one global lock) against a striped cache.  Run from the project root:
+
+    python -m benchmarks.cache_contention --threads 1 4 16 64 --stripes 1 16"""
+
+
+def run(stripes: int, thread_count: int, keys: List[str], gets_per_thread: int) -> float:
+    """Returns cache hits per second across all threads."""
+    cache = SplitCache(max_cache_items=len(keys) * 2, stripes=stripes)
+    for key in keys:
+        cache.set_item(key, SplitRecord(key, key, 0.0))
+    barrier = Barrier(thread_count + 1)
+
+    def worker(offset: int) -> None:
+        barrier.wait()
+        key_count = len(keys)
+        for i in range(gets_per_thread):
+            cache.get_item(keys[(offset + i) % key_count])
+
+    threads = [Thread(target=worker, args=(i * 7919,)) for i in range(thread_count)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (thread_count * gets_per_thread) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Split cache lock contention benchmark.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--stripes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--gets", type=int, default=50000, help="gets per thread")
+    args = parser.parse_args()
+
+    keys = [f"key{i}" for i in range(args.keys)]
+    print(f"{'threads':>8} " + " ".join(f"{'stripes=' + str(s):>14}" for s in args.stripes) + "   (hits/sec)")
+    for thread_count in args.threads:
+        rates = [run(s, thread_count, keys, args.gets) for s in args.stripes]
+        print(f"{thread_count:>8} " + " ".join(f"{r:>14,.0f}" for r in rates))
+
+
+if __name__ == "__main__":
+    main()
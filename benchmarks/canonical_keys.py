@@ -0,0 +1,62 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import argparse
+from typing import List, Callable
+from splitter.cache import SplitCache
+from splitter.dictionary import Dictionary
+from splitter.split_record import SplitRecord
+from splitter.word_splitter import Splitter
+
+
+"""Replays a corpus of inputs (one per line, first tab-separated column) through a split cache, comparing the hit
+rate of keys on the normalized input alone against canonical keys, which ignore punctuation differences.  Only
+keys are simulated, so no dictionary is loaded.  Run from the project root:
+
+    python -m benchmarks.canonical_keys corpus.txt --cache-items 100000"""
+
+
+def load_inputs(filename: str) -> List[str]:
+    """Loads corpus inputs, normalized as the splitter does."""
+    inputs: List[str] = []
+    with open(filename, "rt") as f:
+        for line in f:
+            input_ = line.rstrip("\r\n").split("\t")[0].strip().lower()
+            if input_:
+                inputs.append(input_)
+    return inputs
+
+
+def hit_rate(inputs: List[str], cache_items: int, key: Callable[[str], str]) -> float:
+    """Returns the percent of inputs found in the cache, adding each miss."""
+    cache = SplitCache(max_cache_items=cache_items)
+    hits = 0
+    for input_ in inputs:
+        k = key(input_)
+        if cache.get_item(k) is not None:
+            hits += 1
+        else:
+            cache.set_item(k, SplitRecord(k, "", 0.0))
+    return (float(hits) / float(len(inputs))) * 100.0 if inputs else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Canonical cache key hit rate benchmark.")
+    parser.add_argument("corpus", help="file of inputs, one per line")
+    parser.add_argument("--cache-items", type=int, default=100000)
+    args = parser.parse_args()
+
+    inputs = load_inputs(args.corpus)
+    splitter = Splitter(dictionary=Dictionary(), cache=SplitCache(max_cache_items=0))
+    exact = hit_rate(inputs, args.cache_items, lambda x: x)
+    canonical = hit_rate(inputs, args.cache_items, splitter.canonical_input)
+    print(f"inputs:           {len(inputs):,}")
+    print(f"unique exact:     {len(set(inputs)):,}")
+    print(f"unique canonical: {len(set(splitter.canonical_input(x) for x in inputs)):,}")
+    print(f"exact keys:       {exact:.1f}% hits")
+    print(f"canonical keys:   {canonical:.1f}% hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import argparse
+import asyncio
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+"""Measures how a running service copes with many concurrent connections: while holding a number of idle keep-alive
+connections open (as slow or quiet clients would), a set of active connections send requests back to back, and
+request throughput and latency are reported.  A thread-per-connection server degrades as idle connections pile up,
+where an event loop server shouldn't.  Start each server, then run against it from the project root, e.g.:
+
+    python pycentipede.py                                           # Flask development server, port 5000
+    uvicorn service.asgi:app --port 5001 --no-access-log            # ASGI app
+
+    python -m benchmarks.connection_scaling http://localhost:5000/wordsplit?input=thisisatest --idle 0 100 1000
+    python -m benchmarks.connection_scaling http://localhost:5001/wordsplit?input=thisisatest --idle 0 100 1000"""
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, target: str, host: str) -> bool:
+    """Sends a keep-alive GET request and reads the response.  Returns true if the connection can be reused."""
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed.")
+    length = -1
+    chunked = False
+    keep_alive = status_line.startswith(b"HTTP/1.1")
+    while True:
+        line = (await reader.readline()).strip().lower()
+        if not line:
+            break
+        name, _, value = line.partition(b":")
+        value = value.strip()
+        if name == b"content-length":
+            length = int(value)
+        elif (name == b"transfer-encoding") and (value == b"chunked"):
+            chunked = True
+        elif name == b"connection":
+            keep_alive = value == b"keep-alive"
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip().split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length >= 0:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        keep_alive = False
+    return keep_alive
+
+
+async def active_client(host: str, port: int, target: str, deadline: float, latencies: List[float]) -> Tuple[int, int]:
+    """Sends requests until the deadline, reconnecting whenever the server closes the connection.  Returns the
+    number of errors and connections opened."""
+    errors = 0
+    connections = 0
+    reader: Optional[asyncio.StreamReader] = None
+    writer: Optional[asyncio.StreamWriter] = None
+    while time.perf_counter() < deadline:
+        try:
+            if (reader is None) or (writer is None):
+                reader, writer = await asyncio.open_connection(host, port)
+                connections += 1
+            start = time.perf_counter()
+            keep_alive = await request(reader, writer, target, host)
+            latencies.append(time.perf_counter() - start)
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+    return errors, connections
+
+
+async def idle_client(host: str, port: int, target: str, ready: asyncio.Event, done: asyncio.Event) -> bool:
+    """Opens a connection, makes one request, then holds the connection open and idle.  Returns true if the server
+    kept the connection open throughout."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        ready.set()
+        return False
+    try:
+        keep_alive = await request(reader, writer, target, host)
+    except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+        keep_alive = False
+    ready.set()
+    if keep_alive:
+        await done.wait()
+    held = keep_alive and not reader.at_eof()
+    writer.close()
+    return held
+
+
+async def run(url: str, idle: int, active: int, seconds: float) -> None:
+    """Runs one measurement and prints a result line."""
+    parts = urlsplit(url)
+    host = parts.hostname or "localhost"
+    port = parts.port or 80
+    target = parts.path + ("?" + parts.query if parts.query else "")
+    done = asyncio.Event()
+    idle_tasks = []
+    for _ in range(idle):
+        ready = asyncio.Event()
+        idle_tasks.append(asyncio.ensure_future(idle_client(host, port, target, ready, done)))
+        await asyncio.wait([asyncio.ensure_future(ready.wait())], timeout=1.0)
+    latencies: List[float] = []
+    deadline = time.perf_counter() + seconds
+    outcomes = await asyncio.gather(*[active_client(host, port, target, deadline, latencies) for _ in range(active)])
+    done.set()
+    held = sum(1 for r in await asyncio.gather(*idle_tasks) if r)
+    errors = sum(o[0] for o in outcomes)
+    connections = sum(o[1] for o in outcomes)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000.0 if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000.0 if latencies else 0.0
+    print(f"{idle:>6,} {held:>6,} {active:>6,} {len(latencies) / seconds:>10,.0f} {p50:>9.2f} {p99:>9.2f} {errors:>7,} {connections:>7,}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Connection scaling benchmark.")
+    parser.add_argument("url", help="request URL, e.g. http://localhost:5000/wordsplit?input=thisisatest")
+    parser.add_argument("--idle", type=int, nargs="+", default=[0, 100, 1000], help="idle keep-alive connections to hold open")
+    parser.add_argument("--active", type=int, default=16, help="connections sending requests")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'idle':>6} {'held':>6} {'active':>6} {'req/sec':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'connects':>7}")
+    for idle in args.idle:
+        asyncio.run(run(args.url, idle, args.active, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import argparse
+import time
+from typing import List
+from splitter.cache import SplitCache
+from splitter.dictionary import Dictionary
+from splitter.split_result import SplitResult
+from splitter.word_splitter import Splitter
+from service.command_writer import VerbosityLevel
+from service import command_writer
+from utils import json_writer
+
+
+"""Times writing 'wordsplit' JSON responses for a large batch of High verbosity results (every pass and matched
+term), indented and compact.  Inputs are split once up front, so only serialization is timed.  Run from the project
+root:
+
+    python -m benchmarks.json_serialization dictionary.txt corpus.txt --results 1000"""
+
+
+def load_results(dictionary_file: str, corpus_file: str, count: int) -> List[SplitResult]:
+    """Splits inputs from the corpus (one per line, first tab-separated column), repeating it to reach the count."""
+    dictionary = Dictionary()
+    dictionary.load_data(dictionary_file)
+    splitter = Splitter(dictionary=dictionary, cache=SplitCache(max_cache_items=0))
+    with open(corpus_file, "rt") as f:
+        inputs = [s for s in (line.rstrip("\r\n").split("\t")[0].strip() for line in f) if s]
+    return [splitter.full_split(input_=inputs[i % len(inputs)], pass_display=5) for i in range(count)]
+
+
+def run(results: List[SplitResult], pretty: bool, repeats: int) -> None:
+    """Writes the response repeatedly and prints a result line."""
+    inputs = [r.input for r in results]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        response = command_writer.word_split(VerbosityLevel.High, inputs, 5, False, None, None, results, 0, [], pretty)
+    elapsed = (time.perf_counter() - start) / repeats
+    print(f"{'indented' if pretty else 'compact':<10} {elapsed * 1000.0:>10.2f} {len(response.encode('utf-8')):>12,} "
+          f"{len(response.encode('utf-8')) / elapsed / 1048576.0:>8.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON serialization benchmark.")
+    parser.add_argument("dictionary", help="dictionary file")
+    parser.add_argument("corpus", help="file of inputs, one per line")
+    parser.add_argument("--results", type=int, default=1000, help="results per response")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    results = load_results(args.dictionary, args.corpus, args.results)
+    print(f"encoder: {'orjson' if json_writer.orjson is not None else 'json'}, results: {len(results):,}")
+    print(f"{'format':<10} {'ms':>10} {'bytes':>12} {'MB/s':>8}")
+    run(results, True, args.repeats)
+    run(results, False, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import argparse
+from typing import List, Dict, Set, Tuple, Optional
+from splitter.dictionary import Dictionary
+from splitter.cache import SplitCache
+from splitter.word_splitter import Splitter
+from splitter.pyahocorasick import Trie
+from splitter.term import Term
+from utils.text_file import open_text
+
+
+"""Offline tool that replays a query corpus through the splitter, counting how often each dictionary term is
+matched and how often it is part of the winning pass.  Multi-word terms whose value can't beat the average
+of their own words are flagged as dominated.  Terms that never win and are dominated (or, optionally, never
+win despite being matched) are removed, and a pruned dictionary is written along with a report of index
+size and accuracy before and after.
+
+The corpus has one query per line.  A line can optionally contain the expected output after a tab, which
+allows accuracy to be measured, e.g. "thisisatest<tab>this is a test"."""
+
+
+class ReplayStats:
+    """Match and win counts collected from a single replay of the corpus."""
+
+    def __init__(self) -> None:
+        """Class constructor."""
+        self.matched: Dict[str, int] = {}
+        self.won: Dict[str, int] = {}
+        self.outputs: List[str] = []
+        self.queries: int = 0
+        self.correct: int = 0
+        self.graded: int = 0
+        self.matched_terms_sum: int = 0
+
+    @property
+    def accuracy_percent(self) -> float:
+        """Percentage of graded queries where the output matched the expected output."""
+        if self.graded == 0:
+            return 0.0
+        return round((float(self.correct) / float(self.graded)) * 100.0, 2)
+
+    @property
+    def matched_terms_avg(self) -> float:
+        """Average number of matched terms (the max_terms budget) used per query."""
+        if self.queries == 0:
+            return 0.0
+        return round(float(self.matched_terms_sum) / float(self.queries), 2)
+
+
+def load_corpus(filename: str) -> List[Tuple[str, Optional[str]]]:
+    """Loads corpus queries, with optional expected outputs."""
+    corpus: List[Tuple[str, Optional[str]]] = []
+    with open(filename, "rt") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line.strip():
+                continue
+            split = line.split("\t")
+            corpus.append((split[0].strip().lower(), split[1].strip().lower() if len(split) > 1 else None))
+    return corpus
+
+
+def replay(dictionary: Dictionary, corpus: List[Tuple[str, Optional[str]]], max_terms: int, max_passes: int) -> ReplayStats:
+    """Runs every corpus query through the splitter, counting matched and winning terms."""
+    splitter = Splitter(dictionary=dictionary, cache=SplitCache(max_cache_items=1))
+    stats = ReplayStats()
+    for input_, expected in corpus:
+        result = splitter.full_split(input_, False, 1, max_terms, max_passes)
+        stats.queries += 1
+        stats.matched_terms_sum += len(result.matched_terms)
+        stats.outputs.append(result.output)
+        for term in result.matched_terms:
+            stats.matched[term.full] = stats.matched.get(term.full, 0) + 1
+        if result.passes:
+            for split in result.passes[0].splits:
+                if split.matched:
+                    stats.won[split.text] = stats.won.get(split.text, 0) + 1
+        if expected is not None:
+            stats.graded += 1
+            if result.output == expected:
+                stats.correct += 1
+    return stats
+
+
+def find_dominated(dictionary: Dictionary) -> Set[str]:
+    """Returns the full text of multi-word terms whose value is no more than the average value of their
+    own words.  When such a term is the whole input, the pass made of its separate words always scores
+    at least as high, so on its own the term can never win."""
+    dominated: Set[str] = set()
+    for term in dictionary.get_terms():
+        if term.word_count < 2:
+            continue
+        word_values: List[float] = []
+        for word in term.words:
+            word_term = dictionary.find_single_word_term(word)
+            if word_term is None:
+                break
+            word_values.append(word_term.value())
+        if len(word_values) != term.word_count:
+            continue
+        if term.value() <= (sum(word_values) / float(len(word_values))):
+            dominated.add(term.full)
+    return dominated
+
+
+def count_nodes(terms: List[Term]) -> int:
+    """Builds a search index for the given terms and returns its node count."""
+    trie = Trie()
+    for term in terms:
+        trie.add_word(term.compressed, term.compressed)
+    return trie.node_count()
+
+
+def write_pruned(input_filename: str, output_filename: str, pruned: Set[str]) -> None:
+    """Copies the dictionary file, skipping lines for pruned terms."""
+    with open_text(input_filename) as fi, open(output_filename, "wt", encoding="utf-8") as fo:
+        for line in fi:
+            if (not line.startswith("#")) and (line.split("\t", 1)[0] in pruned):
+                continue
+            fo.write(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prunes dictionary terms that never win a split.")
+    parser.add_argument("--dictionary", default="dictionary.txt", help="source dictionary file")
+    parser.add_argument("--corpus", required=True, help="query corpus, one query per line, optional tab and expected output")
+    parser.add_argument("--output", default="dictionary.pruned.txt", help="pruned dictionary file to write")
+    parser.add_argument("--report", default="dictionary.pruned.report.txt", help="report file to write")
+    parser.add_argument("--max-terms", type=int, default=25)
+    parser.add_argument("--max-passes", type=int, default=10000)
+    parser.add_argument("--prune-unwon", action="store_true", help="also prune terms matched at least --min-matches times that never won")
+    parser.add_argument("--min-matches", type=int, default=10)
+    args = parser.parse_args()
+
+    print(" * Loading dictionary..")
+    dictionary = Dictionary()
+    dictionary.load_data(args.dictionary)
+    corpus = load_corpus(args.corpus)
+
+    print(f" * Replaying {len(corpus)} queries..")
+    before = replay(dictionary, corpus, args.max_terms, args.max_passes)
+
+    print(" * Finding dominated terms..")
+    dominated = find_dominated(dictionary)
+    pruned: Set[str] = set()
+    for term in dictionary.get_terms():
+        if before.won.get(term.full, 0) > 0:
+            continue
+        if term.full in dominated:
+            pruned.add(term.full)
+        elif args.prune_unwon and (before.matched.get(term.full, 0) >= args.min_matches):
+            pruned.add(term.full)
+
+    print(f" * Writing pruned dictionary ({len(pruned)} terms removed)..")
+    write_pruned(args.dictionary, args.output, pruned)
+    terms = dictionary.get_terms()
+    nodes_before = count_nodes(terms)
+    nodes_after = count_nodes([t for t in terms if t.full not in pruned])
+
+    print(" * Replaying against pruned dictionary..")
+    pruned_dictionary = Dictionary()
+    pruned_dictionary.load_data(args.output)
+    after = replay(pruned_dictionary, corpus, args.max_terms, args.max_passes)
+    changed = sum(1 for i in range(len(corpus)) if before.outputs[i] != after.outputs[i])
+
+    lines = [
+        "PyCentipede dictionary pruning report",
+        "",
+        f"queries replayed:         {len(corpus)}",
+        f"queries graded:           {before.graded}",
+        f"terms before:             {len(terms)}",
+        f"terms after:              {len(terms) - len(pruned)}",
+        f"terms pruned:             {len(pruned)}",
+        f"  dominated (never won):  {len(pruned & dominated)}",
+        f"  matched, never won:     {len(pruned - dominated)}",
+        f"terms ever matched:       {len(before.matched)}",
+        f"terms ever won:           {len(before.won)}",
+        f"index nodes before:       {nodes_before}",
+        f"index nodes after:        {nodes_after}",
+        f"matched terms/query:      {before.matched_terms_avg} -> {after.matched_terms_avg}",
+        f"accuracy percent:         {before.accuracy_percent} -> {after.accuracy_percent}",
+        f"outputs changed:          {changed}",
+        "",
+        "pruned terms:",
+    ]
+    for full in sorted(pruned):
+        lines.append(f"  {full}\tmatched={before.matched.get(full, 0)}\tdominated={'1' if full in dominated else '0'}")
+    with open(args.report, "wt") as f:
+        f.write("\n".join(lines) + "\n")
+    print("\n".join(lines[:17]))
+
+
+if __name__ == "__main__":
+    main()
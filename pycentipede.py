@@ -5,15 +5,13 @@ GNU GENERAL PUBLIC LICENSE Version 3"""
 from threading import Thread
 from time import sleep
 from service import config
-from service import di
 from service import app
 from service import routes
+from service import startup
 
 
-with open("version") as f:
-    version = f.read().strip()
-config.version = version
-print(f" * Starting PyCentipede v{version}")
+startup.load_version()
+print(f" * Starting PyCentipede v{config.version}")
 
 
 def http_server_thread():
@@ -29,11 +27,7 @@ if __name__ == "__main__":
 def initialize():
     if __name__ == "__main__":
         sleep(1.5)
-    print(" * Initializing word splitter..")
-    di.service_state.set_loading_data_state()
-    di.dictionary.load_data(config.data_file)
-    di.service_state.set_up_state()
-    print(" * Service initialization complete!")
+    startup.initialize()
 
 
 initialize()
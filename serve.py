@@ -0,0 +1,16 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+from service.prefork import PreforkServer
+from service import config
+
+
+"""Production entry point: loads the dictionary once, then forks 'service: prefork: workers' worker processes
+serving on 'service: prefork: host' and 'port' (see PreforkServer).  Send SIGHUP to recycle workers, SIGTERM to stop."""
+
+
+if __name__ == "__main__":
+    PreforkServer(host=config.prefork_host, port=config.prefork_port, workers=config.prefork_workers,
+                  max_requests=config.prefork_max_requests, max_requests_jitter=config.prefork_max_requests_jitter,
+                  graceful_timeout_secs=config.prefork_graceful_timeout_secs).run()
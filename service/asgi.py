@@ -0,0 +1,157 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Generator, List, MutableMapping, Optional, Tuple
+from urllib.parse import parse_qsl
+from utils import error_handler
+from service.handlers import HandlerResponse
+from service import handlers
+from service import startup
+from service import config
+
+
+"""ASGI entry point, serving the same routes and response formats as the Flask routes.  Connections are handled on
+an asyncio event loop, so thousands of idle keep-alive or slow clients cost no threads.  Commands (which split
+inputs, using the CPU) run on a bounded thread pool executor, streamed responses fetching one chunk at a time, so
+the event loop is never blocked.  Large batches are still spread across cores by the split pool.  Run with any ASGI
+server, e.g.:
+
+    uvicorn service.asgi:app --host 0.0.0.0 --port 5000 --no-access-log
+
+The dictionary loads in the background on startup, with /ping reporting LoadingData until it's done."""
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+__executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=config.asgi_executor_threads, thread_name_prefix="asgi")
+__initialize_lock: Lock = Lock()
+__initialized: bool = False
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        await __lifespan(receive, send)
+    elif scope["type"] == "http":
+        __start()
+        await __http(scope, receive, send)
+
+
+def __start() -> None:
+    """Starts service initialization in the background, once."""
+    global __initialized
+    with __initialize_lock:
+        if __initialized:
+            return
+        __initialized = True
+    startup.load_version()
+    print(f" * Starting PyCentipede v{config.version} (ASGI)")
+    asyncio.get_event_loop().run_in_executor(None, __initialize)
+
+
+def __initialize() -> None:
+    """Initializes the service, logging any failure."""
+    try:
+        startup.initialize()
+    except Exception as ex:
+        error_handler.log_error(ex)
+
+
+async def __lifespan(receive: Receive, send: Send) -> None:
+    """Handles server startup and shutdown events."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            __start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            __executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def __http(scope: Scope, receive: Receive, send: Send) -> None:
+    """Routes an HTTP request to its command handler."""
+    loop = asyncio.get_event_loop()
+    path = scope["path"]
+    method = scope["method"]
+    headers: Dict[str, str] = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+    args: Dict[str, str] = {}
+    for k, v in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True):
+        args.setdefault(k, v)
+
+    if path in ("/", "/index", "/index.htm", "/index.html") and (method in ("GET", "HEAD")):
+        response = await loop.run_in_executor(__executor, handlers.index)
+    elif (path == "/ping") and (method in ("GET", "HEAD")):
+        response = handlers.ping()
+    elif (path == "/getstats") and (method in ("GET", "HEAD")):
+        response = await loop.run_in_executor(__executor, handlers.get_stats)
+    elif (path == "/wordsplit") and (method in ("GET", "HEAD")):
+        response = await loop.run_in_executor(__executor, handlers.word_split, args, headers.get("if-none-match"))
+    elif (path == "/wordsplit") and (method == "POST"):
+        body = await __read_body(receive, handlers.max_body_bytes() + 1)
+        mimetype = headers.get("content-type", "").split(";")[0].strip().lower()
+        response = await loop.run_in_executor(__executor, handlers.word_split_bulk, args, body, mimetype)
+    elif path in ("/", "/index", "/index.htm", "/index.html", "/ping", "/getstats", "/wordsplit"):
+        response = HandlerResponse("Method Not Allowed", "text/plain", 405)
+    else:
+        response = HandlerResponse("Not Found", "text/plain", 404)
+    await __send(response, send, method == "HEAD")
+
+
+async def __read_body(receive: Receive, max_bytes: int) -> bytes:
+    """Reads the request body, stopping once it reaches the maximum size."""
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        if size < max_bytes:
+            chunks.append(chunk[:max_bytes - size])
+            size += len(chunks[-1])
+        if (not message.get("more_body", False)) or (size >= max_bytes):
+            break
+    return b"".join(chunks)
+
+
+async def __send(response: HandlerResponse, send: Send, head: bool = False) -> None:
+    """Sends a handler response, fetching each chunk of a streamed body on the executor."""
+    mimetype = response.mimetype
+    if mimetype.startswith("text/"):
+        mimetype += "; charset=utf-8"
+    header_list: List[Tuple[bytes, bytes]] = [(b"content-type", mimetype.encode("latin-1"))]
+    for k, v in response.headers.items():
+        header_list.append((k.lower().encode("latin-1"), v.encode("latin-1")))
+
+    chunks = response.body
+    if isinstance(chunks, (str, bytes)):
+        body = chunks if isinstance(chunks, bytes) else chunks.encode("utf-8")
+        header_list.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": response.status, "headers": header_list})
+        await send({"type": "http.response.body", "body": b"" if head else body})
+        return
+
+    loop = asyncio.get_event_loop()
+    try:
+        await send({"type": "http.response.start", "status": response.status, "headers": header_list})
+        while not head:
+            chunk = await loop.run_in_executor(__executor, __next_chunk, chunks)
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        chunks.close()
+
+
+def __next_chunk(chunks: Generator[bytes, None, None]) -> Optional[bytes]:
+    """Returns the next chunk of a streamed body, or None once it ends."""
+    return next(chunks, None)
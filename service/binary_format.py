@@ -0,0 +1,84 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import struct
+from typing import Any, List
+
+
+"""Length-prefixed binary records, for bulk clients that want to avoid the cost of parsing JSON or text.  Each
+record is a 4-byte big-endian unsigned payload length, then the payload.  A response record's payload is a record
+type byte, then its fields in order, each encoded by type:
+
+    string      4-byte unsigned length, then UTF-8 bytes
+    integer     4-byte signed
+    float       8-byte double
+    list        4-byte unsigned item count, then the items
+    tuple       the items (a group of fields of fixed layout, such as a pass's text and score)
+
+A request body (sent as application/octet-stream) is a sequence of records whose payloads are UTF-8 input strings."""
+
+MIMETYPE: str = "application/octet-stream"
+
+# record types
+RESULT: int = 0
+ERRORS: int = 1
+
+__LENGTH = struct.Struct(">I")
+__INTEGER = struct.Struct(">i")
+__FLOAT = struct.Struct(">d")
+
+
+def write_record(type_: int, fields: List[Any]) -> bytes:
+    """
+    Encodes a response record.
+    :param type_: The record type.
+    :param fields: The field values (strings, integers, floats, or lists or tuples of these).
+    :return: The length-prefixed record.
+    """
+    parts: List[bytes] = [bytes((type_,))]
+    for value in fields:
+        __write_value(parts, value)
+    payload = b"".join(parts)
+    return __LENGTH.pack(len(payload)) + payload
+
+
+def read_inputs(body: bytes) -> List[str]:
+    """
+    Decodes the input strings of a request body.
+    :param body: The request body.
+    :return: The input strings.
+    """
+    inputs: List[str] = []
+    offset = 0
+    while offset < len(body):
+        if offset + __LENGTH.size > len(body):
+            raise ValueError(f"Binary request record at byte {offset} is truncated.")
+        length = __LENGTH.unpack_from(body, offset)[0]
+        offset += __LENGTH.size
+        if offset + length > len(body):
+            raise ValueError(f"Binary request record at byte {offset - __LENGTH.size} is truncated.")
+        inputs.append(body[offset:offset + length].decode("utf-8"))
+        offset += length
+    return inputs
+
+
+def __write_value(parts: List[bytes], value: Any) -> None:
+    """Appends the encoded value to the parts."""
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        parts.append(__LENGTH.pack(len(data)))
+        parts.append(data)
+    elif isinstance(value, float):
+        parts.append(__FLOAT.pack(value))
+    elif isinstance(value, int):
+        parts.append(__INTEGER.pack(value))
+    elif isinstance(value, list):
+        parts.append(__LENGTH.pack(len(value)))
+        for v in value:
+            __write_value(parts, v)
+    elif isinstance(value, tuple):
+        for v in value:
+            __write_value(parts, v)
+    else:
+        raise ValueError(f"Can't encode value '{value}' as a binary field.")
@@ -2,12 +2,14 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
-from typing import List
+from typing import Any, Dict, List, Optional, Set, Tuple
 from enum import IntEnum
 from utils import error_handler
 from utils.json_writer import JsonWriter
+from service import binary_format
 from service import config
 from splitter.split_result import SplitResult
+from splitter.enums import DictionarySource
 from service import di
 
 
@@ -20,10 +22,18 @@ class VerbosityLevel(IntEnum):
     High = 2
 
 
-def error(errors: List[Exception], command: str = "unknown") -> str:
+# names of the fields written for each split result, by verbosity ('truncated' is written at Low verbosity only if true,
+# except in fixed layouts)
+__FIELD_NAMES: Dict[VerbosityLevel, Tuple[str, ...]] = {
+    VerbosityLevel.Low: ("input", "output", "score", "truncated"),
+    VerbosityLevel.Medium: ("input", "output", "score", "termCount", "passCount", "elapsedMS", "truncated"),
+    VerbosityLevel.High: ("input", "output", "score", "termCount", "passCount", "elapsedMS", "truncated", "terms", "passes")}
+
+
+def error(errors: List[Exception], command: str = "unknown", pretty: bool = True) -> str:
     """Writes the standard JSON response for fatal error, if a more specific command handler was not reached."""
     try:
-        w = JsonWriter()
+        w = JsonWriter(pretty)
         w.write_start_object()
         __write_info(w, command, 0)
         __write_errors(w, errors)
@@ -41,65 +51,37 @@ def get_stats() -> str:
     writer.write_start_object()
     __write_info(writer, "getstats")
     di.service_state.write_runtime_statistics(writer)
-    di.split_cache.write_runtime_statistics(writer)
+    (di.shared_split_cache or di.split_cache).write_runtime_statistics(writer)
+    if di.segment_cache is not None:
+        di.segment_cache.write_runtime_statistics(writer)
+    di.word_splitter.write_runtime_statistics(writer)
+    di.split_pool.write_runtime_statistics(writer)
+    if di.response_cache is not None:
+        di.response_cache.write_runtime_statistics(writer)
     di.service_stats.write_runtime_statistics(writer)
+    di.gc_manager.write_runtime_statistics(writer)
     writer.write_end_object()
     json = writer.to_string()
     return json
 
 
-def word_split(verbosity: VerbosityLevel, inputs: List[str], pass_display: int, exhaustive: bool, results: List[SplitResult], elapsed: int, errors: List[Exception]) -> str:
-    """Writes response for the 'wordsplit' command."""
-    writer = JsonWriter()
+def word_split(verbosity: VerbosityLevel, inputs: List[str], pass_display: int, exhaustive: bool, overlay: Optional[str],
+               sources: Optional[Set[DictionarySource]], results: List[SplitResult], elapsed: int, errors: List[Exception], pretty: bool = True) -> str:
+    """Writes response for the 'wordsplit' command, indented or compact."""
+    writer = JsonWriter(pretty)
     writer.write_start_object()
     __write_info(writer, "wordsplit", elapsed)
     writer.write_start_object("input")
     writer.write_property_value("input", ", ".join(inputs))
     writer.write_property_value("passdisplay", str(pass_display))
     writer.write_property_value("exhaustive", "1" if exhaustive else "0")
+    writer.write_property_value("overlay", overlay or "")
+    writer.write_property_value("sources", ", ".join(sorted(s.name for s in sources)) if sources is not None else "")
     writer.write_property_value("verbosity", str(int(verbosity)) + " (" + str(verbosity) + ")")
     writer.write_end_object()
     writer.write_start_array("output")
     for r in results:
-        if verbosity is VerbosityLevel.Low:
-            writer.write_start_object()
-            writer.write_property_value("input", r.input)
-            writer.write_property_value("output", r.output)
-            writer.write_property_value("score", round(r.score, 2))
-            writer.write_end_object()
-        elif verbosity is VerbosityLevel.Medium:
-            writer.write_start_object()
-            writer.write_property_value("input", r.input)
-            writer.write_property_value("output", r.output)
-            writer.write_property_value("score", round(r.score, 2))
-            writer.write_property_value("termCount", r.term_count)
-            writer.write_property_value("passCount", r.pass_count)
-            writer.write_property_value("elapsedMS", round(r.elapsed_ms, 0))
-            writer.write_end_object()
-        elif verbosity is VerbosityLevel.High:
-            terms = ""
-            if r.matched_terms:
-                for t in r.matched_terms:
-                    if len(terms) > 0:
-                        terms += ", "
-                    terms += t.full
-            writer.write_start_object()
-            writer.write_property_value("input", r.input)
-            writer.write_property_value("output", r.output)
-            writer.write_property_value("score", round(r.score, 2))
-            writer.write_property_value("termCount", r.term_count)
-            writer.write_property_value("passCount", r.pass_count)
-            writer.write_property_value("elapsedMS", int(round(r.elapsed_ms, 0)))
-            writer.write_property_value("terms", terms)
-            writer.write_start_array("passes")
-            if r.passes:
-                for p in r.passes:
-                    writer.write_start_object()
-                    writer.write_property_value("text", p.display_text())
-                    writer.write_property_value("score", round(p.score(), 2))
-                    writer.write_end_object()
-            writer.write_end_array()
-            writer.write_end_object()
+        writer.write_value(__result_fields(verbosity, r))
     writer.write_end_array()
     __write_errors(writer, errors)
     writer.write_end_object()
@@ -107,6 +89,92 @@ def word_split(verbosity: VerbosityLevel, inputs: List[str], pass_display: int,
     return json
 
 
+def word_split_line(verbosity: VerbosityLevel, result: SplitResult) -> str:
+    """Writes one split result as a single line of JSON, for the 'wordsplit' command's NDJSON output."""
+    return JsonWriter.encode(__result_fields(verbosity, result))
+
+
+def errors_line(errors: List[Exception]) -> str:
+    """Writes the errors of a 'wordsplit' command as a single line of JSON, ending its NDJSON output."""
+    return JsonWriter.encode({"errors": [{"args": [str(a) for a in ex.args]} for ex in errors]})
+
+
+def error_marker_line(errors: List[Exception]) -> str:
+    """Writes the line ending a 'wordsplit' command's plain text or TSV output if it was cut short by an error: '#error'
+    and the errors as a single line of JSON."""
+    return "#error " + errors_line(errors)
+
+
+def word_split_text_line(result: SplitResult) -> str:
+    """Writes one split result as a line of plain text, for the 'wordsplit' command's text output: the split output,
+    followed by a tab and 'truncated' if the split was cut short by its deadline."""
+    return result.output + "\ttruncated" if result.deadline_hit else result.output
+
+
+def word_split_tsv_header(verbosity: VerbosityLevel) -> str:
+    """Writes the header line of the 'wordsplit' command's TSV output, naming the fields written at the verbosity."""
+    return "\t".join(__FIELD_NAMES[verbosity])
+
+
+def word_split_tsv_line(verbosity: VerbosityLevel, result: SplitResult) -> str:
+    """Writes one split result as a line of tab-separated fields, for the 'wordsplit' command's TSV output.  Tabs,
+    line breaks and backslashes in values are escaped as \\t, \\n, \\r and \\\\, and passes are written as a list of
+    'text (score)'."""
+    values = []
+    for v in __flat_fields(verbosity, result):
+        if isinstance(v, list):
+            v = ", ".join(f"{t} ({s})" for t, s in v)
+        values.append(str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r"))
+    return "\t".join(values)
+
+
+def word_split_record(verbosity: VerbosityLevel, result: SplitResult) -> bytes:
+    """Writes one split result as a binary record, for the 'wordsplit' command's binary output.  Fields are those of
+    the JSON output, in order, with each pass as a (text, score) pair."""
+    return binary_format.write_record(binary_format.RESULT, __flat_fields(verbosity, result))
+
+
+def errors_record(errors: List[Exception]) -> bytes:
+    """Writes the errors of a 'wordsplit' command as a binary record (a list of each error's args), ending its
+    binary output."""
+    return binary_format.write_record(binary_format.ERRORS, [[[str(a) for a in ex.args] for ex in errors]])
+
+
+def __flat_fields(verbosity: VerbosityLevel, r: SplitResult) -> List[Any]:
+    """Returns the field values written for a split result at the specified verbosity, in order, with the score as a
+    float, elapsed time and the truncated flag as integers, and passes as (text, score) pairs."""
+    fields = __result_fields(verbosity, r)
+    fields["score"] = float(fields["score"])
+    fields["truncated"] = int(fields.get("truncated", False))
+    if "elapsedMS" in fields:
+        fields["elapsedMS"] = int(fields["elapsedMS"])
+    if "passes" in fields:
+        fields["passes"] = [(p["text"], float(p["score"])) for p in fields["passes"]]
+    return list(fields.values())
+
+
+def __result_fields(verbosity: VerbosityLevel, r: SplitResult) -> Dict[str, Any]:
+    """Returns the fields written for a split result at the specified verbosity, in order.  At Low verbosity, the
+    truncated flag is written only if the split was cut short by its deadline."""
+    fields: Dict[str, Any] = {"input": r.input, "output": r.output, "score": round(r.score, 2)}
+    if verbosity is VerbosityLevel.Low:
+        if r.deadline_hit:
+            fields["truncated"] = True
+    elif verbosity is VerbosityLevel.Medium:
+        fields["termCount"] = r.term_count
+        fields["passCount"] = r.pass_count
+        fields["elapsedMS"] = round(r.elapsed_ms, 0)
+        fields["truncated"] = r.deadline_hit
+    elif verbosity is VerbosityLevel.High:
+        fields["termCount"] = r.term_count
+        fields["passCount"] = r.pass_count
+        fields["elapsedMS"] = int(round(r.elapsed_ms, 0))
+        fields["truncated"] = r.deadline_hit
+        fields["terms"] = ", ".join(t.full for t in r.matched_terms) if r.matched_terms else ""
+        fields["passes"] = [{"text": p.display_text(), "score": round(p.score(), 2)} for p in r.passes] if r.passes else []
+    return fields
+
+
 def __write_info(writer: JsonWriter, command: str = "", elapsed: int = 0) -> None:
     """Writes standard 'info' node for many command responses."""
     writer.write_start_object("info")
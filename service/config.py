@@ -3,6 +3,7 @@ Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
 import yaml
+from typing import Dict
 
 version: str = "2.1.0"
 instance_name: str = ""
@@ -14,7 +15,39 @@ default_max_passes: int = 10000
 exhaustive_max_input_chars: int = 250
 exhaustive_max_terms: int = 50
 exhaustive_max_passes: int = 25000
+default_deadline_ms: int = 0
+exhaustive_deadline_ms: int = 0
 max_cache_items: int = 100000
+max_cache_bytes: int = 0
+cache_stripes: int = 16
+cache_admission: bool = False
+segment_cache_items: int = 0
+coalesce_wait_secs: float = 5.0
+pool_processes: int = 0
+pool_threshold: int = 32
+pool_chunk_size: int = 16
+snapshot_file: str = ""
+snapshot_interval_secs: float = 300.0
+snapshot_max_items: int = 50000
+shared_cache_file: str = ""
+shared_cache_max_items: int = 1000000
+shared_cache_l1: bool = True
+response_cache_items: int = 0
+response_cache_max_bytes: int = 0
+response_cache_max_age_secs: int = 0
+bulk_max_items: int = 100000
+bulk_max_body_bytes: int = 16777216
+asgi_executor_threads: int = 16
+prefork_host: str = "0.0.0.0"
+prefork_port: int = 5000
+prefork_workers: int = 4
+prefork_max_requests: int = 0
+prefork_max_requests_jitter: int = 0
+prefork_graceful_timeout_secs: float = 30.0
+overlays: Dict[str, str] = {}
+gc_threshold0: int = 50000
+gc_threshold1: int = 20
+gc_threshold2: int = 100
 
 
 def load_settings():
@@ -28,7 +61,39 @@ def load_settings():
     global exhaustive_max_input_chars
     global exhaustive_max_terms
     global exhaustive_max_passes
+    global default_deadline_ms
+    global exhaustive_deadline_ms
     global max_cache_items
+    global max_cache_bytes
+    global cache_stripes
+    global cache_admission
+    global segment_cache_items
+    global coalesce_wait_secs
+    global pool_processes
+    global pool_threshold
+    global pool_chunk_size
+    global snapshot_file
+    global snapshot_interval_secs
+    global snapshot_max_items
+    global shared_cache_file
+    global shared_cache_max_items
+    global shared_cache_l1
+    global response_cache_items
+    global response_cache_max_bytes
+    global response_cache_max_age_secs
+    global bulk_max_items
+    global bulk_max_body_bytes
+    global asgi_executor_threads
+    global prefork_host
+    global prefork_port
+    global prefork_workers
+    global prefork_max_requests
+    global prefork_max_requests_jitter
+    global prefork_graceful_timeout_secs
+    global overlays
+    global gc_threshold0
+    global gc_threshold1
+    global gc_threshold2
 
     print(" * Reading configuration file..")
     f = open("config.yml")
@@ -43,7 +108,39 @@ def load_settings():
     exhaustive_max_input_chars = settings["splitter"]["exhaustive"]["max_input_chars"]
     exhaustive_max_terms = settings["splitter"]["exhaustive"]["max_terms"]
     exhaustive_max_passes = settings["splitter"]["exhaustive"]["max_passes"]
+    default_deadline_ms = settings["splitter"]["default"]["deadline_ms"]
+    exhaustive_deadline_ms = settings["splitter"]["exhaustive"]["deadline_ms"]
     max_cache_items = settings["splitter"]["max_cache_items"]
+    max_cache_bytes = settings["splitter"]["max_cache_bytes"]
+    cache_stripes = settings["splitter"]["cache_stripes"]
+    cache_admission = settings["splitter"]["cache_admission"]
+    segment_cache_items = settings["splitter"]["segment_cache_items"]
+    coalesce_wait_secs = settings["splitter"]["coalesce_wait_secs"]
+    pool_processes = settings["splitter"]["pool"]["processes"]
+    pool_threshold = settings["splitter"]["pool"]["threshold"]
+    pool_chunk_size = settings["splitter"]["pool"]["chunk_size"]
+    snapshot_file = settings["splitter"]["snapshot"]["file"] or ""
+    snapshot_interval_secs = settings["splitter"]["snapshot"]["interval_secs"]
+    snapshot_max_items = settings["splitter"]["snapshot"]["max_items"]
+    shared_cache_file = settings["splitter"]["shared_cache"]["file"] or ""
+    shared_cache_max_items = settings["splitter"]["shared_cache"]["max_items"]
+    shared_cache_l1 = settings["splitter"]["shared_cache"]["l1"]
+    response_cache_items = settings["service"]["response_cache"]["max_items"]
+    response_cache_max_bytes = settings["service"]["response_cache"]["max_bytes"]
+    response_cache_max_age_secs = settings["service"]["response_cache"]["max_age_secs"]
+    bulk_max_items = settings["service"]["bulk"]["max_items"]
+    bulk_max_body_bytes = settings["service"]["bulk"]["max_body_bytes"]
+    asgi_executor_threads = settings["service"]["asgi"]["executor_threads"]
+    prefork_host = settings["service"]["prefork"]["host"]
+    prefork_port = settings["service"]["prefork"]["port"]
+    prefork_workers = settings["service"]["prefork"]["workers"]
+    prefork_max_requests = settings["service"]["prefork"]["max_requests"]
+    prefork_max_requests_jitter = settings["service"]["prefork"]["max_requests_jitter"]
+    prefork_graceful_timeout_secs = settings["service"]["prefork"]["graceful_timeout_secs"]
+    overlays = settings["splitter"]["overlays"] or {}
+    gc_threshold0 = settings["gc"]["threshold0"]
+    gc_threshold1 = settings["gc"]["threshold1"]
+    gc_threshold2 = settings["gc"]["threshold2"]
 
 
 load_settings()
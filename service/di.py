@@ -2,18 +2,40 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
+from typing import Optional
 from service import config
 from utils.service_state import ServiceState
 from utils.service_stats import ServiceStats
+from utils.gc_manager import GcManager
 from splitter.cache import SplitCache
 from splitter.dictionary import Dictionary
+from splitter.cache_snapshot import CacheSnapshot
+from splitter.shared_cache import SharedSplitCache
 from splitter.word_splitter import Splitter
+from splitter.split_pool import SplitPool
+from service.response_cache import ResponseCache
 
 
 """This is a placeholder for true dependency injection, to be implemented later."""
 
 service_state: ServiceState = ServiceState()
 service_stats: ServiceStats = ServiceStats()
-split_cache: SplitCache = SplitCache(max_cache_items=config.max_cache_items, cleanup_secs=60.0, service_stats=service_stats)
+gc_manager: GcManager = GcManager(threshold0=config.gc_threshold0, threshold1=config.gc_threshold1, threshold2=config.gc_threshold2)
+split_cache: SplitCache = SplitCache(max_cache_items=config.max_cache_items, max_cache_bytes=config.max_cache_bytes,
+                                     stripes=config.cache_stripes, admission=config.cache_admission)
+segment_cache: Optional[SplitCache] = SplitCache(max_cache_items=config.segment_cache_items, stripes=config.cache_stripes,
+                                                 name="segmentCache", admission=config.cache_admission) if config.segment_cache_items > 0 else None
 dictionary: Dictionary = Dictionary(service_stats=service_stats)
-word_splitter: Splitter = Splitter(dictionary=dictionary, cache=split_cache, service_stats=service_stats)
+cache_snapshot: Optional[CacheSnapshot] = CacheSnapshot(cache=split_cache, dictionary=dictionary, filename=config.snapshot_file,
+                                                        max_items=config.snapshot_max_items, interval_secs=config.snapshot_interval_secs,
+                                                        service_stats=service_stats) if config.snapshot_file else None
+shared_split_cache: Optional[SharedSplitCache] = SharedSplitCache(filename=config.shared_cache_file, max_cache_items=config.shared_cache_max_items,
+                                                                  dictionary=dictionary, l1=split_cache if config.shared_cache_l1 else None) \
+    if config.shared_cache_file else None
+word_splitter: Splitter = Splitter(dictionary=dictionary, cache=shared_split_cache or split_cache, service_stats=service_stats,
+                                   segment_cache=segment_cache, coalesce_wait_secs=config.coalesce_wait_secs)
+split_pool: SplitPool = SplitPool(splitter=word_splitter, dictionary=dictionary, processes=config.pool_processes,
+                                  threshold=config.pool_threshold, chunk_size=config.pool_chunk_size)
+response_cache: Optional[ResponseCache] = ResponseCache(max_items=config.response_cache_items, max_bytes=config.response_cache_max_bytes,
+                                                        max_age_secs=config.response_cache_max_age_secs) \
+    if config.response_cache_items > 0 else None
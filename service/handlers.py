@@ -0,0 +1,350 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import json
+from typing import Any, Dict, Generator, Iterator, List, Mapping, Optional, Tuple, Union
+from flask import render_template
+from utils import error_handler
+from utils.stopwatch import Stopwatch
+from utils.service_state import ServiceStateType
+from splitter.split_result import SplitResult
+from splitter.split_pool import SplitRequest
+from service.command_writer import VerbosityLevel
+from service.response_cache import ResponseCache
+from service.split_options import SplitOptions
+from service import binary_format
+from service import command_writer
+from service import config
+from service import app
+from service import di
+
+
+"""Command handlers shared by the WSGI (Flask) routes and the ASGI app.  Each takes the parsed request (query
+parameters, and the body and headers it needs) and returns a HandlerResponse, which the server front end sends."""
+
+
+# output formats streamed a line at a time
+__STREAMED_OUTPUTS: Tuple[str, ...] = ("text", "ndjson", "tsv", "binary")
+
+
+class HandlerResponse:
+    """Server-independent HTTP response: status, body, mimetype and extra headers.  The body is text, bytes, or a
+    generator of byte chunks to be streamed (closed by the server once sent, or if the client disconnects)."""
+
+    def __init__(self, body: Union[str, bytes, Generator[bytes, None, None]], mimetype: str, status: int = 200,
+                 headers: Optional[Dict[str, str]] = None) -> None:
+        """Class constructor."""
+        self.__body: Union[str, bytes, Generator[bytes, None, None]] = body
+        self.__mimetype: str = mimetype
+        self.__status: int = status
+        self.__headers: Dict[str, str] = headers or {}
+
+    @property
+    def body(self) -> Union[str, bytes, Generator[bytes, None, None]]:
+        """The response body."""
+        return self.__body
+
+    @property
+    def mimetype(self) -> str:
+        """The response mimetype."""
+        return self.__mimetype
+
+    @property
+    def status(self) -> int:
+        """The HTTP status code."""
+        return self.__status
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Extra response headers."""
+        return self.__headers
+
+    @property
+    def streamed(self) -> bool:
+        """True if the body is a generator of chunks."""
+        return not isinstance(self.__body, (str, bytes))
+
+
+def index() -> HandlerResponse:
+    """Renders and returns the index-page HTML template."""
+    sw = Stopwatch()
+    try:
+        with app.app_context():
+            response = render_template("index.html")
+    except Exception as ex:
+        error_handler.log_error(ex)
+        response = str(ex)
+    finally:
+        di.service_stats.log_command(name="index", elapsed_ms=sw.elapsed_ms)
+    return HandlerResponse(response, "text/html")
+
+
+def ping() -> HandlerResponse:
+    """Returns the plain text "Up", "LoadingData", or "Down" depending on service state."""
+    sw = Stopwatch()
+    try:
+        response = di.service_state.state.name
+    except Exception as ex:
+        error_handler.log_error(ex)
+        response = str(ex)
+    finally:
+        di.service_stats.log_command(name="ping", elapsed_ms=sw.elapsed_ms)
+    return HandlerResponse(response, "text/plain")
+
+
+def get_stats() -> HandlerResponse:
+    """Generates service statistics and returns JSON response."""
+    errors = []
+    sw = Stopwatch()
+    try:
+        response = command_writer.get_stats()
+    except Exception as ex:
+        errors.append(ex)
+        error_handler.log_error(ex)
+        response = command_writer.error(errors, "getstats")
+    finally:
+        di.service_stats.log_command(name="getstats", elapsed_ms=sw.elapsed_ms)
+    return HandlerResponse(response, "application/json")
+
+
+def word_split(args: Mapping[str, str], if_none_match: Optional[str] = None) -> HandlerResponse:
+    """Performs word split operation, returns JSON response with metadata, OR NDJSON, TSV, binary or plain text.  Unless the cache is
+    disabled, complete responses are kept in the response cache (if enabled, and admission is allowed) and served with an ETag, answering
+    a matching If-None-Match with 304 Not Modified."""
+    errors: List[Exception] = []
+    output = "json"
+    pretty = True
+    response_cache = di.response_cache
+    response: Union[str, bytes]
+    key = None
+    etag = None
+    streaming = False
+    sw = Stopwatch()
+    try:
+        # parse params
+        options = SplitOptions().parse(args)
+        verbosity = VerbosityLevel(int(args.get("verbosity") or "0"))
+        output = (args.get("output") or "json").lower()
+        pretty = (args.get("pretty") or "1") != "0"
+        inputs: List[str] = [options.limit_input(s) for s in (args.get("input") or "").replace("|", ",").split(",")]
+        if len(inputs) > 1000:
+            del inputs[1000:]
+
+        # check response cache, keyed on the overlay's content so a reloaded overlay doesn't serve stale responses
+        if options.cache and (response_cache is not None) and (di.service_state.state is ServiceStateType.Up):
+            overlay = di.dictionary.get_overlay(options.overlay)
+            key = ResponseCache.make_key("|".join(inputs), int(verbosity), output, pretty, options.exhaustive, options.pass_display,
+                                         overlay.key if overlay is not None else "",
+                                         ",".join(sorted(s.name for s in options.sources)) if options.sources is not None else "")
+            cached = response_cache.get_item(key)
+            if cached is not None:
+                body, etag = cached
+                return __response(body, output, etag, if_none_match)
+
+        # stream line outputs as each split completes
+        if output in __STREAMED_OUTPUTS:
+            streaming = True
+            return HandlerResponse(__stream(output, verbosity, [(s, options) for s in inputs], errors, sw, "wordsplit",
+                                            key if options.cache_admit else None),
+                                   __mimetype(output))
+
+        # perform splits
+        results = list(__split([(s, options) for s in inputs], verbosity, errors))
+
+        # write response
+        response = __write(output, verbosity, inputs, options, results, sw.elapsed_ms, errors, pretty)
+
+        # store complete responses if admission is allowed, unless any split was cut short by its deadline
+        if (response_cache is not None) and (key is not None) and options.cache_admit and (not errors) and (output == "json") \
+                and (not any(r.deadline_hit for r in results)):
+            body = response.encode("utf-8")
+            etag = response_cache.set_item(key, body)
+            response = body
+
+    except Exception as ex:
+        errors.append(ex)
+        error_handler.log_error(ex)
+        response = command_writer.error(errors, "wordsplit", pretty)
+        etag = None
+
+    finally:
+        if not streaming:
+            di.service_stats.log_command(name="wordsplit", elapsed_ms=sw.elapsed_ms)
+
+    return __response(response, output, etag, if_none_match)
+
+
+def word_split_bulk(args: Mapping[str, str], body: bytes, mimetype: str) -> HandlerResponse:
+    """Performs word split operations for a batch of inputs sent in the request body, as a JSON array or as
+    newline-delimited JSON records (NDJSON), or as binary records (see binary_format).  Each JSON item is either an
+    input string, or an object with an 'input' field and any of the per-item options 'passdisplay', 'exhaustive',
+    'cache', 'cacheadmit', 'overlay', 'sources' and 'timeout', which override those given in the query string.
+    Returns results in the same order, as JSON, NDJSON, TSV, binary records or plain text.  The body should be read
+    up to one byte beyond the limit (see max_body_bytes), so oversized bodies are detected."""
+    errors: List[Exception] = []
+    output = "json"
+    pretty = True
+    streaming = False
+    sw = Stopwatch()
+    try:
+        # parse params
+        options = SplitOptions().parse(args)
+        verbosity = VerbosityLevel(int(args.get("verbosity") or "0"))
+        output = (args.get("output") or "json").lower()
+        pretty = (args.get("pretty") or "1") != "0"
+        if len(body) > config.bulk_max_body_bytes:
+            raise ValueError(f"Request body is larger than the limit of {config.bulk_max_body_bytes} bytes.")
+        items = __parse_bulk(body, mimetype, options)
+
+        # stream line outputs as each split completes
+        if output in __STREAMED_OUTPUTS:
+            streaming = True
+            return HandlerResponse(__stream(output, verbosity, items, errors, sw, "wordsplit_bulk"), __mimetype(output))
+
+        # perform splits
+        results = list(__split(items, verbosity, errors))
+
+        # write response
+        response = __write(output, verbosity, [s for s, _ in items], options, results, sw.elapsed_ms, errors, pretty)
+
+    except Exception as ex:
+        errors.append(ex)
+        error_handler.log_error(ex)
+        response = command_writer.error(errors, "wordsplit", pretty)
+
+    finally:
+        if not streaming:
+            di.service_stats.log_command(name="wordsplit_bulk", elapsed_ms=sw.elapsed_ms)
+
+    return __response(response, output, None)
+
+
+def max_body_bytes() -> int:
+    """Returns the largest request body accepted by word_split_bulk."""
+    return config.bulk_max_body_bytes
+
+
+def __split(items: List[Tuple[str, SplitOptions]], verbosity: VerbosityLevel, errors: List[Exception]) -> Iterator[SplitResult]:
+    """Splits each input with its options, yielding results in order.  Only the best pass is computed unless more are
+    needed.  Large batches are split in parallel by the split pool.  Each input's deadline counts from when its own
+    split starts, so inputs late in a large batch get the same time as the first."""
+    requests: List[SplitRequest] = []
+    for s, o in items:
+        pass_display = 1 if (verbosity < VerbosityLevel.High) and (not o.exhaustive) else o.pass_display
+        requests.append((s, o.cache, pass_display, o.max_terms, o.max_passes, o.overlay, o.sources, o.cache_admit, o.deadline_ms / 1000.0))
+    return di.split_pool.split(requests, errors)
+
+
+def __stream(output: str, verbosity: VerbosityLevel, items: List[Tuple[str, SplitOptions]], errors: List[Exception], sw: Stopwatch,
+             command: str, key: Optional[str] = None) -> Generator[bytes, None, None]:
+    """Yields one line or record per input as each split completes, as plain text, NDJSON, TSV (after a header line)
+    or binary records, so clients receive results at once and the response is never held in memory.  NDJSON and
+    binary output end with an errors line or record if any occurred, and text or TSV output cut short by an error
+    ends with an error marker line (as the status has already been sent).  If a response cache key is given, the
+    complete response is stored once streamed without errors or deadline hits."""
+    chunks: Optional[List[bytes]] = [] if key is not None else None
+    try:
+        if output == "tsv":
+            chunk = (command_writer.word_split_tsv_header(verbosity) + "\n").encode("utf-8")
+            if chunks is not None:
+                chunks.append(chunk)
+            yield chunk
+        for r in __split(items, verbosity, errors):
+            chunk = __chunk(output, verbosity, r)
+            if (chunks is not None) and r.deadline_hit:
+                chunks = None
+            if chunks is not None:
+                chunks.append(chunk)
+            yield chunk
+        if errors and (output in ("ndjson", "binary")):
+            yield __errors_chunk(output, errors)
+        if (chunks is not None) and (key is not None) and (di.response_cache is not None) and (not errors):
+            di.response_cache.set_item(key, b"".join(chunks))
+    except Exception as ex:
+        errors.append(ex)
+        error_handler.log_error(ex)
+        if output in ("ndjson", "binary"):
+            yield __errors_chunk(output, errors)
+        else:
+            yield (command_writer.error_marker_line(errors) + "\n").encode("utf-8")
+    finally:
+        di.service_stats.log_command(name=command, elapsed_ms=sw.elapsed_ms)
+
+
+def __chunk(output: str, verbosity: VerbosityLevel, result: SplitResult) -> bytes:
+    """Returns the streamed line or record for a split result."""
+    if output == "ndjson":
+        return (command_writer.word_split_line(verbosity, result) + "\n").encode("utf-8")
+    elif output == "tsv":
+        return (command_writer.word_split_tsv_line(verbosity, result) + "\n").encode("utf-8")
+    elif output == "binary":
+        return command_writer.word_split_record(verbosity, result)
+    return (command_writer.word_split_text_line(result) + "\n").encode("utf-8")
+
+
+def __errors_chunk(output: str, errors: List[Exception]) -> bytes:
+    """Returns the streamed errors line or record ending NDJSON or binary output."""
+    if output == "binary":
+        return command_writer.errors_record(errors)
+    return (command_writer.errors_line(errors) + "\n").encode("utf-8")
+
+
+def __write(output: str, verbosity: VerbosityLevel, inputs: List[str], options: SplitOptions, results: List[SplitResult],
+            elapsed: int, errors: List[Exception], pretty: bool = True) -> str:
+    """Writes the complete response for split results in JSON (indented, or compact if pretty is false), or nothing for
+    an unknown output format."""
+    if output == "json":
+        return command_writer.word_split(verbosity, inputs, options.pass_display, options.exhaustive, options.overlay, options.sources,
+                                         results, elapsed, errors, pretty)
+    return ""
+
+
+def __mimetype(output: str) -> str:
+    """Returns the mimetype of an output format."""
+    if output == "json":
+        return "application/json"
+    elif output == "ndjson":
+        return "application/x-ndjson"
+    elif output == "tsv":
+        return "text/tab-separated-values"
+    elif output == "binary":
+        return binary_format.MIMETYPE
+    return "text/plain"
+
+
+def __parse_bulk(body: bytes, mimetype: str, defaults: SplitOptions) -> List[Tuple[str, SplitOptions]]:
+    """Parses a bulk request body into (input, options) items, with each input truncated to its maximum length."""
+    records: List[Any]
+    if mimetype == binary_format.MIMETYPE:
+        records = binary_format.read_inputs(body)
+    elif (mimetype == "application/json") or body.lstrip().startswith(b"["):
+        records = json.loads(body.decode("utf-8"))
+        if not isinstance(records, list):
+            raise ValueError("Request body must be a JSON array, or newline-delimited JSON records.")
+    else:
+        records = [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+    if len(records) > config.bulk_max_items:
+        raise ValueError(f"Request has {len(records)} items, more than the limit of {config.bulk_max_items}.")
+    items: List[Tuple[str, SplitOptions]] = []
+    for r in records:
+        if isinstance(r, str):
+            items.append((defaults.limit_input(r), defaults))
+        elif isinstance(r, dict):
+            options = defaults.parse(r)
+            items.append((options.limit_input(str(r.get("input") or "")), options))
+        else:
+            raise ValueError(f"Bulk items must be strings or objects, not '{r}'.")
+    return items
+
+
+def __response(response: Union[str, bytes], output: str, etag: Optional[str], if_none_match: Optional[str] = None) -> HandlerResponse:
+    """Returns the response for a split, with its ETag and Cache-Control headers if cacheable, or 304 Not Modified
+    if the request's If-None-Match matches the ETag."""
+    if etag is None:
+        return HandlerResponse(response, __mimetype(output))
+    headers = {"ETag": "\"" + etag + "\"",
+               "Cache-Control": f"public, max-age={config.response_cache_max_age_secs}" if config.response_cache_max_age_secs > 0 else "no-cache"}
+    if if_none_match and any(t.strip() in ("*", headers["ETag"], "W/" + headers["ETag"]) for t in if_none_match.split(",")):
+        return HandlerResponse(b"", __mimetype(output), 304, headers)
+    return HandlerResponse(response, __mimetype(output), 200, headers)
@@ -0,0 +1,198 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import os
+import time
+import random
+import signal
+import socket
+from threading import Thread, Lock
+from typing import Dict, Optional
+from werkzeug.serving import ThreadedWSGIServer
+from service import app
+from service import routes
+from service import config
+from service import di
+from service import startup
+
+
+class PreforkServer:
+    """Production launcher: a master process loads the dictionary once and binds the listening socket, then forks
+    worker processes that share the loaded dictionary's memory pages copy-on-write (the dictionary's objects are
+    frozen out of garbage collection first, so workers don't touch them).  Each worker serves requests from the shared
+    socket on a threaded WSGI server.  The master replaces workers that exit, so a worker can be recycled gracefully
+    after a maximum number of requests (finishing its in-flight requests first).  Signals to the master:
+
+        SIGHUP            recycle all workers, one replacement forked before each old worker is stopped
+        SIGTERM, SIGINT   stop all workers gracefully, then exit
+
+    Workers stopping gracefully are killed if still running after the graceful timeout.  Worker 0 takes periodic
+    cache snapshots, and saves a final one when it stops.  Each worker starts its own split pool, if configured."""
+
+    # listen backlog of the shared socket
+    BACKLOG: int = 1024
+
+    def __init__(self, host: str, port: int, workers: int, max_requests: int = 0, max_requests_jitter: int = 0,
+                 graceful_timeout_secs: float = 30.0) -> None:
+        """Class constructor.  Max requests of zero never recycles workers; each worker's limit is increased by a random
+        amount up to the jitter, so workers don't all recycle at once."""
+        self.__host: str = host
+        self.__port: int = port
+        self.__worker_count: int = workers
+        self.__max_requests: int = max_requests
+        self.__max_requests_jitter: int = max_requests_jitter
+        self.__graceful_timeout_secs: float = graceful_timeout_secs
+        self.__socket: Optional[socket.socket] = None
+        self.__workers: Dict[int, int] = {}
+        self.__retiring: Dict[int, float] = {}
+        self.__recycle: bool = False
+        self.__stopping: bool = False
+
+    def run(self) -> None:
+        """Runs the master process until stopped."""
+        startup.load_version()
+        print(f" * Starting PyCentipede v{config.version} (pre-fork master {os.getpid()})")
+        startup.initialize(background=False)
+        self.__socket = socket.create_server((self.__host, self.__port), backlog=PreforkServer.BACKLOG, reuse_port=False)
+        self.__socket.set_inheritable(True)
+        print(f" * Listening on http://{self.__host}:{self.__port} with {self.__worker_count} workers..")
+        signal.signal(signal.SIGHUP, self.__on_recycle)
+        signal.signal(signal.SIGTERM, self.__on_stop)
+        signal.signal(signal.SIGINT, self.__on_stop)
+        try:
+            while not self.__stopping:
+                self.__reap()
+                if self.__recycle:
+                    self.__recycle = False
+                    self.__recycle_all()
+                for index in range(self.__worker_count):
+                    if index not in self.__workers.values():
+                        self.__spawn(index)
+                self.__kill_overdue()
+                time.sleep(0.25)
+            print(" * Stopping workers..")
+            for pid in list(self.__workers):
+                self.__retire(pid)
+            while self.__workers:
+                self.__reap()
+                self.__kill_overdue()
+                time.sleep(0.1)
+        finally:
+            self.__socket.close()
+        print(" * Service stopped.")
+
+    def __on_recycle(self, signum, frame) -> None:
+        """Signal handler: recycles all workers from the main loop."""
+        self.__recycle = True
+
+    def __on_stop(self, signum, frame) -> None:
+        """Signal handler: stops the main loop."""
+        self.__stopping = True
+
+    def __spawn(self, index: int) -> None:
+        """Forks a worker process for the worker slot."""
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self.__worker(index)
+                code = 0
+            except BaseException as ex:
+                print(f" * Worker {os.getpid()} failed: {ex}")
+            finally:
+                os._exit(code)
+        self.__workers[pid] = index
+
+    def __retire(self, pid: int) -> None:
+        """Asks a worker to stop gracefully."""
+        if pid not in self.__retiring:
+            self.__retiring[pid] = time.monotonic() + self.__graceful_timeout_secs
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def __recycle_all(self) -> None:
+        """Replaces every worker, forking each replacement before stopping the worker it replaces."""
+        print(" * Recycling workers..")
+        for pid, index in list(self.__workers.items()):
+            if pid not in self.__retiring:
+                self.__retire(pid)
+                self.__spawn(index)
+
+    def __reap(self) -> None:
+        """Forgets workers that have exited, so their slots are refilled."""
+        while self.__workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.__workers:
+                del self.__workers[pid]
+                code = self.__exit_code(status)
+                if (pid not in self.__retiring) and (code != 0):
+                    print(f" * Worker {pid} exited unexpectedly ({code})..")
+                self.__retiring.pop(pid, None)
+
+    @staticmethod
+    def __exit_code(status: int) -> int:
+        """Returns a worker's exit code from its wait status, or the negative signal number if a signal killed it."""
+        if os.WIFEXITED(status):
+            return os.WEXITSTATUS(status)
+        if os.WIFSIGNALED(status):
+            return -os.WTERMSIG(status)
+        return status
+
+    def __kill_overdue(self) -> None:
+        """Kills workers that haven't stopped within the graceful timeout."""
+        now = time.monotonic()
+        for pid, deadline in list(self.__retiring.items()):
+            if (now > deadline) and (pid in self.__workers):
+                print(f" * Killing worker {pid}, still running after {self.__graceful_timeout_secs} secs..")
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.__retiring[pid] = float("inf")
+
+    def __worker(self, index: int) -> None:
+        """Runs in a worker process: serves requests until asked to stop, or until the maximum requests is reached."""
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if di.shared_split_cache is not None:
+            di.shared_split_cache.after_fork()
+        random.seed()
+        snapshots = index == 0
+        startup.start_background(snapshots)
+
+        # count requests, stopping once the limit is reached
+        max_requests = self.__max_requests + (random.randint(0, self.__max_requests_jitter) if self.__max_requests_jitter > 0 else 0)
+        requests = 0
+        lock = Lock()
+        server: Optional[ThreadedWSGIServer] = None
+        listener = self.__socket
+        if listener is None:
+            raise RuntimeError("Listening socket not bound.")
+
+        def counting_app(environ, start_response):
+            nonlocal requests
+            with lock:
+                requests += 1
+                stop = requests == max_requests
+            if stop:
+                print(f" * Worker {os.getpid()} reached {max_requests} requests, recycling..")
+                Thread(target=server.shutdown).start()
+            return app(environ, start_response)
+
+        server = ThreadedWSGIServer(self.__host, self.__port, counting_app if self.__max_requests > 0 else app, fd=listener.fileno())
+        server.daemon_threads = False
+        signal.signal(signal.SIGTERM, lambda signum, frame: Thread(target=server.shutdown).start())
+        print(f" * Worker {os.getpid()} (slot {index}) serving..")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            startup.stop_background(snapshots)
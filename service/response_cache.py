@@ -0,0 +1,110 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import hashlib
+import time
+from typing import Optional, Tuple
+from collections import OrderedDict
+from threading import Lock
+from utils.json_writer import JsonWriter
+
+
+class ResponseCache:
+    """Stores final serialized responses in memory, keyed on the normalized query, so repeated identical queries are
+    answered with a single lookup instead of parsing, splitting and writing the response again.  Each response is
+    stored with an ETag (the SHA-1 of its bytes), for conditional requests.  The least recently used responses are
+    evicted to stay within the maximum number of items and bytes (if non-zero), and responses older than the maximum
+    age (if non-zero) are treated as misses."""
+
+    def __init__(self, max_items: int, max_bytes: int = 0, max_age_secs: float = 0.0) -> None:
+        """Class constructor."""
+        self.__max_items: int = max_items
+        self.__max_bytes: int = max_bytes
+        self.__max_age_secs: float = max_age_secs
+        self.__bytes: int = 0
+        self.__lock: Lock = Lock()
+        self.__cache: 'OrderedDict[str, Tuple[bytes, str, float]]' = OrderedDict()
+        self.__sets: int = 0
+        self.__hits: int = 0
+        self.__misses: int = 0
+        self.__evictions: int = 0
+        self.__expirations: int = 0
+
+    @property
+    def count(self) -> int:
+        """Returns number of responses in the cache."""
+        return len(self.__cache)
+
+    @property
+    def bytes_used(self) -> int:
+        """Returns number of response bytes in the cache."""
+        return self.__bytes
+
+    @staticmethod
+    def make_key(*params) -> str:
+        """Returns the cache key for a query, from its parsed parameters (with defaults applied) in a fixed order."""
+        return "\x1f".join(str(p) for p in params)
+
+    @staticmethod
+    def make_etag(data: bytes) -> str:
+        """Returns the ETag for a response body."""
+        return hashlib.sha1(data).hexdigest()
+
+    def set_item(self, key: str, data: bytes) -> str:
+        """Stores a response, evicting least recently used responses until it fits.  Returns its ETag.  Responses
+        larger than the byte budget are not stored."""
+        etag = ResponseCache.make_etag(data)
+        if (self.__max_items <= 0) or ((self.__max_bytes > 0) and (len(data) > self.__max_bytes)):
+            return etag
+        with self.__lock:
+            self.__sets += 1
+            existing = self.__cache.pop(key, None)
+            if existing is not None:
+                self.__bytes -= len(existing[0])
+            while (len(self.__cache) >= self.__max_items) \
+                    or ((self.__max_bytes > 0) and (self.__bytes + len(data) > self.__max_bytes)):
+                _, (evicted, _, _) = self.__cache.popitem(last=False)
+                self.__bytes -= len(evicted)
+                self.__evictions += 1
+            self.__cache[key] = (data, etag, time.monotonic())
+            self.__bytes += len(data)
+        return etag
+
+    def get_item(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Fetches the specified response and its ETag, or returns None if doesn't exist or has expired."""
+        with self.__lock:
+            item = self.__cache.get(key)
+            if (item is not None) and (self.__max_age_secs > 0) and (time.monotonic() - item[2] > self.__max_age_secs):
+                del self.__cache[key]
+                self.__bytes -= len(item[0])
+                self.__expirations += 1
+                item = None
+            if item is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            self.__cache.move_to_end(key)
+            return item[0], item[1]
+
+    def write_runtime_statistics(self, writer: JsonWriter) -> None:
+        """Writes runtime statistics."""
+        hits = self.__hits
+        misses = self.__misses
+        if (hits + misses) != 0:
+            percent = round((float(hits) / float(hits + misses)) * 100.0, 1)
+        else:
+            percent = 0.0
+        writer.write_start_object("responseCache")
+        writer.write_property_value("itemCount", self.count)
+        writer.write_property_value("maxItems", self.__max_items)
+        writer.write_property_value("bytesUsed", self.__bytes)
+        writer.write_property_value("maxBytes", self.__max_bytes)
+        writer.write_property_value("maxAgeSecs", self.__max_age_secs)
+        writer.write_property_value("sets", self.__sets)
+        writer.write_property_value("hits", hits)
+        writer.write_property_value("misses", misses)
+        writer.write_property_value("evictions", self.__evictions)
+        writer.write_property_value("expirations", self.__expirations)
+        writer.write_property_value("efficiencyPercent", percent)
+        writer.write_end_object()
@@ -0,0 +1,119 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+from typing import Any, Mapping, Optional, Set
+from utils.extensions import substring
+from splitter.enums import DictionarySource
+from splitter.sources import parse_sources
+from service import config
+
+
+class SplitOptions:
+    """Options for splitting an input, parsed from query string parameters or the fields of a bulk request item.
+    Fields that aren't present keep the values of the options they're parsed over, so a bulk item's options default
+    to the request's."""
+
+    def __init__(self, pass_display: int = 5, exhaustive: bool = False, cache: bool = True, cache_admit: bool = True,
+                 overlay: Optional[str] = None, sources: Optional[Set[DictionarySource]] = None, timeout_ms: Optional[int] = None) -> None:
+        """Class constructor.  A timeout of None uses the deadline from config."""
+        self.__pass_display: int = pass_display
+        self.__exhaustive: bool = exhaustive
+        self.__cache: bool = cache
+        self.__cache_admit: bool = cache_admit
+        self.__overlay: Optional[str] = overlay
+        self.__sources: Optional[Set[DictionarySource]] = sources
+        self.__timeout_ms: Optional[int] = timeout_ms
+
+    @property
+    def pass_display(self) -> int:
+        """Number of passes to return."""
+        return self.__pass_display
+
+    @property
+    def exhaustive(self) -> bool:
+        """True to split with the exhaustive limits."""
+        return self.__exhaustive
+
+    @property
+    def cache(self) -> bool:
+        """True to read from and write to the split cache."""
+        return self.__cache
+
+    @property
+    def cache_admit(self) -> bool:
+        """True to add new results to the split cache."""
+        return self.__cache_admit
+
+    @property
+    def overlay(self) -> Optional[str]:
+        """Name of the overlay dictionary to merge, if any."""
+        return self.__overlay
+
+    @property
+    def sources(self) -> Optional[Set[DictionarySource]]:
+        """Dictionary sources to match, or None for the defaults."""
+        return self.__sources
+
+    @property
+    def max_input_chars(self) -> int:
+        """Maximum input length, from config."""
+        return config.exhaustive_max_input_chars if self.__exhaustive else config.default_max_input_chars
+
+    @property
+    def max_terms(self) -> int:
+        """Maximum matched terms, from config."""
+        return config.exhaustive_max_terms if self.__exhaustive else config.default_max_terms
+
+    @property
+    def max_passes(self) -> int:
+        """Maximum passes, from config."""
+        return config.exhaustive_max_passes if self.__exhaustive else config.default_max_passes
+
+    @property
+    def deadline_ms(self) -> int:
+        """Milliseconds allowed for splitting, from the timeout if given or else config, or 0 for no deadline."""
+        if self.__timeout_ms is not None:
+            return self.__timeout_ms
+        return config.exhaustive_deadline_ms if self.__exhaustive else config.default_deadline_ms
+
+    def limit_input(self, input_: str) -> str:
+        """Returns the input, truncated to the maximum input length."""
+        return substring(input_, 0, self.max_input_chars) if len(input_) > self.max_input_chars else input_
+
+    def parse(self, params: Mapping[str, Any]) -> 'SplitOptions':
+        """Returns new options with any of the 'passdisplay', 'exhaustive', 'cache', 'cacheadmit', 'overlay', 'sources'
+        and 'timeout' fields present in the params replacing these options' values.  Params may be query string values,
+        or JSON values (numbers, booleans or strings)."""
+        return SplitOptions(int(SplitOptions.__get(params, "passdisplay", self.__pass_display)),
+                            SplitOptions.__flag(SplitOptions.__get(params, "exhaustive", self.__exhaustive)),
+                            SplitOptions.__flag(SplitOptions.__get(params, "cache", self.__cache)),
+                            SplitOptions.__flag(SplitOptions.__get(params, "cacheadmit", self.__cache_admit)),
+                            SplitOptions.__get(params, "overlay", self.__overlay) or None,
+                            SplitOptions.__sources_value(params.get("sources"), self.__sources),
+                            SplitOptions.__timeout_value(SplitOptions.__get(params, "timeout", self.__timeout_ms)))
+
+    @staticmethod
+    def __get(params: Mapping[str, Any], name: str, default: Any) -> Any:
+        """Returns the named param, or the default if it's missing or empty."""
+        value = params.get(name)
+        return default if (value is None) or (value == "") else value
+
+    @staticmethod
+    def __sources_value(value: Any, default: Optional[Set[DictionarySource]]) -> Optional[Set[DictionarySource]]:
+        """Parses a source list given as a string, or a JSON array of names or numbers."""
+        if not value:
+            return default
+        if isinstance(value, list):
+            value = ",".join(str(v) for v in value)
+        return parse_sources(value)
+
+    @staticmethod
+    def __timeout_value(value: Any) -> Optional[int]:
+        """Parses a timeout in milliseconds (0 for none), or returns None if not given."""
+        return max(0, int(value)) if value is not None else None
+
+    @staticmethod
+    def __flag(value: Any) -> bool:
+        """Parses a flag given as "1"/"0", 1/0 or true/false."""
+        return str(value).lower() in ("1", "true")
@@ -0,0 +1,72 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import os
+import atexit
+import signal
+from service import config
+from service import di
+
+
+"""Service startup and shutdown, shared by every entry point (the Flask development server, the ASGI app)."""
+
+
+def load_version() -> None:
+    """Reads the service version from the version file."""
+    with open("version") as f:
+        config.version = f.read().strip()
+
+
+def initialize(background: bool = True) -> None:
+    """Loads the dictionary, overlays and cache snapshot, and sets the service state to Up.  Unless background is
+    false (as for a pre-fork master process, whose workers start their own), also starts background services."""
+    print(" * Initializing word splitter..")
+    di.service_state.set_loading_data_state()
+    di.gc_manager.disable()
+    try:
+        di.dictionary.load_data(config.data_file)
+        for name, filename in config.overlays.items():
+            print(f" * Loading overlay '{name}'..")
+            di.dictionary.load_overlay(name, filename)
+    except BaseException:
+        di.gc_manager.enable()
+        raise
+    di.gc_manager.freeze()
+    if di.cache_snapshot is not None:
+        print(" * Loading split cache snapshot..")
+        di.cache_snapshot.load()
+    if background:
+        start_background()
+        atexit.register(stop_background)
+        if di.cache_snapshot is not None:
+            try:
+                signal.signal(signal.SIGTERM, shutdown)
+            except ValueError:
+                pass
+    di.service_state.set_up_state()
+    print(" * Service initialization complete!")
+
+
+def start_background(snapshots: bool = True) -> None:
+    """Starts the split pool, then periodic cache snapshots (unless snapshots is false).  The pool forks first, before
+    the snapshot thread is running."""
+    if config.pool_processes > 0:
+        print(f" * Starting {config.pool_processes} split pool processes..")
+        di.split_pool.start()
+    if snapshots and (di.cache_snapshot is not None):
+        di.cache_snapshot.start()
+
+
+def stop_background(snapshots: bool = True) -> None:
+    """Stops the split pool, and periodic cache snapshots (saving a final one) unless snapshots is false."""
+    di.split_pool.stop()
+    if snapshots and (di.cache_snapshot is not None):
+        di.cache_snapshot.stop()
+
+
+def shutdown(signum, frame) -> None:
+    """Signal handler: stops background services, saving a final cache snapshot, and exits."""
+    print(" * Saving split cache snapshot..")
+    stop_background()
+    os._exit(0)
@@ -0,0 +1,84 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+
+class AdmissionFilter:
+    """TinyLFU admission filter: estimates how often each key has been requested recently, so a full cache only
+    admits a new key when it's requested more often than the entry it would evict.  One-off keys (such as a bulk
+    job's inputs) are then kept out, rather than pushing hot keys out of the cache.  Frequencies are counted in a
+    count-min sketch of small saturating counters.  A key's first request only sets its bits in a doorkeeper Bloom
+    filter, so keys seen once never reach the sketch.  After a sample of requests ten times the capacity, all
+    counters are halved and the doorkeeper is cleared, so old popularity fades.  Not thread safe; callers lock."""
+
+    # number of counter rows, each indexed by a different hash
+    DEPTH: int = 4
+
+    # saturation value of each counter
+    MAX_COUNT: int = 15
+
+    def __init__(self, capacity: int) -> None:
+        """Class constructor.  Capacity is the number of items in the cache this filter guards."""
+        width = 16
+        while width < capacity:
+            width <<= 1
+        self.__mask: int = width - 1
+        self.__table: bytearray = bytearray(width * AdmissionFilter.DEPTH)
+        self.__doorkeeper: bytearray = bytearray(width)
+        self.__sample_size: int = max(capacity, 1) * 10
+        self.__additions: int = 0
+
+    def increment(self, key: str) -> None:
+        """Records a request for the key."""
+        h = hash(key)
+        h1 = h & 0xFFFFFFFF
+        h2 = ((h >> 32) & 0xFFFFFFFF) | 1
+        if not self.__in_doorkeeper(h1, h2):
+            self.__add_doorkeeper(h1, h2)
+        else:
+            width = self.__mask + 1
+            for i in range(AdmissionFilter.DEPTH):
+                index = (i * width) + ((h1 + (i * h2)) & self.__mask)
+                if self.__table[index] < AdmissionFilter.MAX_COUNT:
+                    self.__table[index] += 1
+        self.__additions += 1
+        if self.__additions >= self.__sample_size:
+            self.__reset()
+
+    def frequency(self, key: str) -> int:
+        """Returns the estimated recent request count for the key."""
+        h = hash(key)
+        h1 = h & 0xFFFFFFFF
+        h2 = ((h >> 32) & 0xFFFFFFFF) | 1
+        if not self.__in_doorkeeper(h1, h2):
+            return 0
+        width = self.__mask + 1
+        count = AdmissionFilter.MAX_COUNT
+        for i in range(AdmissionFilter.DEPTH):
+            count = min(count, self.__table[(i * width) + ((h1 + (i * h2)) & self.__mask)])
+        return count + 1
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        """Returns true if the candidate key should replace the victim key in the cache."""
+        return self.frequency(candidate) > self.frequency(victim)
+
+    def __in_doorkeeper(self, h1: int, h2: int) -> bool:
+        """Returns true if both doorkeeper bits for the hashes are set."""
+        bits = (self.__mask + 1) * 8
+        a = h1 % bits
+        b = (h1 + h2) % bits
+        return bool((self.__doorkeeper[a >> 3] >> (a & 7)) & 1) and bool((self.__doorkeeper[b >> 3] >> (b & 7)) & 1)
+
+    def __add_doorkeeper(self, h1: int, h2: int) -> None:
+        """Sets both doorkeeper bits for the hashes."""
+        bits = (self.__mask + 1) * 8
+        a = h1 % bits
+        b = (h1 + h2) % bits
+        self.__doorkeeper[a >> 3] |= 1 << (a & 7)
+        self.__doorkeeper[b >> 3] |= 1 << (b & 7)
+
+    def __reset(self) -> None:
+        """Halves all counters and clears the doorkeeper."""
+        self.__table = bytearray(c >> 1 for c in self.__table)
+        self.__doorkeeper = bytearray(len(self.__doorkeeper))
+        self.__additions = 0
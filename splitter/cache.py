@@ -2,101 +2,345 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
-from typing import Optional, Dict
+import sys
+import heapq
+from typing import Optional, Dict, List, Tuple
 from threading import Lock
-from uuid import UUID, uuid4
-from utils.simple_timer import SimpleTimer
-from utils.stopwatch import Stopwatch
 from utils.json_writer import JsonWriter
-from utils.service_stats import ServiceStats
-from splitter.split_result import SplitResult
+from splitter.split_record import SplitRecord
+from splitter.admission import AdmissionFilter
 
 
 class SplitCache:
-    """Stores split results in memory for quick access, periodically purging entries with fewest hits."""
+    """Stores split results in memory for quick access, as compact split records.  The cache is divided into stripes chosen by key hash,
+    each with its own lock and eviction state, so concurrent request threads rarely wait on each other.  When a
+    stripe is full, each insert evicts the entry with the fewest hits (least recently used among equals) in
+    constant time, using one bucket of entries per hit count.  The cache never holds more than the maximum
+    number of items, nor more than the maximum estimated bytes (if non-zero), and no periodic cleanup is needed.
+    Optionally, a full stripe only admits a new item if an AdmissionFilter estimates it's requested more often than
+    the item it would evict."""
 
-    def __init__(self, max_cache_items: int, cleanup_secs: float = 60.0, service_stats: Optional[ServiceStats] = None) -> None:
-        """Class constructor."""        
+    # minimum number of items per stripe, so small caches aren't split into uselessly small pieces
+    MIN_STRIPE_ITEMS: int = 64
+
+    def __init__(self, max_cache_items: int, max_cache_bytes: int = 0, stripes: int = 16, name: str = "splitCache",
+                 admission: bool = False) -> None:
+        """Class constructor.  The name identifies the cache in runtime statistics."""
+        self.__name: str = name
         self.__max_cache_items: int = max_cache_items
-        self.__service_stats: Optional[ServiceStats] = service_stats
-        self.__lock: Lock = Lock()
-        self.__cache: Dict[str, SplitCache.CacheItem] = {}
-        self.__sets: int = 0
-        self.__hits: int = 0
-        self.__misses: int = 0
-        self.__timer: SimpleTimer = SimpleTimer(cleanup_secs, self.__timer_callback)
-        self.__timer.start()
+        self.__max_cache_bytes: int = max_cache_bytes
+        self.__admission: bool = admission
+        stripe_count = max(1, min(stripes, max_cache_items // SplitCache.MIN_STRIPE_ITEMS))
+        self.__stripes: List[SplitCache.Stripe] = []
+        for i in range(stripe_count):
+            items = (max_cache_items // stripe_count) + (1 if i < (max_cache_items % stripe_count) else 0)
+            bytes_ = (max_cache_bytes // stripe_count) + (1 if i < (max_cache_bytes % stripe_count) else 0)
+            self.__stripes.append(SplitCache.Stripe(items, bytes_, admission))
 
     @property
     def count(self) -> int:
-        with self.__lock:
-            return len(self.__cache)
-          
-    def set_item(self, input_: str, result: SplitResult) -> None:
-        """Stores a result in the cache, indexed by input string."""
-        with self.__lock: 
-            self.__sets += 1
-            if input_ in self.__cache:
-                self.__cache[input_].increment_hits()
-            else:
-                self.__cache[input_] = SplitCache.CacheItem(input_, result)
-    
-    def get_item(self, input_: str) -> Optional[SplitResult]:
+        """Returns number of items in the cache."""
+        return sum(s.count for s in self.__stripes)
+
+    @property
+    def bytes_used(self) -> int:
+        """Returns estimated number of bytes used by items in the cache."""
+        return sum(s.bytes_used for s in self.__stripes)
+
+    @property
+    def stripe_count(self) -> int:
+        """Returns number of stripes the cache is divided into."""
+        return len(self.__stripes)
+
+    def set_item(self, input_: str, result: SplitRecord) -> None:
+        """Stores a result in the cache, indexed by input string, replacing any result already stored for it (keeping
+        its hits).  Evicts least frequently used items until the new item fits.  Items larger than the stripe's byte
+        budget are not stored, and remove any result already stored for the input."""
+        self.__stripe(input_).set_item(input_, result)
+
+    def get_item(self, input_: str) -> Optional[SplitRecord]:
         """Fetches specified result from the cache, or returns None if doesn't exist."""
-        with self.__lock:
-            if input_ in self.__cache:
-                self.__hits += 1
-                self.__cache[input_].increment_hits()
-                return self.__cache[input_].result
-            else:
-                self.__misses += 1
-                return None
-
-    def __timer_callback(self) -> None:
-        """Fired by timer, removes cached items with lowest hit counts."""
-        with self.__lock:
-            if len(self.__cache) > self.__max_cache_items:
-                task_id = uuid4()
-                if (self.__service_stats):
-                    task_id = self.__service_stats.begin_task(name="", total_iterations=int(len(self.__cache) - self.__max_cache_items * 0.9))
-                try:
-                    values = list(self.__cache.values())
-                    values.sort(key=lambda x: x.hits, reverse=False)
-                    while len(values) > self.__max_cache_items * 0.9:
-                        input_ = values.pop(0).input
-                        if input_ in self.__cache:
-                            self.__cache.pop(input_)                    
-                finally:
-                    if (self.__service_stats):
-                        self.__service_stats.end_task(task_id)
-    
+        return self.__stripe(input_).get_item(input_)
+
+    def peek(self, input_: str) -> Optional[SplitRecord]:
+        """Fetches specified result from the cache without counting a hit or miss, or a request to the admission
+        filter, or returns None if doesn't exist."""
+        return self.__stripe(input_).peek(input_)
+
+    def restore_item(self, input_: str, result: SplitRecord, hits: int) -> None:
+        """Stores a result with a previously recorded hit count, as when reloading a snapshot.  Bypasses admission."""
+        self.__stripe(input_).set_item(input_, result, hits, False)
+
+    def get_hottest(self, max_items: int) -> List[Tuple[str, int, SplitRecord]]:
+        """Returns up to the specified number of items with the most hits, as (input, hits, result) tuples.  Each
+        stripe is locked only long enough to copy its item list."""
+        items: List[SplitCache.CacheItem] = []
+        for s in self.__stripes:
+            items.extend(s.get_items())
+        hottest = heapq.nlargest(max_items, items, key=lambda x: x.hits)
+        return [(i.input, i.hits, i.result) for i in hottest]
+
+    def __stripe(self, input_: str) -> 'SplitCache.Stripe':
+        """Returns the stripe responsible for the key."""
+        return self.__stripes[hash(input_) % len(self.__stripes)]
+
     def write_runtime_statistics(self, writer: JsonWriter) -> None:
-        with self.__lock:
-            count = len(self.__cache)
-            sets = self.__sets
-            hits = self.__hits
-            misses = self.__misses
-            if (self.__hits + self.__misses) != 0:
-                percent = round((float(self.__hits) / float(self.__hits + self.__misses)) * 100.0, 1)
-            else:
-                percent = 0.0
-        writer.write_start_object("splitCache")
+        """Writes runtime statistics, summed across stripes.  Stripe counters are read without locking, so the
+        totals are a close approximation while the cache is busy."""
+        count = 0
+        bytes_used = 0
+        sets = 0
+        hits = 0
+        misses = 0
+        evictions = 0
+        admitted = 0
+        rejected = 0
+        for s in self.__stripes:
+            count += s.count
+            bytes_used += s.bytes_used
+            sets += s.sets
+            hits += s.hits
+            misses += s.misses
+            evictions += s.evictions
+            admitted += s.admitted
+            rejected += s.rejected
+        if (hits + misses) != 0:
+            percent = round((float(hits) / float(hits + misses)) * 100.0, 1)
+        else:
+            percent = 0.0
+        writer.write_start_object(self.__name)
         writer.write_property_value("itemCount", count)
+        writer.write_property_value("maxItems", self.__max_cache_items)
+        writer.write_property_value("bytesUsed", bytes_used)
+        writer.write_property_value("maxBytes", self.__max_cache_bytes)
+        writer.write_property_value("stripes", len(self.__stripes))
         writer.write_property_value("sets", sets)
         writer.write_property_value("hits", hits)
         writer.write_property_value("misses", misses)
+        writer.write_property_value("evictions", evictions)
+        writer.write_property_value("admission", self.__admission)
+        writer.write_property_value("admitted", admitted)
+        writer.write_property_value("rejected", rejected)
         writer.write_property_value("efficiencyPercent", percent)
         writer.write_end_object()
-    
+
+    class Stripe:
+        """Internal class holding one independently locked portion of the cache, with its own eviction state."""
+
+        def __init__(self, max_items: int, max_bytes: int, admission: bool = False) -> None:
+            """Class constructor."""
+            self.__max_items: int = max_items
+            self.__max_bytes: int = max_bytes
+            self.__bytes: int = 0
+            self.__lock: Lock = Lock()
+            self.__cache: Dict[str, SplitCache.CacheItem] = {}
+            self.__buckets: Dict[int, Dict[str, SplitCache.CacheItem]] = {}
+            self.__lower: Dict[int, int] = {}
+            self.__higher: Dict[int, int] = {}
+            self.__min_hits: int = 0
+            self.__sets: int = 0
+            self.__hits: int = 0
+            self.__misses: int = 0
+            self.__evictions: int = 0
+            self.__admitted: int = 0
+            self.__rejected: int = 0
+            self.__filter: Optional[AdmissionFilter] = AdmissionFilter(max_items) if admission and (max_items > 0) else None
+
+        @property
+        def count(self) -> int:
+            """Returns number of items in the stripe."""
+            return len(self.__cache)
+
+        @property
+        def bytes_used(self) -> int:
+            """Returns estimated number of bytes used by items in the stripe."""
+            return self.__bytes
+
+        @property
+        def sets(self) -> int:
+            """Returns number of set operations."""
+            return self.__sets
+
+        @property
+        def hits(self) -> int:
+            """Returns number of get operations that found an item."""
+            return self.__hits
+
+        @property
+        def misses(self) -> int:
+            """Returns number of get operations that found nothing."""
+            return self.__misses
+
+        @property
+        def evictions(self) -> int:
+            """Returns number of items evicted."""
+            return self.__evictions
+
+        @property
+        def admitted(self) -> int:
+            """Returns number of new items admitted by the admission filter while the stripe was full."""
+            return self.__admitted
+
+        @property
+        def rejected(self) -> int:
+            """Returns number of new items rejected by the admission filter."""
+            return self.__rejected
+
+        def set_item(self, input_: str, result: SplitRecord, hits: int = 1, filtered: bool = True) -> None:
+            """Stores or replaces a result, evicting least frequently used items until it fits.  If the stripe is full
+            and has an admission filter, a new item is only stored if the filter admits it over the next victim.  A
+            result too large to store removes any result already stored for it, so it isn't served instead."""
+            size = 0
+            if self.__max_bytes > 0:
+                size = result.estimate_size() + sys.getsizeof(input_) + SplitCache.CacheItem.OVERHEAD_BYTES
+                if size > self.__max_bytes:
+                    with self.__lock:
+                        existing = self.__cache.get(input_)
+                        if existing is not None:
+                            self.__remove(existing)
+                    return
+            with self.__lock:
+                self.__sets += 1
+                lower = None
+                existing = self.__cache.get(input_)
+                if existing is not None:
+                    if existing.result is result:
+                        self.__touch(existing)
+                        return
+                    hits = existing.hits + 1
+                    lower = self.__remove(existing)
+                elif filtered and (self.__filter is not None) and (len(self.__cache) >= self.__max_items):
+                    if not self.__filter.admit(input_, self.__victim().input):
+                        self.__rejected += 1
+                        return
+                    self.__admitted += 1
+                if self.__max_items > 0:
+                    while (len(self.__cache) >= self.__max_items) \
+                            or ((self.__max_bytes > 0) and (self.__bytes + size > self.__max_bytes)):
+                        self.__evict()
+                    if lower is None:
+                        lower = self.__find_lower(hits)
+                    elif lower not in self.__buckets:
+                        lower = 0
+                    item = SplitCache.CacheItem(input_, result, size, hits)
+                    self.__cache[input_] = item
+                    self.__bucket(hits, lower)[input_] = item
+                    self.__bytes += size
+
+        def get_items(self) -> List['SplitCache.CacheItem']:
+            """Returns a copy of the list of items."""
+            with self.__lock:
+                return list(self.__cache.values())
+
+        def get_item(self, input_: str) -> Optional[SplitRecord]:
+            """Fetches specified result, or returns None if doesn't exist."""
+            with self.__lock:
+                if self.__filter is not None:
+                    self.__filter.increment(input_)
+                item = self.__cache.get(input_)
+                if item is not None:
+                    self.__hits += 1
+                    self.__touch(item)
+                    return item.result
+                else:
+                    self.__misses += 1
+                    return None
+
+        def peek(self, input_: str) -> Optional[SplitRecord]:
+            """Fetches specified result without side effects, or returns None if doesn't exist."""
+            with self.__lock:
+                item = self.__cache.get(input_)
+                return item.result if item is not None else None
+
+        def __bucket(self, hits: int, lower: int) -> Dict[str, 'SplitCache.CacheItem']:
+            """Returns the bucket of items with the specified hit count, creating it if needed.  Buckets are
+            insertion ordered, so the first item in a bucket is the least recently used.  Buckets are also linked in
+            order of hit count, so the fewest hits are always known; a new bucket is linked just above the given
+            lower hit count (the largest with a bucket below it, or 0 if none)."""
+            bucket = self.__buckets.get(hits)
+            if bucket is None:
+                bucket = {}
+                self.__buckets[hits] = bucket
+                higher = self.__higher[lower] if lower else self.__min_hits
+                self.__lower[hits] = lower
+                self.__higher[hits] = higher
+                if lower:
+                    self.__higher[lower] = hits
+                else:
+                    self.__min_hits = hits
+                if higher:
+                    self.__lower[higher] = hits
+            return bucket
+
+        def __unlink(self, hits: int) -> None:
+            """Removes an empty bucket, linking its neighbours."""
+            del self.__buckets[hits]
+            lower = self.__lower.pop(hits)
+            higher = self.__higher.pop(hits)
+            if lower:
+                self.__higher[lower] = higher
+            else:
+                self.__min_hits = higher
+            if higher:
+                self.__lower[higher] = lower
+
+        def __find_lower(self, hits: int) -> int:
+            """Returns the largest hit count with a bucket below the specified one, or 0 if none.  Walks up from the
+            fewest hits, so it's immediate for new items, and for snapshots (restored hottest first)."""
+            lower = 0
+            current = self.__min_hits
+            while current and (current < hits):
+                lower = current
+                current = self.__higher[current]
+            return lower
+
+        def __touch(self, item: 'SplitCache.CacheItem') -> None:
+            """Increments an item's hit count, moving it to the next bucket."""
+            hits = item.hits
+            bucket = self.__buckets[hits]
+            del bucket[item.input]
+            item.increment_hits()
+            self.__bucket(item.hits, hits)[item.input] = item
+            if not bucket:
+                self.__unlink(hits)
+
+        def __victim(self) -> 'SplitCache.CacheItem':
+            """Returns the least recently used item with the fewest hits, the next to be evicted."""
+            return next(iter(self.__buckets[self.__min_hits].values()))
+
+        def __evict(self) -> None:
+            """Removes the least recently used item with the fewest hits."""
+            self.__remove(self.__victim())
+            self.__evictions += 1
+
+        def __remove(self, item: 'SplitCache.CacheItem') -> int:
+            """Removes an item from the cache and its bucket.  Returns the largest hit count still with a bucket, up to
+            the item's own, or 0 if none."""
+            bucket = self.__buckets[item.hits]
+            del bucket[item.input]
+            lower = item.hits
+            if not bucket:
+                lower = self.__lower[item.hits]
+                self.__unlink(item.hits)
+            del self.__cache[item.input]
+            self.__bytes -= item.size
+            return lower
+
     class CacheItem:
-        """Internal class to store result, along with hit count."""
-        
-        def __init__(self, input_: str, result: SplitResult) -> None:
+        """Internal class to store result, along with hit count and estimated size."""
+
+        __slots__ = ("__input", "__hits", "__result", "__size")
+
+        # approximate bytes used by the item object and its entries in the cache and bucket dicts
+        OVERHEAD_BYTES: int = 200
+
+        def __init__(self, input_: str, result: SplitRecord, size: int = 0, hits: int = 1) -> None:
             """Class constructor."""
             self.__input: str = input_
-            self.__hits: int = 1
-            self.__result: SplitResult = result
-        
+            self.__hits: int = hits
+            self.__result: SplitRecord = result
+            self.__size: int = size
+
         @property
         def input(self) -> str:
             """Returns original input."""
@@ -108,10 +352,15 @@ class SplitCache:
             return self.__hits
 
         @property
-        def result(self) -> SplitResult:
+        def result(self) -> SplitRecord:
             """Returns stored result."""
             return self.__result
-        
+
+        @property
+        def size(self) -> int:
+            """Returns estimated size in bytes, or zero if the cache has no byte budget."""
+            return self.__size
+
         def increment_hits(self) -> None:
             """Increments hit count by one."""
             self.__hits += 1
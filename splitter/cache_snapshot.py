@@ -0,0 +1,97 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import os
+import zlib
+import marshal
+from typing import Optional
+from uuid import uuid4
+from threading import Lock
+from utils import error_handler
+from utils.simple_timer import SimpleTimer
+from utils.service_stats import ServiceStats
+from splitter.cache import SplitCache
+from splitter.dictionary import Dictionary
+from splitter.record_codec import encode_record, decode_record
+
+
+class CacheSnapshot:
+    """Saves the hottest split cache entries, with their hit counts, to a compact file on disk (periodically and
+    on shutdown), and reloads them on startup so a restarted service begins with a warm cache.  Snapshots are
+    tagged with the dictionary version, and a snapshot taken against different dictionary data is discarded."""
+
+    # bump when the file layout or encoded result layout changes
+    FORMAT_VERSION: int = 3
+
+    def __init__(self, cache: SplitCache, dictionary: Dictionary, filename: str, max_items: int,
+                 interval_secs: float = 300.0, service_stats: Optional[ServiceStats] = None) -> None:
+        """Class constructor."""
+        self.__cache: SplitCache = cache
+        self.__dictionary: Dictionary = dictionary
+        self.__filename: str = filename
+        self.__max_items: int = max_items
+        self.__service_stats: Optional[ServiceStats] = service_stats
+        self.__lock: Lock = Lock()
+        self.__timer: SimpleTimer = SimpleTimer(interval_secs, self.__timer_callback)
+
+    def start(self) -> None:
+        """Starts periodic snapshots."""
+        self.__timer.start()
+
+    def stop(self) -> None:
+        """Stops periodic snapshots and saves a final one."""
+        self.__timer.stop()
+        self.save()
+
+    def save(self) -> int:
+        """Writes the hottest cache entries to the snapshot file, replacing it atomically.  Returns the number
+        of entries written."""
+        with self.__lock:
+            task_id = uuid4()
+            if (self.__service_stats):
+                task_id = self.__service_stats.begin_task("save_cache_snapshot", self.__max_items)
+            try:
+                entries = [(key, hits, encode_record(result)) for key, hits, result in self.__cache.get_hottest(self.__max_items)]
+                data = zlib.compress(marshal.dumps((CacheSnapshot.FORMAT_VERSION, self.__dictionary.version, entries)))
+                temp_filename = self.__filename + ".tmp"
+                with open(temp_filename, "wb") as f:
+                    f.write(data)
+                os.replace(temp_filename, self.__filename)
+                return len(entries)
+            finally:
+                if (self.__service_stats):
+                    self.__service_stats.end_task(task_id)
+
+    def load(self) -> int:
+        """Reloads entries from the snapshot file into the cache, coldest first so the hottest survive if the cache
+        is smaller than the snapshot.  Must be called after the dictionary has loaded.  A missing, unreadable, or
+        stale snapshot is discarded.  Returns the number of entries loaded."""
+        if not os.path.isfile(self.__filename):
+            return 0
+        task_id = uuid4()
+        if (self.__service_stats):
+            task_id = self.__service_stats.begin_task("load_cache_snapshot")
+        try:
+            try:
+                with open(self.__filename, "rb") as f:
+                    format_version, dictionary_version, entries = marshal.loads(zlib.decompress(f.read()))
+            except Exception as ex:
+                error_handler.log_error(ex)
+                return 0
+            if (format_version != CacheSnapshot.FORMAT_VERSION) or (dictionary_version != self.__dictionary.version):
+                print(" * Discarding stale split cache snapshot..")
+                return 0
+            for key, hits, data in reversed(entries):
+                self.__cache.restore_item(key, decode_record(data), hits)
+            return len(entries)
+        finally:
+            if (self.__service_stats):
+                self.__service_stats.end_task(task_id)
+
+    def __timer_callback(self) -> None:
+        """Fired by timer, saves a snapshot."""
+        try:
+            self.save()
+        except Exception as ex:
+            error_handler.log_error(ex)
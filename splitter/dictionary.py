@@ -2,15 +2,19 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
+import hashlib
 from typing import List, Dict, Optional, Tuple
-from threading import Event
+from threading import Event, Lock
 from uuid import uuid4
 from utils.extensions import has_numbers
+from utils.text_file import open_text, is_compressed, read_line_count
 from utils.stopwatch import Stopwatch
 from utils.service_stats import ServiceStats
 from splitter.pyahocorasick import Trie
 from splitter.term import Term
+from splitter.overlay import Overlay
 from splitter.enums import DictionarySource
+from splitter.sources import ALL_SOURCES, DEFAULT_SOURCES
 
 
 class Dictionary:
@@ -20,13 +24,18 @@ class Dictionary:
         """Class constructor."""
         self.__service_stats: Optional[ServiceStats] = service_stats
         self.__terms: List[Term] = []
+        self.__default_terms: List[Term] = []
         self.__terms_by_compressed: Dict[str, List[Term]] = {}
         self.__special_numbers: List[Term] = []
         self.__word_search: Trie = Trie()
+        self.__overlays: Dict[str, Overlay] = {}
+        self.__overlay_lock: Lock = Lock()
+        self.__version: str = ""
         self.__signal: Event = Event()
 
     def load_data(self, filename: str) -> None:
-        """Loads the dictionary file and creates necessary collections."""
+        """Loads the dictionary file and creates necessary collections.  The file can be plain text, or compressed
+        (.gz, .bz2, .xz, .zst) in which case it is decoded in streaming mode as it is parsed."""
 
         # count file lines (for stats purposes, very fast)
         print(" * Estimating dictionary size..")
@@ -34,7 +43,7 @@ class Dictionary:
         
         # load word lists
         print(" * Loading terms from dictionary file..")
-        terms_by_full = self.__load_terms(filename, line_count)
+        terms_by_full, version = self.__load_terms(filename, line_count)
 
         # create other collections
         print(" * Building additional collections..")
@@ -46,18 +55,26 @@ class Dictionary:
 
         # store
         self.__terms = terms
+        self.__default_terms = [t for t in terms if t.source_mask & DEFAULT_SOURCES]
         self.__terms_by_compressed = terms_by_compressed
         self.__special_numbers = special_numbers
+        self.__version = version
         
         # set signal
         self.__signal.set()
 
     def __estimate_dictionary_size(self, filename: str) -> int:
-        """Counts number of lines in file.. binary optimized."""
+        """Counts number of lines in file.. binary optimized.  Uses the count from a sidecar file or header line if
+        present, and never makes an extra full pass over a compressed file (returns zero if the count is unknown)."""
         task_id = uuid4()
         if (self.__service_stats):
             task_id =self.__service_stats.begin_task("estimate_dictionary_size")
         try:
+            stored_count = read_line_count(filename)
+            if stored_count is not None:
+                return stored_count
+            if is_compressed(filename):
+                return 0
             def blocks(files, size=65536):
                 while True:
                     b = files.read(size)
@@ -70,15 +87,16 @@ class Dictionary:
             if (self.__service_stats):
                 self.__service_stats.end_task(task_id)
 
-    def __load_terms(self, filename: str, line_count: int) -> Dict[str, Term]:
-        """Loads dictionary terms from prebuilt text file."""
+    def __load_terms(self, filename: str, line_count: int) -> Tuple[Dict[str, Term], str]:
+        """Loads dictionary terms from prebuilt text file.  Also returns a hash of the file contents, as its version."""
         task_id = uuid4()
         if (self.__service_stats):
             task_id = self.__service_stats.begin_task("load_dictionary_terms", line_count)
         try:
             terms_by_full: Dict[str, Term] = {}
+            digest = hashlib.sha1()
             count = 0
-            with open(filename, "rt") as f:
+            with open_text(filename) as f:
                 for line in f:
                     if (self.__service_stats):
                         count += 1                    
@@ -86,23 +104,28 @@ class Dictionary:
                             self.__service_stats.update_task(task_id, count, True)                
                     if line.startswith("#"):
                         continue
-                    split = line.rstrip("\r\n").split("\t")
-                    text = split[0]
-                    freq = float(split[1])
-                    multi = float(split[2])
-                    sources_str = split[3].split("|")
-                    sources = set()
-                    for source_str in sources_str:
-                        s = DictionarySource(int(source_str))
-                        sources.add(s)
-                    t = Term(text, freq, multi, sources)
-                    if (DictionarySource.Adult not in t.sources) or (len(t.sources) > 1):
-                        terms_by_full[text] = t
-            return terms_by_full
+                    digest.update(line.encode("utf-8"))
+                    t = self.__parse_term(line)
+                    terms_by_full[t.full] = t
+            return terms_by_full, digest.hexdigest()[:16]
         finally:
             if (self.__service_stats):
                 self.__service_stats.end_task(task_id)
 
+    @staticmethod
+    def __parse_term(line: str) -> Term:
+        """Parses a single tab-delimited dictionary line (text, frequency, multiplier, sources)."""
+        split = line.rstrip("\r\n").split("\t")
+        text = split[0]
+        freq = float(split[1])
+        multi = float(split[2])
+        sources_str = split[3].split("|")
+        sources = set()
+        for source_str in sources_str:
+            s = DictionarySource(int(source_str))
+            sources.add(s)
+        return Term(text, freq, multi, sources)
+
     def __create_collections(self, terms_by_full: Dict[str, Term]) -> Tuple[Dict[str, List[Term]], List[Term], List[Term]]:
         """Creates the necessary collections."""
         task_id = uuid4()
@@ -141,45 +164,129 @@ class Dictionary:
                     count += 1
                     if (count % 1000) == 0:
                         self.__service_stats.update_task(task_id, count, True)
-                self.__word_search.add_word(term.compressed, term.compressed)
+                self.__word_search.add_word(term.compressed, term.compressed, term.source_mask)
             self.__word_search.make_automaton()
         finally:
             if (self.__service_stats):
                 self.__service_stats.end_task(task_id)
 
-    def get_terms(self) -> List[Term]:
-        """Returns a pointer to the latest term list."""
+    def after_fork(self) -> None:
+        """Replaces the locks inherited by a forked child process, which another thread of the parent may have held as
+        it forked.  The loaded terms are shared with the parent unchanged."""
+        loaded = self.__signal.is_set()
+        self.__overlay_lock = Lock()
+        self.__signal = Event()
+        if loaded:
+            self.__signal.set()
+
+    def load_overlay(self, name: str, filename: str) -> None:
+        """Loads (or reloads) a named overlay from a file in the same format as the dictionary file."""
+        terms: List[Term] = []
+        with open_text(filename) as f:
+            for line in f:
+                if line.startswith("#") or (not line.strip()):
+                    continue
+                terms.append(self.__parse_term(line))
+        self.add_overlay(name, terms)
+
+    def add_overlay(self, name: str, terms: List[Term]) -> None:
+        """Adds (or replaces) a named overlay built from the supplied terms."""
+        overlay = Overlay(name, terms)
+        with self.__overlay_lock:
+            overlays = self.__overlays.copy()
+            overlays[name] = overlay
+            self.__overlays = overlays
+
+    def remove_overlay(self, name: str) -> None:
+        """Removes a named overlay, if it exists."""
+        with self.__overlay_lock:
+            overlays = self.__overlays.copy()
+            overlays.pop(name, None)
+            self.__overlays = overlays
+
+    def get_overlay(self, name: Optional[str]) -> Optional[Overlay]:
+        """Returns the named overlay, None if no name is given, or raises ValueError if the name is unknown."""
+        if not name:
+            return None
+        overlay = self.__overlays.get(name)
+        if overlay is None:
+            raise ValueError(f"Unknown overlay '{name}'.")
+        return overlay
+
+    def get_overlay_names(self) -> List[str]:
+        """Returns names of all loaded overlays."""
+        return sorted(self.__overlays.keys())
+
+    def __get_candidates(self, compressed_text: str, overlay: Optional[Overlay], sources: int) -> Optional[List[Term]]:
+        """Returns all terms sharing the compressed text, with overlay terms replacing base terms of the same full text.
+        Terms not found in any of the sources in the mask are excluded."""
+        ts = self.__terms_by_compressed.get(compressed_text)
+        if overlay is not None:
+            overlay_ts = overlay.terms_by_compressed.get(compressed_text)
+            if overlay_ts is not None:
+                merged = list(overlay_ts)
+                if ts is not None:
+                    for t in ts:
+                        if not any(o.full == t.full for o in overlay_ts):
+                            merged.append(t)
+                ts = merged
+        if (ts is not None) and any(not (t.source_mask & sources) for t in ts):
+            ts = [t for t in ts if t.source_mask & sources]
+        return ts
+
+    @property
+    def version(self) -> str:
+        """Returns a hash of the loaded dictionary file's terms, used to recognize results computed against other data."""
         self.__signal.wait()
-        return self.__terms
+        return self.__version
 
-    def get_size(self) -> int:
-        """Returns number of terms in the dictionary."""
+    def get_terms(self, sources: int = DEFAULT_SOURCES) -> List[Term]:
+        """Returns a pointer to the latest list of terms found in any of the sources in the mask.  By default, terms
+        hidden from default requests (Adult only) are excluded, as they were before all sources were loaded."""
         self.__signal.wait()
-        return len(self.__terms)
+        if sources == DEFAULT_SOURCES:
+            return self.__default_terms
+        if sources == ALL_SOURCES:
+            return self.__terms
+        return [t for t in self.__terms if t.source_mask & sources]
+
+    def get_size(self, sources: int = DEFAULT_SOURCES) -> int:
+        """Returns number of terms in the dictionary found in any of the sources in the mask (by default, excluding
+        terms hidden from default requests)."""
+        return len(self.get_terms(sources))
 
     def get_special_numbers(self) -> List[Term]:
         """Returns pointer to list of special numbers."""
         self.__signal.wait()
         return self.__special_numbers
 
-    def find_matching_terms(self, unsplit_input: str, min_chars: int) -> List[Term]:
-        """Returns a list of all words contained within the unsplit input.  Optionally excludes words that are too small."""
+    def find_matching_terms(self, unsplit_input: str, min_chars: int, overlay: Optional[Overlay] = None,
+                            sources: int = DEFAULT_SOURCES) -> List[Term]:
+        """Returns a list of all words contained within the unsplit input.  Optionally excludes words that are too small.
+        If an overlay is given, its terms are searched too and merged with the base dictionary.  Only terms found in
+        one of the sources in the mask are reported; the rest are skipped by the search itself."""
         self.__signal.wait()
-        search_results = self.__word_search.find_all(unsplit_input)
+        search_results = self.__word_search.find_all(unsplit_input, sources)
+        if overlay is not None:
+            found = set(search_results)
+            for r in overlay.find_all(unsplit_input, sources):
+                if r not in found:
+                    search_results.append(r)
         terms: List[Term] = []
         for r in search_results:
-            if r in self.__terms_by_compressed:
-                ts = self.__terms_by_compressed[r]
+            ts = self.__get_candidates(r, overlay, sources)
+            if ts is not None:
                 for term in ts:
                     if term.char_count >= min_chars:
                         terms.append(term)
         return terms
 
-    def find_term(self, compressed_text: str) -> Optional[Term]:
-        """Returns the matching Term object if it exists in the dictionary."""
+    def find_term(self, compressed_text: str, overlay: Optional[Overlay] = None, sources: int = DEFAULT_SOURCES) -> Optional[Term]:
+        """Returns the matching Term object if it exists in the dictionary (or the overlay, if given), and was found in
+        one of the sources in the mask."""
         self.__signal.wait()
-        if compressed_text in self.__terms_by_compressed:
-            ts = self.__terms_by_compressed[compressed_text]
+        ts = self.__get_candidates(compressed_text, overlay, sources)
+        if ts:
             best_term = ts[0]
             if len(ts) > 1:
                 for t in ts:
@@ -188,11 +295,17 @@ class Dictionary:
             return best_term
         return None
 
-    def find_single_word_term(self, compressed_text: str) -> Optional[Term]:
+    def find_terms(self, compressed_text: str, overlay: Optional[Overlay] = None, sources: int = DEFAULT_SOURCES) -> Optional[List[Term]]:
+        """Returns all terms sharing the compressed text (merged with the overlay, if given) and found in one of the
+        sources in the mask, in a stable order.  Returns None or an empty list if there are none."""
+        self.__signal.wait()
+        return self.__get_candidates(compressed_text, overlay, sources)
+
+    def find_single_word_term(self, compressed_text: str, overlay: Optional[Overlay] = None, sources: int = DEFAULT_SOURCES) -> Optional[Term]:
         """Returns the matching Term object if it exists in the dictionary.  Word must be a unigram, or nothing is returned."""
         self.__signal.wait()
-        if compressed_text in self.__terms_by_compressed:
-            ts = self.__terms_by_compressed[compressed_text]
+        ts = self.__get_candidates(compressed_text, overlay, sources)
+        if ts is not None:
             if len(ts) > 0:
                 highest_freq = 0.0
                 highest_term = None
@@ -0,0 +1,49 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import hashlib
+from typing import List, Dict
+from splitter.pyahocorasick import Trie
+from splitter.term import Term
+from splitter.sources import DEFAULT_SOURCES
+
+
+class Overlay:
+    """A small, named set of extra terms (brands, products, boosted frequencies) that is merged with the base
+    dictionary at query time.  Each overlay has its own tiny search index, so loading one takes milliseconds
+    rather than a full dictionary rebuild.  An overlay term replaces any base term with the same full text."""
+
+    def __init__(self, name: str, terms: List[Term]) -> None:
+        """Class constructor."""
+        self.__name: str = name
+        self.__terms_by_compressed: Dict[str, List[Term]] = {}
+        self.__word_search: Trie = Trie()
+        digest = hashlib.sha1()
+        for term in terms:
+            digest.update(f"{term.full}\t{term.frequency}\t{term.multiplier}\t{term.source_mask}\n".encode("utf-8"))
+            if term.compressed not in self.__terms_by_compressed:
+                self.__terms_by_compressed[term.compressed] = []
+            self.__terms_by_compressed[term.compressed].append(term)
+            self.__word_search.add_word(term.compressed, term.compressed, term.source_mask)
+        self.__word_search.make_automaton()
+        self.__version: str = digest.hexdigest()[:12]
+
+    @property
+    def name(self) -> str:
+        """The name clients use to select this overlay."""
+        return self.__name
+
+    @property
+    def key(self) -> str:
+        """Identifies the overlay and a hash of its contents, so results cached against different contents are not reused."""
+        return self.__name + "#" + self.__version
+
+    @property
+    def terms_by_compressed(self) -> Dict[str, List[Term]]:
+        """Overlay terms, indexed by compressed text."""
+        return self.__terms_by_compressed
+
+    def find_all(self, unsplit_input: str, sources: int = DEFAULT_SOURCES) -> List[str]:
+        """Returns the compressed text of every overlay term contained within the input, from any of the sources in the mask."""
+        return self.__word_search.find_all(unsplit_input, sources)
@@ -12,11 +12,12 @@ nil = object()
 
 class TrieNode(object):
 
-    __slots__ = ['char', 'output', 'fail', 'children']
+    __slots__ = ['char', 'output', 'mask', 'fail', 'children']
     
     def __init__(self, char):
         self.char = char
         self.output = nil
+        self.mask = 0
         self.fail = nil
         self.children = {}
     
@@ -90,7 +91,23 @@ class Trie(object):
 
         return n
 
-    def add_word(self, word, value):
+    def node_count(self):
+        stack = deque()
+        stack.append(self.root)
+        seen = set()
+        n = 0
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            n += 1
+            for child in node.children.values():
+                stack.append(child)
+
+        return n
+
+    def add_word(self, word, value, mask=0):
         if not word:
             return
         node = self.root
@@ -102,6 +119,7 @@ class Trie(object):
                 node.children[c] = n
                 node = n
         node.output = value
+        node.mask |= mask
 
     def clear(self):
         self.root = TrieNode('')
@@ -139,7 +157,7 @@ class Trie(object):
                     # print(ex)
                     pass
 
-    def iter(self, string):
+    def iter(self, string, mask=None):
         state = self.root
         for index, c in enumerate(string):
             while c not in state.children:
@@ -148,15 +166,15 @@ class Trie(object):
             tmp = state
             output = []
             while tmp is not nil:
-                if tmp.output is not nil:
+                if (tmp.output is not nil) and ((mask is None) or (tmp.mask & mask)):
                     output.append(tmp.output)
                 tmp = tmp.fail
             if output:
                 yield index, output
 
-    def find_all(self, string: str) -> List[str]:
+    def find_all(self, string: str, mask: int = None) -> List[str]:
         words: List[str] = []
-        for item_tuple in self.iter(string):
+        for item_tuple in self.iter(string, mask):
             for word in item_tuple[1]:
                 words.append(word)
         return words
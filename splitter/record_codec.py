@@ -0,0 +1,30 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+from typing import Tuple, Any
+from splitter.split_record import SplitRecord
+
+
+"""Converts split records to and from tuples of plain values (strings, numbers, tuples), suitable for marshalling
+to disk or sharing between processes.  Passes are stored as spans against the dictionary, so records must be
+decoded by a service using the same dictionary data (check Dictionary.version)."""
+
+
+def encode_record(record: SplitRecord) -> Tuple[Any, ...]:
+    """
+    Encodes a split record as a tuple of plain values.
+    :param record: The split record.
+    :return: The encoded record.
+    """
+    return (record.input, record.output, record.score, record.term_count, record.pass_count, record.passes,
+            record.elapsed_ms, record.max_terms, record.max_passes, record.overlay, record.sources)
+
+
+def decode_record(data: Tuple[Any, ...]) -> SplitRecord:
+    """
+    Decodes a split record previously encoded with encode_record.
+    :param data: The encoded record.
+    :return: The split record.
+    """
+    return SplitRecord(*data)
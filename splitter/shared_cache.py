@@ -0,0 +1,148 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import sqlite3
+import marshal
+from typing import Optional
+from threading import local
+from utils import error_handler
+from utils.json_writer import JsonWriter
+from splitter.cache import SplitCache
+from splitter.dictionary import Dictionary
+from splitter.split_record import SplitRecord
+from splitter.record_codec import encode_record, decode_record
+
+
+class SharedSplitCache:
+    """Stores split results in a SQLite database in WAL mode, shared by every service process on the host, so an
+    input split by one process is a cache hit for the rest.  Place the file on tmpfs (e.g. /dev/shm) to keep it in
+    memory.  A process-local SplitCache can sit in front as a first level, holding the hottest entries.  Keys are
+    tagged with the dictionary version, so processes running different dictionaries never share results.  When
+    the table grows past its maximum, the oldest inserted entries are removed.  Cache errors (such as a busy
+    database) are logged and treated as misses, never failing a split."""
+
+    # bump when the encoded result layout changes
+    FORMAT_VERSION: int = 3
+
+    # number of inserts between checks of the table size
+    TRIM_INTERVAL: int = 256
+
+    def __init__(self, filename: str, max_cache_items: int, dictionary: Dictionary, l1: Optional[SplitCache] = None) -> None:
+        """Class constructor."""
+        self.__filename: str = filename
+        self.__max_cache_items: int = max_cache_items
+        self.__dictionary: Dictionary = dictionary
+        self.__l1: Optional[SplitCache] = l1
+        self.__local: local = local()
+        self.__sets: int = 0
+        self.__hits: int = 0
+        self.__misses: int = 0
+        self.__errors: int = 0
+        connection = self.__connection()
+        connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        connection.commit()
+
+    @property
+    def count(self) -> int:
+        """Returns approximate number of items in the shared table."""
+        try:
+            row = self.__connection().execute("SELECT MIN(rowid), MAX(rowid) FROM cache").fetchone()
+            return 0 if row[0] is None else min(self.__max_cache_items, row[1] - row[0] + 1)
+        except sqlite3.Error as ex:
+            error_handler.log_error(ex)
+            return 0
+
+    def set_item(self, input_: str, result: SplitRecord) -> None:
+        """Stores a result in the local and shared caches, indexed by input string."""
+        if self.__l1 is not None:
+            self.__l1.set_item(input_, result)
+        try:
+            connection = self.__connection()
+            connection.execute("INSERT OR REPLACE INTO cache (key, data) VALUES (?, ?)",
+                               (self.__key(input_), marshal.dumps(encode_record(result))))
+            self.__sets += 1
+            if (self.__sets % SharedSplitCache.TRIM_INTERVAL) == 0:
+                self.__trim(connection)
+            connection.commit()
+        except sqlite3.Error as ex:
+            self.__errors += 1
+            error_handler.log_error(ex)
+
+    def get_item(self, input_: str) -> Optional[SplitRecord]:
+        """Fetches specified result from the local cache, then the shared cache, or returns None if doesn't exist."""
+        if self.__l1 is not None:
+            result = self.__l1.get_item(input_)
+            if result is not None:
+                return result
+        try:
+            row = self.__connection().execute("SELECT data FROM cache WHERE key = ?", (self.__key(input_),)).fetchone()
+        except sqlite3.Error as ex:
+            self.__errors += 1
+            error_handler.log_error(ex)
+            row = None
+        if row is None:
+            self.__misses += 1
+            return None
+        self.__hits += 1
+        result = decode_record(marshal.loads(row[0]))
+        if self.__l1 is not None:
+            self.__l1.set_item(input_, result)
+        return result
+
+    def peek(self, input_: str) -> Optional[SplitRecord]:
+        """Fetches specified result without counting a hit or miss, or returns None if doesn't exist.  With a local
+        cache, only the local cache is read: results stored by this process are always stored there too."""
+        if self.__l1 is not None:
+            return self.__l1.peek(input_)
+        try:
+            row = self.__connection().execute("SELECT data FROM cache WHERE key = ?", (self.__key(input_),)).fetchone()
+        except sqlite3.Error as ex:
+            self.__errors += 1
+            error_handler.log_error(ex)
+            row = None
+        return decode_record(marshal.loads(row[0])) if row is not None else None
+
+    def after_fork(self) -> None:
+        """Forgets connections inherited from the parent process, which mustn't be used by a forked child."""
+        self.__local = local()
+
+    def __key(self, input_: str) -> str:
+        """Returns the shared key, tagged with the format and dictionary versions."""
+        return str(SharedSplitCache.FORMAT_VERSION) + ":" + self.__dictionary.version + "\x1d" + input_
+
+    def __trim(self, connection: sqlite3.Connection) -> None:
+        """Removes the oldest inserted entries beyond the maximum.  Replaced rows get new rowids, so rowid order is
+        insertion order."""
+        connection.execute("DELETE FROM cache WHERE rowid <= (SELECT MAX(rowid) FROM cache) - ?", (self.__max_cache_items,))
+
+    def __connection(self) -> sqlite3.Connection:
+        """Returns this thread's connection, opening it if needed.  SQLite connections can't be shared by threads."""
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.__filename, timeout=1.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self.__local.connection = connection
+        return connection
+
+    def write_runtime_statistics(self, writer: JsonWriter) -> None:
+        """Writes runtime statistics for the local cache (if any) and this process's use of the shared cache."""
+        if self.__l1 is not None:
+            self.__l1.write_runtime_statistics(writer)
+        hits = self.__hits
+        misses = self.__misses
+        if (hits + misses) != 0:
+            percent = round((float(hits) / float(hits + misses)) * 100.0, 1)
+        else:
+            percent = 0.0
+        writer.write_start_object("sharedCache")
+        writer.write_property_value("file", self.__filename)
+        writer.write_property_value("itemCount", self.count)
+        writer.write_property_value("maxItems", self.__max_cache_items)
+        writer.write_property_value("sets", self.__sets)
+        writer.write_property_value("hits", hits)
+        writer.write_property_value("misses", misses)
+        writer.write_property_value("errors", self.__errors)
+        writer.write_property_value("efficiencyPercent", percent)
+        writer.write_end_object()
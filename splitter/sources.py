@@ -0,0 +1,61 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+from typing import Iterable, Optional, Set
+from splitter.enums import DictionarySource
+
+
+def source_mask(sources: Iterable[DictionarySource]) -> int:
+    """
+    Converts a collection of dictionary sources into a bitmask, one bit per source.
+    :param sources: The dictionary sources.
+    :return: The combined bitmask.
+    """
+    mask = 0
+    for s in sources:
+        mask |= 1 << s.value
+    return mask
+
+
+# mask including every dictionary source
+ALL_SOURCES: int = source_mask(DictionarySource)
+
+# mask used when a request doesn't specify sources (terms found only in the adult source are excluded)
+DEFAULT_SOURCES: int = ALL_SOURCES & ~source_mask([DictionarySource.Adult])
+
+
+def default_sources() -> Set[DictionarySource]:
+    """
+    Returns the set of sources used when a request doesn't specify any.
+    :return: Every source except adult.
+    """
+    return set(s for s in DictionarySource if s is not DictionarySource.Adult)
+
+
+def parse_sources(text: Optional[str]) -> Optional[Set[DictionarySource]]:
+    """
+    Parses a comma or pipe separated list of source names or numbers, e.g. "GoogleBooks1Gram,Supplemental".
+    Items prefixed with '-' are removed instead, and a list of only removals starts from the default sources,
+    e.g. "-Names,-Location".
+    :param text: The source list, or None.
+    :return: The set of allowed sources, or None if no list was given.
+    """
+    if not text:
+        return None
+    items = [i.strip() for i in text.replace("|", ",").split(",") if i.strip()]
+    included: Set[DictionarySource] = set()
+    excluded: Set[DictionarySource] = set()
+    for item in items:
+        target = excluded if item.startswith("-") else included
+        name = item.lstrip("-")
+        if name.isdigit():
+            target.add(DictionarySource(int(name)))
+        else:
+            matches = [s for s in DictionarySource if s.name.lower() == name.lower()]
+            if not matches:
+                raise ValueError(f"Unknown dictionary source '{name}'.")
+            target.add(matches[0])
+    if not included:
+        included = default_sources()
+    return included - excluded
@@ -0,0 +1,161 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import time
+import multiprocessing
+from multiprocessing.pool import Pool
+from typing import List, Tuple, Set, Optional, Iterator, Any
+from utils.json_writer import JsonWriter
+from splitter.enums import DictionarySource
+from splitter.cache import SplitCache
+from splitter.dictionary import Dictionary
+from splitter.split_result import SplitResult
+from splitter.word_splitter import Splitter
+from splitter.record_codec import encode_record, decode_record
+
+
+# a batch request: input, cache, pass display, max terms, max passes, overlay, sources, admit (as for Splitter.full_split), and timeout
+# in seconds (0 for none), counted from when the input's split starts
+SplitRequest = Tuple[str, bool, int, int, int, Optional[str], Optional[Set[DictionarySource]], bool, float]
+
+# dictionary used by worker processes, inherited from the parent process when the pool forks
+_worker_dictionary: Optional[Dictionary] = None
+
+# splitter used by worker processes, created by each worker once forked
+_worker_splitter: Optional[Splitter] = None
+
+
+def _init_worker() -> None:
+    """Runs in a worker process once forked: replaces the inherited dictionary's locks and creates the worker's own
+    splitter (without caches or stats), so a worker never waits on a lock that another thread of the parent process
+    held when it forked."""
+    global _worker_splitter
+    if _worker_dictionary is not None:
+        _worker_dictionary.after_fork()
+        _worker_splitter = Splitter(dictionary=_worker_dictionary, cache=SplitCache(max_cache_items=0))
+
+
+def _split_worker(request: SplitRequest) -> Optional[Tuple[Tuple[Any, ...], bool]]:
+    """Runs in a worker process: splits one input, returning the encoded record and true if the split hit its deadline,
+    or None if it fails or can't be encoded (the parent then splits the input itself, reporting any error)."""
+    input_, _, pass_display, max_terms, max_passes, overlay, sources, _, timeout = request
+    splitter = _worker_splitter
+    if splitter is None:
+        return None
+    try:
+        record, deadline_hit = splitter.split_record(input_, pass_display, max_terms, max_passes, overlay, sources, _deadline(timeout))
+        return (encode_record(record), deadline_hit) if record is not None else None
+    except Exception:
+        return None
+
+
+def _deadline(timeout: float) -> float:
+    """Returns the deadline (a time.monotonic() value) of a split starting now, or 0.0 if the timeout is 0."""
+    return time.monotonic() + timeout if timeout > 0.0 else 0.0
+
+
+class SplitPool:
+    """Splits the inputs of batch requests in parallel, in a pool of worker processes, so a large batch can use every
+    core rather than one (which the GIL would otherwise allow).  Workers are forked once the dictionary has loaded, so
+    they share its memory with the parent process (copy-on-write), and return compact split records that the parent
+    caches and renders.  Other threads of the parent may be running when the pool forks, so each worker replaces the
+    dictionary's inherited locks and splits with its own objects, touching nothing else of the parent's.  Inputs already cached are answered in-process without a round trip, and uncached inputs are
+    fanned out to workers in chunks and gathered back in order.  Batches with fewer uncached inputs than the
+    threshold are split in-process, as are all batches if the pool isn't started."""
+
+    def __init__(self, splitter: Splitter, dictionary: Dictionary, processes: int, threshold: int = 32, chunk_size: int = 16) -> None:
+        """Class constructor."""
+        self.__splitter: Splitter = splitter
+        self.__dictionary: Dictionary = dictionary
+        self.__processes: int = processes
+        self.__threshold: int = threshold
+        self.__chunk_size: int = chunk_size
+        self.__pool: Optional[Pool] = None
+        self.__pooled_batches: int = 0
+        self.__pooled_inputs: int = 0
+        self.__local_batches: int = 0
+        self.__cached_inputs: int = 0
+        self.__local_fallbacks: int = 0
+
+    def start(self) -> None:
+        """Forks the worker processes.  Must be called after the dictionary has loaded."""
+        global _worker_dictionary
+        if (self.__pool is None) and (self.__processes > 0):
+            _worker_dictionary = self.__dictionary
+            self.__pool = multiprocessing.get_context("fork").Pool(self.__processes, initializer=_init_worker)
+
+    def stop(self) -> None:
+        """Terminates the worker processes."""
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool = None
+
+    def split(self, requests: List[SplitRequest], errors: Optional[List[Exception]] = None) -> Iterator[SplitResult]:
+        """Yields a result for each request, in order, as each becomes available."""
+        pool = self.__pool
+        if pool is None:
+            self.__local_batches += 1
+            for r in requests:
+                yield self.__split_local(r, errors)
+            return
+
+        # answer cached inputs in-process
+        results: List[Optional[SplitResult]] = [None] * len(requests)
+        misses: List[int] = []
+        for i, r in enumerate(requests):
+            input_, cache, pass_display, max_terms, max_passes, overlay, sources, _, _ = r
+            if cache:
+                results[i] = self.__splitter.cached_split(input_, pass_display, max_terms, max_passes, overlay, sources)
+            if results[i] is None:
+                misses.append(i)
+        self.__cached_inputs += len(requests) - len(misses)
+
+        # split small batches in-process
+        if len(misses) < self.__threshold:
+            self.__local_batches += 1
+            for i, r in enumerate(requests):
+                result = results[i]
+                yield result if result is not None else self.__split_local(r, errors)
+            return
+
+        # fan out uncached inputs to workers, yielding results in order as they arrive
+        self.__pooled_batches += 1
+        self.__pooled_inputs += len(misses)
+        records = pool.imap(_split_worker, [requests[i] for i in misses], self.__chunk_size)
+        for i, r in enumerate(requests):
+            result = results[i]
+            yield result if result is not None else self.__gather(r, next(records), errors)
+
+    def __gather(self, request: SplitRequest, data: Optional[Tuple[Tuple[Any, ...], bool]], errors: Optional[List[Exception]]) -> SplitResult:
+        """Caches and renders a record returned by a worker, or splits in-process if the worker returned none.  Records
+        of splits that hit their deadline are counted but not cached."""
+        input_, cache, pass_display, _, _, overlay, sources, admit, _ = request
+        if data is None:
+            self.__local_fallbacks += 1
+            return self.__split_local(request, errors)
+        record = decode_record(data[0])
+        deadline_hit = data[1]
+        if deadline_hit:
+            self.__splitter.log_deadline_hit()
+        elif cache and admit:
+            self.__splitter.add_record(input_, record, overlay, sources)
+        return record.to_result(self.__dictionary, pass_display, False, (input_ if input_ is not None else "").strip().lower(), deadline_hit)
+
+    def __split_local(self, request: SplitRequest, errors: Optional[List[Exception]]) -> SplitResult:
+        """Splits a request in-process."""
+        input_, cache, pass_display, max_terms, max_passes, overlay, sources, admit, timeout = request
+        return self.__splitter.full_split(input_, cache, pass_display, max_terms, max_passes, errors, overlay, sources, admit, _deadline(timeout))
+
+    def write_runtime_statistics(self, writer: JsonWriter) -> None:
+        """Writes runtime statistics."""
+        writer.write_start_object("splitPool")
+        writer.write_property_value("processes", self.__processes if self.__pool is not None else 0)
+        writer.write_property_value("threshold", self.__threshold)
+        writer.write_property_value("chunkSize", self.__chunk_size)
+        writer.write_property_value("pooledBatches", self.__pooled_batches)
+        writer.write_property_value("pooledInputs", self.__pooled_inputs)
+        writer.write_property_value("localBatches", self.__local_batches)
+        writer.write_property_value("cachedInputs", self.__cached_inputs)
+        writer.write_property_value("localFallbacks", self.__local_fallbacks)
+        writer.write_end_object()
@@ -0,0 +1,210 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import sys
+import struct
+from array import array
+from typing import List, Tuple, Optional
+from splitter.dictionary import Dictionary
+from splitter.overlay import Overlay
+from splitter.enums import DictionarySource
+from splitter.sources import DEFAULT_SOURCES
+from splitter.term import Term
+from splitter.split import Split
+from splitter.split_pass import Pass
+from splitter.split_result import SplitResult
+
+
+class SplitRecord:
+    """Compact, immutable form of a split result, as stored in the split cache.  Apart from the input, output and
+    overlay name, everything is packed into a single bytes object: a fixed header of score, counts, limits and source
+    mask, followed by the top passes as unsigned 16-bit values (for each pass, its split count followed by a
+    (start, end, code) span per split, indexing the input).  The code is the position of the matched term among the
+    dictionary terms sharing that compressed text, offset past the codes below for splits without a term.  Matched
+    terms and full Pass objects are rebuilt from the dictionary only when a response needs them."""
+
+    __slots__ = ("__input", "__output", "__overlay", "__data")
+
+    # score, term count, pass count, elapsed ms, max terms, max passes, source mask
+    HEADER: struct.Struct = struct.Struct("=dIIIIIH")
+
+    # span codes for splits that aren't matched to a dictionary term
+    UNMATCHED: int = 0
+    NUMBER: int = 1
+    UNKNOWN: int = 2
+    TERM_OFFSET: int = 3
+
+    # largest value that can be packed in a span, which limits input length
+    MAX_VALUE: int = 65535
+
+    def __init__(self, input_: str, output: str, score: float, term_count: int = 0, pass_count: int = 0,
+                 passes: bytes = b"", elapsed_ms: int = 0, max_terms: int = 0, max_passes: int = 0,
+                 overlay: Optional[str] = None, sources: int = DEFAULT_SOURCES) -> None:
+        """Class constructor."""
+        self.__input: str = input_
+        self.__output: str = output
+        self.__overlay: Optional[str] = overlay
+        self.__data: bytes = SplitRecord.HEADER.pack(score, term_count, pass_count, min(int(elapsed_ms), 0xFFFFFFFF),
+                                                     max_terms, max_passes, sources) + passes
+
+    @property
+    def input(self) -> str:
+        """The normalized input string."""
+        return self.__input
+
+    @property
+    def output(self) -> str:
+        """The split output (ie. the display value of the top-ranked pass)."""
+        return self.__output
+
+    @property
+    def score(self) -> float:
+        """The confidence score of the split output."""
+        return SplitRecord.HEADER.unpack_from(self.__data)[0]
+
+    @property
+    def term_count(self) -> int:
+        """The total number of matching terms found in the input."""
+        return SplitRecord.HEADER.unpack_from(self.__data)[1]
+
+    @property
+    def pass_count(self) -> int:
+        """Count of the total number of passes generated by the split operation."""
+        return SplitRecord.HEADER.unpack_from(self.__data)[2]
+
+    @property
+    def elapsed_ms(self) -> int:
+        """Time taken (in milliseconds) to perform the split logic."""
+        return SplitRecord.HEADER.unpack_from(self.__data)[3]
+
+    @property
+    def max_terms(self) -> int:
+        """The max terms limit the result was computed with."""
+        return SplitRecord.HEADER.unpack_from(self.__data)[4]
+
+    @property
+    def max_passes(self) -> int:
+        """The max passes limit the result was computed with."""
+        return SplitRecord.HEADER.unpack_from(self.__data)[5]
+
+    @property
+    def sources(self) -> int:
+        """Source mask the result was computed with."""
+        return SplitRecord.HEADER.unpack_from(self.__data)[6]
+
+    @property
+    def overlay(self) -> Optional[str]:
+        """Name of the overlay the result was computed with, if any."""
+        return self.__overlay
+
+    @property
+    def passes(self) -> bytes:
+        """The stored passes, packed as described above."""
+        return self.__data[SplitRecord.HEADER.size:]
+
+    @property
+    def pass_depth(self) -> int:
+        """Number of passes stored."""
+        return len(self.__unpack())
+
+    def covers(self, pass_display: int, max_terms: int, max_passes: int) -> bool:
+        """Returns true if this record can answer a request with the specified pass display and limits, ie. it was
+        computed with limits at least as large, and holds at least as many passes (or all of them)."""
+        _, _, pass_count, _, stored_max_terms, stored_max_passes, _ = SplitRecord.HEADER.unpack_from(self.__data)
+        pass_depth = self.pass_depth
+        return (stored_max_terms >= max_terms) and (stored_max_passes >= max_passes) \
+            and ((pass_depth >= pass_display) or (pass_depth >= pass_count))
+
+    def estimate_size(self) -> int:
+        """Estimates the memory used by this record, in bytes.  The input is shared with the cache key, so isn't counted."""
+        return sys.getsizeof(self) + sys.getsizeof(self.__output) + sys.getsizeof(self.__data)
+
+    def to_result(self, dictionary: Dictionary, pass_display: int, cached: bool, input_: Optional[str] = None,
+                  deadline_hit: bool = False) -> SplitResult:
+        """Returns a split result holding at most the specified number of passes, optionally reporting another form of
+        the input (such as the original punctuation of a canonical input).  Matched terms and passes are rebuilt from
+        the dictionary on first access.  The deadline hit flag is set for records that pool workers send back from
+        splits that hit their deadline (which are never cached)."""
+        score, term_count, pass_count, elapsed_ms, max_terms, max_passes, _ = SplitRecord.HEADER.unpack_from(self.__data)
+        return SplitResult(input_ if input_ is not None else self.__input, self.__output, score, term_count, None, pass_count, None, elapsed_ms, cached,
+                           max_terms, max_passes, lambda: self.__rebuild(dictionary, pass_display), deadline_hit)
+
+    def __rebuild(self, dictionary: Dictionary, pass_display: int) -> Tuple[List[Pass], List[Term]]:
+        """Rebuilds the passes and matched terms, using the same dictionary lookups as the original split."""
+        _, _, _, _, max_terms, _, sources = SplitRecord.HEADER.unpack_from(self.__data)
+        matched_terms = dictionary.find_matching_terms(self.__input, 3, dictionary.get_overlay(self.__overlay), sources)
+        matched_terms.sort(key=lambda x: x.value(), reverse=True)
+        if len(matched_terms) > max_terms:
+            del matched_terms[max_terms:]
+        return self.rebuild_passes(dictionary, pass_display), matched_terms
+
+    def rebuild_passes(self, dictionary: Dictionary, pass_display: int) -> List[Pass]:
+        """Rebuilds up to the specified number of stored passes, looking up matched terms in the dictionary."""
+        sources = SplitRecord.HEADER.unpack_from(self.__data)[6]
+        overlay = dictionary.get_overlay(self.__overlay)
+        passes: List[Pass] = []
+        for spans in self.__unpack()[:pass_display]:
+            splits: List[Split] = []
+            for start, end, code in spans:
+                text = self.__input[start:end]
+                if code == SplitRecord.UNMATCHED:
+                    splits.append(Split(text))
+                elif code == SplitRecord.NUMBER:
+                    splits.append(Split(text, 1E-8, 1.0, True, set()))
+                elif code == SplitRecord.UNKNOWN:
+                    splits.append(Split(text, 1E-8, 1, True, {DictionarySource.Unknown}))
+                else:
+                    terms = dictionary.find_terms(text, overlay, sources)
+                    if not terms:
+                        raise ValueError(f"Stored split '{text}' has no matching dictionary term.")
+                    splits.append(Split.from_term(terms[code - SplitRecord.TERM_OFFSET]))
+            passes.append(Pass(self.__input, splits, None, None))
+        return passes
+
+    def __unpack(self) -> List[List[Tuple[int, int, int]]]:
+        """Unpacks the stored passes into lists of (start, end, code) spans."""
+        values = array("H")
+        values.frombytes(self.__data[SplitRecord.HEADER.size:])
+        passes: List[List[Tuple[int, int, int]]] = []
+        i = 0
+        while i < len(values):
+            count = values[i]
+            passes.append([(values[j], values[j + 1], values[j + 2]) for j in range(i + 1, i + 1 + (count * 3), 3)])
+            i += 1 + (count * 3)
+        return passes
+
+    @classmethod
+    def from_result(cls, result: SplitResult, dictionary: Dictionary, overlay: Optional[Overlay], sources: int) -> Optional['SplitRecord']:
+        """Creates a record from a newly computed result.  Returns None if a split can't be located in the input,
+        in which case the result isn't cached."""
+        input_ = result.input
+        if len(input_) > SplitRecord.MAX_VALUE:
+            return None
+        values = array("H")
+        for p in result.passes:
+            values.append(len(p.splits))
+            position = 0
+            for s in p.splits:
+                text = s.text
+                if not s.matched:
+                    code = SplitRecord.UNMATCHED
+                else:
+                    compressed = text.replace(" ", "")
+                    terms = dictionary.find_terms(compressed, overlay, sources) or []
+                    index = next((i for i, t in enumerate(terms) if t.full == text), -1)
+                    if index != -1:
+                        code = index + SplitRecord.TERM_OFFSET
+                        text = compressed
+                    elif DictionarySource.Unknown in s.sources:
+                        code = SplitRecord.UNKNOWN
+                    else:
+                        code = SplitRecord.NUMBER
+                start = input_.find(text, position)
+                if start == -1:
+                    return None
+                position = start + len(text)
+                values.extend((start, position, code))
+        return cls(input_, result.output, result.score, result.term_count, result.pass_count, values.tobytes(),
+                   int(result.elapsed_ms), result.max_terms, result.max_passes, overlay.name if overlay is not None else None,
+                   sources)
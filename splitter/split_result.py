@@ -2,26 +2,33 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
-from typing import List, Optional
+from typing import List, Tuple, Optional, Callable
 from splitter.term import Term
 from splitter.split_pass import Pass
 
 
 class SplitResult:
-    """Represents the results of a single split operation, including all passes."""
+    """Represents the results of a single split operation, including all passes.  Results served from the cache
+    are created with a loader instead of matched terms and passes, which rebuilds them on first access.  A result
+    whose split was cut short by its deadline holds the best passes found by then."""
 
-    def __init__(self, input_: str, output: Optional[str], score: Optional[float], term_count: int, matched_terms: List[Term],
-                 pass_count: int, passes: List[Pass], elapsed_ms: int, cached: bool):
+    def __init__(self, input_: str, output: Optional[str], score: Optional[float], term_count: int, matched_terms: Optional[List[Term]],
+                 pass_count: int, passes: Optional[List[Pass]], elapsed_ms: int, cached: bool, max_terms: int = 0, max_passes: int = 0,
+                 loader: Optional[Callable[[], Tuple[List[Pass], List[Term]]]] = None, deadline_hit: bool = False):
         """Class constructor."""
         self.__input: str = input_
         self.__output: Optional[str] = output
         self.__score: Optional[float] = score
         self.__term_count: int = term_count
-        self.__matched_terms: List[Term] = matched_terms
+        self.__matched_terms: Optional[List[Term]] = matched_terms
         self.__pass_count: int = pass_count
-        self.__passes: List[Pass] = passes
+        self.__passes: Optional[List[Pass]] = passes
         self.__elapsed_ms: int = elapsed_ms
         self.__cached: bool = cached
+        self.__max_terms: int = max_terms
+        self.__max_passes: int = max_passes
+        self.__loader: Optional[Callable[[], Tuple[List[Pass], List[Term]]]] = loader
+        self.__deadline_hit: bool = deadline_hit
 
     @property
     def input(self) -> str:
@@ -61,7 +68,8 @@ class SplitResult:
     @property
     def matched_terms(self) -> List[Term]:
         """The matching terms found in the original input by the Aho Corasick search algorithm."""
-        return self.__matched_terms
+        self.__load()
+        return self.__matched_terms if self.__matched_terms is not None else []
 
     @property
     def pass_count(self) -> int:
@@ -71,7 +79,8 @@ class SplitResult:
     @property
     def passes(self) -> List[Pass]:
         """Returns the list of Pass objects."""
-        return self.__passes
+        self.__load()
+        return self.__passes if self.__passes is not None else []
 
     @property
     def elapsed_ms(self) -> int:
@@ -83,6 +92,35 @@ class SplitResult:
         """Returns true if the result was fetched from the cache, rather than invoking split logic."""
         return self.__cached
 
+    @property
+    def max_terms(self) -> int:
+        """Returns the max terms limit the result was computed with."""
+        return self.__max_terms
+
+    @property
+    def max_passes(self) -> int:
+        """Returns the max passes limit the result was computed with."""
+        return self.__max_passes
+
+    @property
+    def deadline_hit(self) -> bool:
+        """Returns true if the split logic stopped at its deadline, so the result may not be the best split."""
+        return self.__deadline_hit
+
+    def truncated(self, pass_display: int, cached: bool, input_: Optional[str] = None) -> 'SplitResult':
+        """Returns a copy of this result holding at most the specified number of passes, optionally reporting another
+        form of the input.  The copy shares terms and passes with this result."""
+        passes = self.passes[:pass_display] if self.passes is not None else None
+        return SplitResult(input_ if input_ is not None else self.__input, self.output, self.score, self.__term_count, self.matched_terms, self.__pass_count,
+                           passes, self.__elapsed_ms, cached, self.__max_terms, self.__max_passes,
+                           deadline_hit=self.__deadline_hit)
+
+    def __load(self) -> None:
+        """Rebuilds matched terms and passes using the loader, if not yet done."""
+        if self.__loader is not None:
+            self.__passes, self.__matched_terms = self.__loader()
+            self.__loader = None
+
     def __repr__(self) -> str:
         """Print and debug display."""
         return (self.output if self.output else "") + (" ({})".format(self.score) if self.score else "")
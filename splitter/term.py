@@ -5,6 +5,7 @@ GNU GENERAL PUBLIC LICENSE Version 3"""
 from typing import List, Set
 from splitter.scoring import get_word_value
 from splitter.enums import DictionarySource
+from splitter.sources import source_mask
 
 
 class Term:
@@ -25,6 +26,7 @@ class Term:
         self.__frequency: float = frequency
         self.__multiplier: float = multiplier
         self.__sources: Set[DictionarySource] = sources
+        self.__source_mask: int = source_mask(sources)
 
     @property
     def full(self) -> str:
@@ -56,6 +58,11 @@ class Term:
         """Enum list containing one or more original sources the term was found in."""
         return self.__sources
 
+    @property
+    def source_mask(self) -> int:
+        """Bitmask of the original sources, used to filter terms per request."""
+        return self.__source_mask
+
     @property
     def char_count(self) -> int:
         """The length of the term, in compressed format (spaces removed)."""
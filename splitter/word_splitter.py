@@ -2,7 +2,10 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
-from typing import List, Tuple, Set, Optional
+import re
+import time
+from typing import List, Tuple, Set, Dict, Optional, Union, Pattern
+from threading import Lock, Event
 from utils.extensions import has_numbers
 from utils.extensions import has_alphas
 from utils.extensions import is_integer
@@ -12,76 +15,144 @@ from utils.extensions import find_any
 from utils.stopwatch import Stopwatch
 from utils.service_stats import ServiceStats
 from utils import error_handler
+from utils.json_writer import JsonWriter
 from splitter.dictionary import Dictionary
 from splitter.cache import SplitCache
+from splitter.shared_cache import SharedSplitCache
+from splitter.overlay import Overlay
+from splitter.enums import DictionarySource
+from splitter.sources import source_mask, DEFAULT_SOURCES
 from splitter.term import Term
 from splitter.split_pass import Pass
 from splitter.split import Split
 from splitter.split_result import SplitResult
+from splitter.split_record import SplitRecord
 
 
 class Splitter():
     
-    def __init__(self, dictionary: Dictionary, cache: SplitCache, service_stats: Optional[ServiceStats] = None) -> None:
-        """Class constructor."""
+    def __init__(self, dictionary: Dictionary, cache: Union[SplitCache, SharedSplitCache], service_stats: Optional[ServiceStats] = None,
+                 segment_cache: Optional[SplitCache] = None, coalesce_wait_secs: float = 5.0) -> None:
+        """Class constructor.  The optional segment cache stores solved alpha segments (the pieces left between break
+        characters and numbers), shared across different inputs.  Concurrent cache misses for the same key are coalesced:
+        the first computes the result, while the rest wait up to the specified time for it before computing their own."""
         self.__break_chars = [" ", "-", "_", ".", "!", "?", "@", "$", "&", "*", ",", "[", "]", "(", ")", "{", "}", ";", ":", "%", "^", "~"]
+        self.__break_runs: Pattern = re.compile("[" + re.escape("".join(self.__break_chars)) + "]+")
         self.__dictionary = dictionary
         self.__cache = cache
+        self.__segment_cache = segment_cache
         self.__service_stats = service_stats
-
-    def simple_split(self, input_: str, cache: bool = True, max_terms: int = 25, max_passes: int = 10000, errors: Optional[List[Exception]] = None) -> SplitResult:
-        """Returns only the best split recommendation, using the default set of parameters."""
+        self.__coalesce_wait_secs: float = coalesce_wait_secs
+        self.__flights: Dict[str, Event] = {}
+        self.__flights_lock: Lock = Lock()
+        self.__coalesced: int = 0
+        self.__coalesce_misses: int = 0
+        self.__coalesce_timeouts: int = 0
+        self.__deadline_hits: int = 0
+
+    def simple_split(self, input_: str, cache: bool = True, max_terms: int = 25, max_passes: int = 10000, errors: Optional[List[Exception]] = None,
+                     overlay: Optional[str] = None, sources: Optional[Set[DictionarySource]] = None, admit: bool = True,
+                     deadline: float = 0.0) -> SplitResult:
+        """Returns only the best split recommendation, using the default set of parameters.  Optionally merges the named
+        overlay dictionary with the base dictionary, and/or limits matching to terms found in the given sources."""
+        return self.full_split(input_, cache, 1, max_terms, max_passes, errors, overlay, sources, admit, deadline)
+
+
+    def full_split(self, input_: str, cache: bool = True, pass_display: int = 1, max_terms: int = 25, max_passes: int = 10000, errors: Optional[List[Exception]] = None,
+                   overlay: Optional[str] = None, sources: Optional[Set[DictionarySource]] = None, admit: bool = True,
+                   deadline: float = 0.0) -> SplitResult:
+        """Split the text using a single method and dictionary.  Will usually produce multiple passes (results).  Reads from and adds output
+        to the cache.  A cached result is used when it was computed with limits and pass depth at least as large as requested; otherwise
+        the split is recomputed with the larger of the requested and cached parameters, and the cached result is upgraded in place.
+        Optionally merges the named overlay dictionary with the base dictionary, and/or limits matching to terms found in the given sources.
+        If admit is false (as for bulk callers), the cache is read but new results aren't added to it.  The split runs on the canonical
+        form of the input (see canonical_input), so inputs differing only in punctuation share a cache entry, but the result reports the
+        input as given.  If a deadline (a time.monotonic() value) is given, the split logic stops once it passes, returning the best passes
+        found so far; these results are flagged (see SplitResult.deadline_hit) and never cached."""
+        sw = Stopwatch()
+        executed = False
+        leader = False
+        key = ""
         try:
             # normalize input
             input_ = (input_ if input_ is not None else "").strip().lower()
+            reported_input = input_
+            input_ = self.canonical_input(input_)
+            overlay_ = self.__dictionary.get_overlay(overlay)
+            mask = source_mask(sources) if sources is not None else DEFAULT_SOURCES
 
             # try from cache
+            split_display = pass_display
+            split_terms = max_terms
+            split_passes = max_passes
             if cache:
-                result = self.__cache.get_item(input_)
-            else:
-                result = None        
-
-            # no? perform split logic
-            if result is None:
-                result = self.full_split(input_, cache, 1, max_terms, max_passes, errors)
-
-            # return
-            return result
-
-        except Exception as ex:
-            if errors:
-                errors.append(ex)
+                key = self.__cache_key(input_, overlay_, mask)
+                stored = self.__cache.get_item(key)
+                if (stored is not None) and stored.covers(pass_display, max_terms, max_passes):
+                    return stored.to_result(self.__dictionary, pass_display, True, reported_input)
+
+                # wait for a concurrent split of the same key, if any
+                leader, flight = self.__join_flight(key)
+                if leader:
+                    # a split that just ended may have stored the result after the lookup above
+                    stored = self.__cache.peek(key) if stored is None else stored
+                    if (stored is not None) and stored.covers(pass_display, max_terms, max_passes):
+                        return stored.to_result(self.__dictionary, pass_display, True, reported_input)
+                else:
+                    wait = self.__coalesce_wait_secs if deadline <= 0.0 else max(0.0, min(self.__coalesce_wait_secs, deadline - time.monotonic()))
+                    if flight.wait(wait):
+                        stored = self.__cache.peek(key)
+                        if (stored is not None) and stored.covers(pass_display, max_terms, max_passes):
+                            with self.__flights_lock:
+                                self.__coalesced += 1
+                            return stored.to_result(self.__dictionary, pass_display, True, reported_input)
+                        with self.__flights_lock:
+                            self.__coalesce_misses += 1
+                    else:
+                        with self.__flights_lock:
+                            self.__coalesce_timeouts += 1
+                if stored is not None:
+                    split_display = max(pass_display, stored.pass_depth)
+                    split_terms = max(max_terms, stored.max_terms)
+                    split_passes = max(max_passes, stored.max_passes)
+
+            # execute split, from solved segments if only the best pass is needed
+            executed = True
+            solved = None
+            if cache and (split_display == 1) and (self.__segment_cache is not None):
+                solved = self.segment_split(input_, split_terms, split_passes, overlay_, mask, deadline, admit)
+            if solved is not None:
+                passes: List[Pass] = [solved[0]]
+                matched_terms: List[Term] = solved[1]
+                pass_count = solved[2]
+                deadline_hit = solved[3]
             else:
-                raise
-            error_handler.log_error(ex)
-            return SplitResult(input_, "", 0.0, 0, [], 0, [], 0, False)
-
-
-    def full_split(self, input_: str, cache: bool = True, pass_display: int = 1, max_terms: int = 25, max_passes: int = 10000, errors: Optional[List[Exception]] = None) -> SplitResult:
-        """Split the text using a single method and dictionary.  Will usually produce multiple passes (results).  Adds output to the cache."""
-        sw = Stopwatch()
-        try:
-            # normalize input
-            input_ = (input_ if input_ is not None else "").strip().lower()
-
-            # execute split
-            t = self.split_logic(input_, max_terms, max_passes)
-            passes: List[Pass] = t[0]
-            matched_terms: List[Term] = t[1]
+                t = self.split_logic(input_, split_terms, split_passes, overlay_, mask, deadline)
+                passes = t[0]
+                matched_terms = t[1]
+                pass_count = len(passes)
+                deadline_hit = t[2]
+            if deadline_hit:
+                with self.__flights_lock:
+                    self.__deadline_hits += 1
 
             # truncate
-            pass_count = len(passes)
-            if len(passes) > pass_display:
-                del passes[pass_display:]
+            if len(passes) > split_display:
+                del passes[split_display:]
 
             # create object
-            result = SplitResult(input_, None, None, len(matched_terms), matched_terms, pass_count, passes, sw.elapsed_ms, False)
+            result = SplitResult(input_, None, None, len(matched_terms), matched_terms, pass_count, passes, sw.elapsed_ms, False,
+                                 split_terms, split_passes, deadline_hit=deadline_hit)
 
-            # cache
-            if cache:
-                self.__cache.set_item(input_, result)
+            # cache, unless cut short by the deadline
+            if cache and admit and (not deadline_hit):
+                record = SplitRecord.from_result(result, self.__dictionary, overlay_, mask)
+                if record is not None:
+                    self.__cache.set_item(key, record)
 
             # return
+            if (split_display > pass_display) or (reported_input != input_):
+                return result.truncated(pass_display, False, reported_input)
             return result
 
         except Exception as ex:
@@ -93,33 +164,115 @@ class Splitter():
             return SplitResult(input_, "", 0.0, 0, [], 0, [], 0, False)
 
         finally:
-            if self.__service_stats:
+            if leader:
+                self.__end_flight(key)
+            if self.__service_stats and executed:
                 self.__service_stats.log_operation(name="full_split", elapsed_ms=sw.elapsed_ms)
 
 
-    def split_logic(self, input_: str, max_terms: int, max_passes: int) -> Tuple[List[Pass], List[Term]]:
-        """Executes the primary split logic."""
-        passes: List[Pass] = []
+    def __join_flight(self, key: str) -> Tuple[bool, Event]:
+        """Registers a split in flight for the key.  Returns true and a new event if no other split of the key is in
+        flight (the caller must end the flight), or false and the event of the split already in flight."""
+        with self.__flights_lock:
+            flight = self.__flights.get(key)
+            if flight is not None:
+                return False, flight
+            flight = Event()
+            self.__flights[key] = flight
+            return True, flight
+
+
+    def __end_flight(self, key: str) -> None:
+        """Ends the split in flight for the key, releasing any waiting callers."""
+        with self.__flights_lock:
+            flight = self.__flights.pop(key)
+        flight.set()
+
+
+    def write_runtime_statistics(self, writer: JsonWriter) -> None:
+        """Writes runtime statistics for request coalescing."""
+        writer.write_start_object("splitter")
+        writer.write_property_value("inFlight", len(self.__flights))
+        writer.write_property_value("coalesced", self.__coalesced)
+        writer.write_property_value("coalesceMisses", self.__coalesce_misses)
+        writer.write_property_value("coalesceTimeouts", self.__coalesce_timeouts)
+        writer.write_property_value("deadlineHits", self.__deadline_hits)
+        writer.write_end_object()
+
+
+    def canonical_input(self, input_: str) -> str:
+        """Returns the canonical form of a normalized input, with each run of break chars replaced by a single space and
+        leading or trailing break chars removed.  Pre-segmentation divides all forms alike (best-buy, best_buy, best.buy),
+        so they share the canonical form.  Inputs like "a-1..." are left alone, since preserve_a1 depends on the dash."""
+        if (len(input_) > 2) and (input_[1] == "-") and has_numbers(input_[2]):
+            return input_
+        if find_any(input_, self.__break_chars) == -1:
+            return input_
+        return " ".join(s for s in self.__break_runs.split(input_) if s)
+
+
+    def cached_split(self, input_: str, pass_display: int = 1, max_terms: int = 25, max_passes: int = 10000,
+                     overlay: Optional[str] = None, sources: Optional[Set[DictionarySource]] = None) -> Optional[SplitResult]:
+        """Returns the cached result for the input if it answers the request (see full_split), or None without splitting."""
+        input_ = (input_ if input_ is not None else "").strip().lower()
+        stored = self.__cache.get_item(self.__cache_key(self.canonical_input(input_), self.__dictionary.get_overlay(overlay),
+                                                        source_mask(sources) if sources is not None else DEFAULT_SOURCES))
+        if (stored is not None) and stored.covers(pass_display, max_terms, max_passes):
+            return stored.to_result(self.__dictionary, pass_display, True, input_)
+        return None
+
+
+    def split_record(self, input_: str, pass_display: int = 1, max_terms: int = 25, max_passes: int = 10000,
+                     overlay: Optional[str] = None, sources: Optional[Set[DictionarySource]] = None,
+                     deadline: float = 0.0) -> Tuple[Optional[SplitRecord], bool]:
+        """Splits the canonical form of the input without reading or writing the cache, and returns the compact record that
+        would be cached (or None if it can't be encoded), and true if the split hit its deadline.  Used by pool worker
+        processes, which send records back to the parent process to be cached and rendered."""
+        canonical = self.canonical_input((input_ if input_ is not None else "").strip().lower())
+        overlay_ = self.__dictionary.get_overlay(overlay)
+        mask = source_mask(sources) if sources is not None else DEFAULT_SOURCES
+        result = self.full_split(canonical, False, pass_display, max_terms, max_passes, None, overlay, sources, True, deadline)
+        return SplitRecord.from_result(result, self.__dictionary, overlay_, mask), result.deadline_hit
+
+
+    def log_deadline_hit(self) -> None:
+        """Counts a split that hit its deadline in a pool worker process, for runtime statistics."""
+        with self.__flights_lock:
+            self.__deadline_hits += 1
+
+
+    def add_record(self, input_: str, record: SplitRecord, overlay: Optional[str] = None, sources: Optional[Set[DictionarySource]] = None) -> None:
+        """Caches a record computed by split_record, unless a result (which may hold deeper passes) is already cached for the input."""
+        key = self.__cache_key(self.canonical_input((input_ if input_ is not None else "").strip().lower()), self.__dictionary.get_overlay(overlay),
+                               source_mask(sources) if sources is not None else DEFAULT_SOURCES)
+        if self.__cache.peek(key) is None:
+            self.__cache.set_item(key, record)
+
+
+    @staticmethod
+    def __cache_key(input_: str, overlay: Optional[Overlay], sources: int) -> str:
+        """Returns the cache key for a normalized input.  Results computed with an overlay or non-default sources are stored separately."""
+        key = input_
+        if overlay is not None:
+            key += "\x1f" + overlay.key
+        if sources != DEFAULT_SOURCES:
+            key += "\x1e" + str(sources)
+        return key
+
+
+    def split_logic(self, input_: str, max_terms: int, max_passes: int, overlay: Optional[Overlay] = None,
+                    sources: int = DEFAULT_SOURCES, deadline: float = 0.0) -> Tuple[List[Pass], List[Term], bool]:
+        """Executes the primary split logic.  If a deadline (a time.monotonic() value) is given, it's checked before
+        expanding each pass, and once passed the passes found so far are finished and ranked.  Returns the passes, the
+        matched terms, and true if the deadline was hit."""
         unique_passes: Set[str] = set()
+        deadline_hit = False
 
-        # init passes
-        first_pass = Pass(input_)
-        passes.append(first_pass)
-
-        # split on numbers, with special cases
-        self.split_on_numbers(passes)
-
-        # preserve strings like "a-1"
-        self.preserve_a1(passes)
-
-        # split on break chars
-        self.split_on_break_chars(passes)
+        # init passes, pre-segmented on numbers and break chars
+        passes = self.presegment(input_, overlay, sources)
 
         # get small list of possible matching terms
-        matched_terms: List[Term] = self.__dictionary.find_matching_terms(input_, 3)
-        matched_terms.sort(key=lambda x: x.value(), reverse=True)
-        if len(matched_terms) > max_terms:
-            del matched_terms[max_terms:]
+        matched_terms = self.__find_matching_terms(input_, max_terms, overlay, sources)
 
         # loop through each possible term
         for term in matched_terms:
@@ -127,6 +280,11 @@ class Splitter():
             # loop through passes (we can add a pass to the end while iterating this loop)
             for pass_index in range(len(passes)):
 
+                # stop at the deadline, keeping the passes found so far
+                if (deadline > 0.0) and (time.monotonic() > deadline):
+                    deadline_hit = True
+                    break
+
                 # get next pass
                 pass_ = passes[pass_index]
 
@@ -167,8 +325,8 @@ class Splitter():
                 if not done:
                     break
 
-            # decide if we're done (limit number of passes)
-            if len(passes) > max_passes:
+            # decide if we're done (limit number of passes, or deadline)
+            if (len(passes) > max_passes) or deadline_hit:
                 done = True
 
             # stop if done
@@ -179,7 +337,7 @@ class Splitter():
         for p in passes:
             for s in p.splits:
                 if not s.matched:
-                    best_term = self.__dictionary.find_term(s.text)
+                    best_term = self.__dictionary.find_term(s.text, overlay, sources)
                     if best_term is not None:
                         s.match(best_term)
                         p.generate_stored_values()
@@ -200,10 +358,97 @@ class Splitter():
         passes = passes_copy
 
         # return
-        return passes, matched_terms
+        return passes, matched_terms, deadline_hit
+
+
+    def presegment(self, input_: str, overlay: Optional[Overlay] = None, sources: int = DEFAULT_SOURCES) -> List[Pass]:
+        """Returns the initial pass, followed by passes splitting it into segments on numbers and break chars."""
+        passes: List[Pass] = []
+
+        # init passes
+        first_pass = Pass(input_)
+        passes.append(first_pass)
+
+        # split on numbers, with special cases
+        self.split_on_numbers(passes, overlay, sources)
+
+        # preserve strings like "a-1"
+        self.preserve_a1(passes, overlay, sources)
+
+        # split on break chars
+        self.split_on_break_chars(passes)
+
+        # return
+        return passes
+
+
+    def segment_split(self, input_: str, max_terms: int, max_passes: int, overlay: Optional[Overlay] = None,
+                      sources: int = DEFAULT_SOURCES, deadline: float = 0.0, admit: bool = True) -> Optional[Tuple[Pass, List[Term], int, bool]]:
+        """Finds the best pass by solving each alpha segment of the pre-segmented passes on its own, using the segment
+        cache, so segments repeated across different inputs (best-buy-deals, bestbuy.com, best_buy) are solved once.
+        Returns the best pass, the matched terms, the approximate number of passes considered, and true if solving any
+        segment hit the deadline, or None if the input doesn't divide into alpha segments (the caller then runs the full
+        split logic).  Inputs with numbers always return None: the full split logic lets plain numbers compete with
+        special numbers (347 the, not 347th e) and with terms spanning a number, which fixed segments can't.  If admit
+        is false, the segment cache is read but newly solved segments aren't added to it."""
+        if has_numbers(input_):
+            return None
+        passes = self.presegment(input_, overlay, sources)
+        if len(passes) == 1:
+            return None
+        best: Optional[Pass] = None
+        pass_count = len(passes)
+        deadline_hit = False
+        for pass_ in passes[1:]:
+            if any((not s.matched) and (not s.text.isalpha()) for s in pass_.splits):
+                continue
+            splits: List[Split] = []
+            for split in pass_.splits:
+                if split.matched:
+                    splits.append(split)
+                    continue
+                record, segment_deadline_hit = self.__solve_segment(split.text, max_terms, max_passes, overlay, sources, deadline, admit)
+                if record is None:
+                    return None
+                deadline_hit = deadline_hit or segment_deadline_hit
+                splits.extend(record.rebuild_passes(self.__dictionary, 1)[0].splits)
+                pass_count += record.pass_count - 1
+            candidate = Pass(pass_.input, splits, None, None)
+            if (best is None) or (candidate.score() > best.score()):
+                best = candidate
+        if best is None:
+            return None
+        return best, self.__find_matching_terms(input_, max_terms, overlay, sources), pass_count, deadline_hit
+
+
+    def __solve_segment(self, segment: str, max_terms: int, max_passes: int, overlay: Optional[Overlay],
+                        sources: int, deadline: float = 0.0, admit: bool = True) -> Tuple[Optional[SplitRecord], bool]:
+        """Returns the best split of an alpha segment from the segment cache, solving and caching it (if admit is true)
+        if needed, and true if solving it hit the deadline (the segment is then not cached)."""
+        segment_cache = self.__segment_cache
+        key = self.__cache_key(segment, overlay, sources)
+        record = segment_cache.get_item(key) if segment_cache is not None else None
+        deadline_hit = False
+        if (record is None) or (not record.covers(1, max_terms, max_passes)):
+            passes, matched_terms, deadline_hit = self.split_logic(segment, max_terms, max_passes, overlay, sources, deadline)
+            result = SplitResult(segment, None, None, len(matched_terms), matched_terms, len(passes), passes[:1], 0, False,
+                                 max_terms, max_passes)
+            record = SplitRecord.from_result(result, self.__dictionary, overlay, sources)
+            if admit and (segment_cache is not None) and (record is not None) and (not deadline_hit):
+                segment_cache.set_item(key, record)
+        return record, deadline_hit
+
+
+    def __find_matching_terms(self, input_: str, max_terms: int, overlay: Optional[Overlay], sources: int) -> List[Term]:
+        """Returns the most valuable dictionary terms found in the input, up to the max terms."""
+        matched_terms: List[Term] = self.__dictionary.find_matching_terms(input_, 3, overlay, sources)
+        matched_terms.sort(key=lambda x: x.value(), reverse=True)
+        if len(matched_terms) > max_terms:
+            del matched_terms[max_terms:]
+        return matched_terms
 
 
-    def split_on_numbers(self, passes: List[Pass]) -> None:
+    def split_on_numbers(self, passes: List[Pass], overlay: Optional[Overlay] = None, sources: int = DEFAULT_SOURCES) -> None:
         """Split on numbers, with special cases."""
         new_passes: List[Pass] = []
         for pass_ in passes:
@@ -233,6 +478,8 @@ class Splitter():
             # find special case values like '3d' and '80s', split them out as segments
             # that are not numeric (so they will be ignored in the following logic)
             for term in self.__dictionary.get_special_numbers():
+                if not (term.source_mask & sources):
+                    continue
                 index = pass_.display_text().find(term.compressed)
                 if index != -1:
                     for i in range(index, (index + len(term.compressed))):
@@ -295,7 +542,7 @@ class Splitter():
                 if not segment:
                     continue
                 if numeric_segment:
-                    term_ = self.__dictionary.find_term(segment)
+                    term_ = self.__dictionary.find_term(segment, overlay, sources)
                     if term_ is not None:
                         split = Split.from_term(term_)
                         splits.append(split)
@@ -311,7 +558,7 @@ class Splitter():
             passes.append(pass_)
 
 
-    def preserve_a1(self, passes: List[Pass]) -> None:
+    def preserve_a1(self, passes: List[Pass], overlay: Optional[Overlay] = None, sources: int = DEFAULT_SOURCES) -> None:
         """Special logic to preserve the '-' in terms like "a-1" and combine them into a single unit.
         This is intended to run after the logic that splits numeric terms.  It will combine two split terms
         ("a-" and "1") into a single unit.  The first split in the pass needs to be a single alpha character
@@ -324,7 +571,7 @@ class Splitter():
                     and (has_numbers(pass_.splits[1].text)):
                 text = pass_.splits[0].text + pass_.splits[1].text
                 splits: List[Split] = []
-                term = self.__dictionary.find_term(text)
+                term = self.__dictionary.find_term(text, overlay, sources)
                 if term is not None:
                     split = Split.from_term(term)
                     splits.append(split)
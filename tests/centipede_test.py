@@ -2,20 +2,44 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
+import gc
+import os
 import re
+import sys
+import json
+import time
+import zlib
+import queue
 import random
+import signal
+import socket
+import asyncio
+import marshal
+import subprocess
+import urllib.request
 from typing import List, Dict
-from time import sleep
+from threading import Thread, Barrier
 from splitter.dictionary import Dictionary
 from splitter.word_splitter import Splitter
 from splitter.cache import SplitCache
-from splitter.split_result import SplitResult
+from splitter.cache_snapshot import CacheSnapshot
+from splitter.shared_cache import SharedSplitCache
+from splitter.split_record import SplitRecord
+from splitter.split_pool import SplitPool
+from splitter.sources import ALL_SOURCES, DEFAULT_SOURCES
+from splitter.term import Term
+from splitter.enums import DictionarySource
+from service.response_cache import ResponseCache
+from utils.gc_manager import GcManager
+from utils.json_writer import JsonWriter
+from service import binary_format
 
 
 __words: List[List[str]] = []
 __dictionary: Dictionary = Dictionary()
-__cache: SplitCache = SplitCache(max_cache_items=1000, cleanup_secs=60.0)
+__cache: SplitCache = SplitCache(max_cache_items=1000)
 __splitter: Splitter = Splitter(dictionary=__dictionary, cache=__cache)
+__service_loaded: bool = False
 
 
 def initialize():
@@ -43,6 +67,37 @@ def load_file(filename):
                 __words.append(words)
 
 
+def make_record(input_):
+    return SplitRecord.from_result(__splitter.full_split(input_, False, 5), __dictionary, None, DEFAULT_SOURCES)
+
+
+def service_client():
+    global __service_loaded
+    from service import app, config, di, routes
+    if not __service_loaded:
+        di.dictionary.load_data(config.data_file)
+        __service_loaded = True
+    di.service_state.set_up_state()
+    return app.test_client()
+
+
+def asgi_request(method, target, body=b"", headers=None):
+    from service import asgi
+    path, _, query = target.partition("?")
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode("latin-1"),
+             "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+    asyncio.run(asgi.app(scope, receive, send))
+    response_headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in messages[0]["headers"]}
+    return messages[0]["status"], response_headers, b"".join(m.get("body", b"") for m in messages[1:])
+
+
 initialize()
 
 
@@ -83,7 +138,7 @@ def test_cache_accuracy(total_iterations=10000, target_success_percent=100.0):
             continue
 
         # store in cache
-        cache.set_item(key, SplitResult(key, value, 0.0, 0, [], 0, [], 0, True))
+        cache.set_item(key, SplitRecord(key, value, 0.0))
         cheat[key] = value
 
         # fetch from cache
@@ -112,12 +167,13 @@ def test_cache_accuracy(total_iterations=10000, target_success_percent=100.0):
 
 
 def test_cache_cleanup():
-    """Tests the accuracy of the split cache, ensuring no key collisions or
-    other issues."""
+    """Tests split cache eviction, ensuring the cache never exceeds its maximum
+    size and that frequently hit items are kept."""
     print("\nTesting split cache cleanup..")
     
     # vars
-    cache = SplitCache(max_cache_items=100, cleanup_secs=5)
+    cache = SplitCache(max_cache_items=100)
+    cache.set_item("hotkey", SplitRecord("hotkey", "hot key", 0.0))
 
     # seed random number generator
     random.seed()
@@ -142,16 +198,40 @@ def test_cache_cleanup():
             value += word
         key = value.replace(" ", "")
 
-        # store in cache
-        cache.set_item(key, SplitResult(key, value, 0.0, 0, [], 0, [], 0, True))
-    
-    # sleep, allow cleanup to occur
-    sleep(6)   
+        # store in cache, keep hot key hot
+        cache.set_item(key, SplitRecord(key, value, 0.0))
+        cache.get_item("hotkey")
+        assert cache.count <= 100
 
     # final assert
     count = cache.count
-    print(f"ITEMS IN CACHE: {count} (should be close to or exactly 90)")
-    assert (count <= 100) and (count >= 90)
+    print(f"ITEMS IN CACHE: {count} (should be exactly 100)")
+    assert count == 100
+    assert cache.get_item("hotkey") is not None
+
+
+def test_cache_eviction_order():
+    """Tests that the split cache evicts the least recently used item with the fewest hits, including after restored
+    hit counts and emptied buckets."""
+    print("\nTesting split cache eviction order..")
+
+    # vars
+    cache = SplitCache(max_cache_items=3, stripes=1)
+    cache.restore_item("a", SplitRecord("a", "a", 0.0), 5)
+    cache.restore_item("b", SplitRecord("b", "b", 0.0), 2)
+    cache.set_item("c", SplitRecord("c", "c", 0.0))
+    cache.set_item("d", SplitRecord("d", "d", 0.0))
+    cache.set_item("e", SplitRecord("e", "e", 0.0))
+    cache.get_item("e")
+    cache.get_item("e")
+    cache.set_item("f", SplitRecord("f", "f", 0.0))
+    cache.set_item("g", SplitRecord("g", "g", 0.0))
+    kept = sorted(i for i, _, _ in cache.get_hottest(10))
+    print(f" Kept: {kept}")
+
+    # final assert
+    assert kept == ["a", "e", "g"]
+    assert [hits for _, hits, _ in cache.get_hottest(10)] == [5, 3, 1]
 
 
 def test_split_accuracy(total_iterations=1000, target_success_percent=85.0):
@@ -218,3 +298,746 @@ def test_split_accuracy(total_iterations=1000, target_success_percent=85.0):
     print(f"OVERALL SUCCESS PERCENT: {success_percent} (target={target_success_percent})")
     assert success_percent >= target_success_percent
 
+
+def test_overlay():
+    """Tests that overlay terms are merged with the base dictionary only when the overlay
+    is requested, and that cached results are kept separate per overlay."""
+    print("\nTesting dictionary overlays..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=cache)
+    __dictionary.add_overlay("brands", [Term("zorblax", 0.01, 1.0, {DictionarySource.Supplemental})])
+
+    # split with and without the overlay
+    with_overlay = splitter.simple_split("thezorblax", overlay="brands")
+    without_overlay = splitter.simple_split("thezorblax")
+    print(f" With overlay: {with_overlay.output} ({with_overlay.score})")
+    print(f" Without overlay: {without_overlay.output} ({without_overlay.score})")
+
+    # final assert
+    assert with_overlay.output == "the zorblax"
+    assert with_overlay.score > without_overlay.score
+    assert cache.count == 2
+
+
+
+def test_overlay_excluded_base():
+    """Tests that an overlay term is matched when the base dictionary has the same compressed text only under
+    sources excluded by the mask."""
+    print("\nTesting overlay terms shadowing excluded base terms..")
+
+    # vars
+    splitter = Splitter(dictionary=__dictionary, cache=SplitCache(max_cache_items=1000))
+    hidden = next(t for t in __dictionary.get_terms(ALL_SOURCES) if not (t.source_mask & DEFAULT_SOURCES))
+    __dictionary.add_overlay("unhidden", [Term(hidden.full, 0.01, 1.0, {DictionarySource.Supplemental})])
+    without_overlay = __dictionary.find_matching_terms(hidden.compressed, 1)
+    with_overlay = __dictionary.find_matching_terms(hidden.compressed, 1, __dictionary.get_overlay("unhidden"))
+    result = splitter.full_split(hidden.compressed, overlay="unhidden")
+    __dictionary.remove_overlay("unhidden")
+    print(f" Hidden term: {hidden.full}, matched with overlay: {[t.full for t in with_overlay]}")
+
+    # final assert
+    assert all(t.compressed != hidden.compressed for t in without_overlay)
+    assert [t.source_mask for t in with_overlay if t.compressed == hidden.compressed] == [1 << DictionarySource.Supplemental.value]
+    assert result.term_count == 1
+
+
+def test_source_filter():
+    """Tests that terms from excluded sources are never matched, and that cached results
+    are kept separate per source filter."""
+    print("\nTesting per-request source filtering..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=cache)
+    __dictionary.add_overlay("names", [Term("quixby", 0.01, 1.0, {DictionarySource.Names})])
+    without_names = set(s for s in DictionarySource if s not in (DictionarySource.Names, DictionarySource.Adult))
+
+    # split with and without names
+    included = splitter.full_split("quixby", overlay="names")
+    excluded = splitter.full_split("quixby", overlay="names", sources=without_names)
+    print(f" Included: {included.output} ({included.score}, {included.term_count} terms)")
+    print(f" Excluded: {excluded.output} ({excluded.score}, {excluded.term_count} terms)")
+
+    # final assert
+    assert included.term_count == 1
+    assert excluded.term_count == 0
+    assert included.score > excluded.score
+    assert cache.count == 2
+    assert __dictionary.get_size() == sum(1 for t in __dictionary.get_terms(ALL_SOURCES) if t.source_mask & DEFAULT_SOURCES)
+    assert all(t.source_mask & DEFAULT_SOURCES for t in __dictionary.get_terms())
+
+
+def test_cache_byte_budget():
+    """Tests that the split cache evicts items to stay within its byte budget, and that a result too large to store
+    replaces (removes) any result stored for the same input."""
+    print("\nTesting split cache byte budget..")
+
+    # vars
+    cache = SplitCache(max_cache_items=100000, max_cache_bytes=200000)
+
+    # store full results, which vary in size
+    for line in __words[:500]:
+        input_ = "".join(line[:4])
+        cache.set_item(input_, make_record(input_))
+        assert cache.bytes_used <= 200000
+
+    # replace a stored result with one too large to store
+    small = SplitCache(max_cache_items=10, max_cache_bytes=2000, stripes=1)
+    small.set_item("oversized", SplitRecord("oversized", "over sized", 0.0))
+    small.set_item("oversized", SplitRecord("oversized", "over sized", 0.0, passes=b"x" * 4000))
+
+    # final assert
+    print(f"ITEMS IN CACHE: {cache.count}, BYTES USED: {cache.bytes_used}")
+    assert cache.count < 500
+    assert cache.bytes_used > 0
+    assert small.get_item("oversized") is None
+    assert small.count == 0 and small.bytes_used == 0
+
+
+def test_cache_snapshot(tmp_path):
+    """Tests that a split cache snapshot reloads the hottest entries with their hit counts,
+    and that a snapshot taken against other dictionary data is discarded."""
+    print("\nTesting split cache snapshots..")
+
+    # vars
+    filename = str(tmp_path / "snapshot.bin")
+    cache = SplitCache(max_cache_items=1000)
+    for line in __words[:50]:
+        input_ = "".join(line[:3])
+        cache.set_item(input_, make_record(input_))
+    cache.set_item("thehotkey", make_record("thehotkey"))
+    for _ in range(5):
+        cache.get_item("thehotkey")
+
+    # save and reload into an empty cache
+    saved = CacheSnapshot(cache, __dictionary, filename, max_items=10).save()
+    restored_cache = SplitCache(max_cache_items=1000)
+    loaded = CacheSnapshot(restored_cache, __dictionary, filename, max_items=10).load()
+    hottest = restored_cache.get_hottest(1)[0]
+    original = cache.get_item(hottest[0])
+    print(f" Saved: {saved}, loaded: {loaded}, hottest: {hottest[0]} ({hottest[1]} hits)")
+
+    # tag the snapshot with another dictionary version, and reload
+    with open(filename, "rb") as f:
+        format_version, _, entries = marshal.loads(zlib.decompress(f.read()))
+    with open(filename, "wb") as f:
+        f.write(zlib.compress(marshal.dumps((format_version, "otherversion", entries))))
+    stale = CacheSnapshot(SplitCache(max_cache_items=1000), __dictionary, filename, max_items=10).load()
+
+    # final assert
+    assert saved == 10 and loaded == 10
+    assert hottest[0] == "thehotkey"
+    assert hottest[1] == 6
+    assert hottest[2].output == original.output
+    assert hottest[2].score == original.score
+    assert hottest[2].passes == original.passes
+    assert stale == 0
+
+
+def test_shared_cache(tmp_path):
+    """Tests that a result stored through one shared cache instance is found through another,
+    as when two service processes share a cache file."""
+    print("\nTesting shared split cache..")
+
+    # vars
+    filename = str(tmp_path / "shared_cache.db")
+    writer_cache = SharedSplitCache(filename, 1000, __dictionary)
+    reader_cache = SharedSplitCache(filename, 1000, __dictionary, l1=SplitCache(max_cache_items=1000))
+    expected = make_record("thesharedkey")
+    missing = reader_cache.get_item("thesharedkey")
+    writer_cache.set_item("thesharedkey", expected)
+    result = reader_cache.get_item("thesharedkey")
+    print(f" Expected: {expected.output}, found: {result.output if result else None}")
+
+    # final assert
+    assert missing is None
+    assert result is not None
+    assert result.output == expected.output
+    assert result.score == expected.score
+    assert result.passes == expected.passes
+
+
+def test_cache_parameters():
+    """Tests that cached results are only reused for requests they can answer, and are upgraded in place."""
+    print("\nTesting parameter-aware split cache..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=cache)
+    input_ = "thequickbrownfoxjumps"
+    shallow = splitter.simple_split(input_, True, 25, 10000)
+    deep = splitter.full_split(input_, True, 5, 50, 25000)
+    deep_again = splitter.full_split(input_, True, 5, 50, 25000)
+    shallow_again = splitter.simple_split(input_, True, 25, 10000)
+    print(f" Shallow: {len(shallow.passes)} passes, deep: {len(deep.passes)} passes, cached: {deep_again.cached}")
+
+    # final assert
+    assert len(shallow.passes) == 1
+    assert not deep.cached and len(deep.passes) == min(5, deep.pass_count) and deep.pass_count > 1
+    assert deep_again.cached and len(deep_again.passes) == len(deep.passes)
+    assert shallow_again.cached and len(shallow_again.passes) == 1
+    assert shallow_again.max_terms == 50 and shallow_again.output == deep.output
+    assert cache.count == 1
+
+
+def test_split_record():
+    """Tests that a compact split record rebuilds the same passes and matched terms as the original result."""
+    print("\nTesting compact split records..")
+
+    # vars
+    inputs = ["".join(line[:4]) for line in __words[:200]] + ["abc-123", "a-1widgets", "the 80s", "route66north"]
+    mismatches = 0
+
+    # compare each rebuilt result with the original
+    for input_ in inputs:
+        original = __splitter.full_split(__splitter.canonical_input(input_), False, 5)
+        record = SplitRecord.from_result(original, __dictionary, None, DEFAULT_SOURCES)
+        rebuilt = record.to_result(__dictionary, 5, True)
+        if (rebuilt.output != original.output) or (rebuilt.score != original.score) \
+                or ([p.display_text() for p in rebuilt.passes] != [p.display_text() for p in original.passes]) \
+                or ([p.score() for p in rebuilt.passes] != [p.score() for p in original.passes]) \
+                or ([t.full for t in rebuilt.matched_terms] != [t.full for t in original.matched_terms]):
+            mismatches += 1
+            print(f" Mismatch: {input_}")
+
+    # final assert
+    print(f" Records: {len(inputs)}, mismatches: {mismatches}")
+    assert mismatches == 0
+
+
+def test_segment_cache():
+    """Tests that alpha segments left by pre-segmentation are solved once and shared across inputs."""
+    print("\nTesting segment cache..")
+
+    # vars
+    segment_cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=SplitCache(max_cache_items=1000), segment_cache=segment_cache)
+    first = splitter.simple_split("thequickbrown-fox")
+    count = segment_cache.count
+    second = splitter.simple_split("thequickbrown.fox")
+    inputs = ["filled347the", "exceptions&subject258them974desirable", "saved&easier342your265their", "xxx523walls183banks"]
+    inputs += [str(random.randint(1, 999)).join("".join(random.choice(__words)[:2]) for _ in range(3)) for _ in range(50)]
+    numbered = [(splitter.simple_split(s), __splitter.full_split(s, False)) for s in inputs]
+    print(f" First: {first.output}, second: {second.output}, segments: {segment_cache.count}, numbered: {numbered[0][0].output}")
+
+    # final assert
+    assert first.output == __splitter.full_split("thequickbrown-fox", False).output
+    assert second.output == first.output
+    assert count == 2
+    assert segment_cache.count == 2
+    assert [(a.output, a.score) for a, _ in numbered] == [(b.output, b.score) for _, b in numbered]
+
+
+def test_cache_statistics():
+    """Tests that a split counts one cache lookup, so a miss then a hit reports 50% efficiency."""
+    print("\nTesting cache statistics..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000, admission=True)
+    splitter = Splitter(dictionary=__dictionary, cache=cache)
+    splitter.full_split("thisisatest")
+    splitter.full_split("thisisatest")
+    writer = JsonWriter()
+    writer.write_start_object()
+    cache.write_runtime_statistics(writer)
+    writer.write_end_object()
+    stats = json.loads(writer.to_string())["splitCache"]
+    print(f" Stats: {stats}")
+
+    # final assert
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["efficiencyPercent"] == 50.0
+    assert cache.peek("thisisatest") is not None and cache.peek("nothere") is None
+    writer = JsonWriter()
+    writer.write_start_object()
+    cache.write_runtime_statistics(writer)
+    writer.write_end_object()
+    assert json.loads(writer.to_string())["splitCache"] == stats
+
+
+def test_coalescing():
+    """Tests that concurrent cache misses for the same input run the split logic only once."""
+    print("\nTesting single-flight coalescing..")
+
+    class CountingSplitter(Splitter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.calls = 0
+
+        def split_logic(self, *args, **kwargs):
+            self.calls += 1
+            time.sleep(0.2)
+            return super().split_logic(*args, **kwargs)
+
+    # vars
+    splitter = CountingSplitter(dictionary=__dictionary, cache=SplitCache(max_cache_items=1000))
+    barrier = Barrier(8)
+    outputs: List[str] = []
+
+    def worker():
+        barrier.wait()
+        outputs.append(splitter.simple_split("thequickbrownfoxjumpsoverthelazydog").output)
+
+    threads = [Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f" Split logic calls: {splitter.calls}, outputs: {len(set(outputs))}")
+
+    # final assert
+    assert splitter.calls == 1
+    assert len(outputs) == 8 and len(set(outputs)) == 1
+
+
+def test_cache_admission():
+    """Tests that a full cache with admission enabled rejects one-off keys but admits keys requested repeatedly."""
+    print("\nTesting cache admission..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000, stripes=1, admission=True)
+    for i in range(1000):
+        cache.get_item(f"scan{i}")
+        cache.set_item(f"scan{i}", SplitRecord(f"scan{i}", "scan", 0.0))
+
+    # a one-off key, then a repeated key
+    cache.get_item("oneoff")
+    cache.set_item("oneoff", SplitRecord("oneoff", "one off", 0.0))
+    for _ in range(3):
+        cache.get_item("repeated")
+    cache.set_item("repeated", SplitRecord("repeated", "re peated", 0.0))
+    print(f" One-off cached: {cache.get_item('oneoff') is not None}, repeated cached: {cache.get_item('repeated') is not None}")
+
+    # a bulk split that doesn't admit new results, to either cache
+    segment_cache = SplitCache(max_cache_items=1000)
+    split_cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=split_cache, segment_cache=segment_cache)
+    bulk = splitter.full_split("thequickbrown-fox", admit=False)
+    print(f" Bulk: {bulk.output}, split cache: {split_cache.count}, segment cache: {segment_cache.count}")
+
+    # final assert
+    assert cache.get_item("oneoff") is None
+    assert cache.get_item("repeated") is not None
+    assert cache.count == 1000
+    assert bulk.output == __splitter.full_split("thequickbrown-fox", False).output
+    assert split_cache.count == 0
+    assert segment_cache.count == 0
+
+
+def test_canonical_keys():
+    """Tests that inputs differing only in punctuation share a cache entry, while reporting their own input."""
+    print("\nTesting canonical cache keys..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=cache)
+    results = [splitter.simple_split(s) for s in ["Quick-Brown", "quick_brown", "quick.brown", " quick  brown "]]
+    for r in results:
+        print(f" Input: {r.input}, output: {r.output}, cached: {r.cached}")
+
+    # final assert
+    assert [r.input for r in results] == ["quick-brown", "quick_brown", "quick.brown", "quick  brown"]
+    assert len(set(r.output for r in results)) == 1
+    assert [r.cached for r in results] == [False, True, True, True]
+    assert cache.count == 1
+    assert splitter.canonical_input("a-1widgets") == "a-1widgets"
+
+
+def test_response_cache():
+    """Tests that the response cache returns stored bytes with a stable ETag, evicts least recently used, and treats
+    responses older than the maximum age as misses."""
+    print("\nTesting response cache..")
+
+    # vars
+    cache = ResponseCache(max_items=2)
+    etag = cache.set_item("a", b"first")
+    cache.set_item("b", b"second")
+    cache.get_item("a")
+    cache.set_item("c", b"third")
+
+    expiring = ResponseCache(max_items=2, max_age_secs=0.05)
+    expiring.set_item("a", b"first")
+    fresh = expiring.get_item("a")
+    time.sleep(0.1)
+    expired = expiring.get_item("a")
+    print(f" Count: {cache.count}, bytes: {cache.bytes_used}, expired: {expired}")
+
+    # final assert
+    assert cache.get_item("a") == (b"first", etag)
+    assert etag == ResponseCache.make_etag(b"first")
+    assert cache.get_item("b") is None
+    assert cache.count == 2
+    assert cache.bytes_used == len(b"first") + len(b"third")
+    assert fresh == (b"first", etag)
+    assert expired is None
+    assert expiring.count == 0 and expiring.bytes_used == 0
+
+
+def test_split_pool():
+    """Tests that a batch split by pool worker processes matches in-process splits, in order, and is cached."""
+    print("\nTesting split pool..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=cache)
+    pool = SplitPool(splitter=splitter, dictionary=__dictionary, processes=2, threshold=1, chunk_size=4)
+    inputs = ["".join(random.choice(__words)[:3]) for _ in range(40)]
+    expected = [__splitter.simple_split(s, cache=False).output for s in inputs]
+    pool.start()
+    try:
+        outputs = [r.output for r in pool.split([(s, True, 1, 25, 10000, None, None, True, 0.0) for s in inputs])]
+        cached = [r.cached for r in pool.split([(s, True, 1, 25, 10000, None, None, True, 0.0) for s in inputs])]
+    finally:
+        pool.stop()
+    print(f" Matching: {sum(1 for a, b in zip(outputs, expected) if a == b)} of {len(inputs)}")
+
+    # final assert
+    assert outputs == expected
+    assert all(cached)
+
+
+def test_binary_format():
+    """Tests that binary response records are length-prefixed and typed, and request records decode to inputs."""
+    print("\nTesting binary format..")
+
+    # vars
+    record = binary_format.write_record(binary_format.RESULT, ["ab", 1.5, 7, [("c d", 2.0)]])
+    body = b"".join(len(s).to_bytes(4, "big") + s for s in ["thisisatest".encode("utf-8"), "café".encode("utf-8"), b""])
+    print(f" Record: {record}")
+
+    # final assert
+    assert record == (b"\x00\x00\x00\x26\x00" + b"\x00\x00\x00\x02ab" + b"\x3f\xf8" + b"\x00" * 6 + b"\x00\x00\x00\x07" +
+                      b"\x00\x00\x00\x01" + b"\x00\x00\x00\x03c d" + b"\x40" + b"\x00" * 7)
+    assert binary_format.read_inputs(body) == ["thisisatest", "café", ""]
+    try:
+        binary_format.read_inputs(body + b"\x00\x00\x00\x09abc")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_deadline():
+    """Tests that a split past its deadline returns the best pass found so far, flagged and not cached."""
+    print("\nTesting split deadline..")
+
+    # vars
+    cache = SplitCache(max_cache_items=1000)
+    splitter = Splitter(dictionary=__dictionary, cache=cache)
+    input_ = "".join("".join(random.choice(__words)) for _ in range(6))
+    late = splitter.full_split(input_, deadline=time.monotonic() - 1.0)
+    full = splitter.full_split(input_)
+    print(f" Late: {late.output} ({late.pass_count} passes), full: {full.output} ({full.pass_count} passes)")
+
+    # final assert
+    assert late.deadline_hit and (not full.deadline_hit)
+    assert late.pass_count <= full.pass_count
+    assert late.output.replace(" ", "") == input_.replace(" ", "")
+    assert (not full.cached) and splitter.full_split(input_).cached
+
+
+def test_gc_manager(monkeypatch):
+    """Tests that the GC manager freezes loaded objects, applies thresholds and records pauses until stopped, and that
+    a failed service load leaves the collector enabled."""
+    print("\nTesting GC manager..")
+    from service import di
+    from service import startup
+
+    # vars
+    thresholds = gc.get_threshold()
+    callbacks = len(gc.callbacks)
+    manager = GcManager(threshold0=1234, threshold1=5, threshold2=6)
+    unregistered = len(gc.callbacks) == callbacks
+    try:
+        manager.disable()
+        disabled = not gc.isenabled()
+        manager.freeze()
+        frozen = gc.get_freeze_count()
+        gc.collect()
+        writer = JsonWriter()
+        writer.write_start_object()
+        manager.write_runtime_statistics(writer)
+        writer.write_end_object()
+        stats = json.loads(writer.to_string())["garbageCollector"]
+        print(f" Frozen: {frozen}, stats: {stats}")
+
+        def fail(*args, **kwargs):
+            raise IOError("Load failed.")
+        monkeypatch.setattr(di.dictionary, "load_data", fail)
+        failed = False
+        try:
+            startup.initialize(background=False)
+        except IOError:
+            failed = True
+        enabled_after_failure = gc.isenabled()
+    finally:
+        manager.stop()
+        gc.unfreeze()
+        gc.set_threshold(*thresholds)
+        gc.enable()
+    stopped = len(gc.callbacks) == callbacks
+
+    # final assert
+    assert disabled and (frozen > 0)
+    assert stats["enabled"] == "1" and stats["thresholds"] == "1234, 5, 6"
+    assert stats["generations"][2]["pauses"] >= 1
+    assert failed and enabled_after_failure
+    assert unregistered and stopped
+
+
+def test_bulk_post(monkeypatch):
+    """Tests that the POST endpoint splits JSON array and NDJSON bodies in order, keeps commas within inputs, applies
+    per-item options over the query string, and enforces the bulk limits."""
+    print("\nTesting bulk POST..")
+    from service import config
+
+    # vars
+    client = service_client()
+    array = client.post("/wordsplit?pretty=0", data=json.dumps(["thisisatest", "one,two", "somewordstosplit"]),
+                        content_type="application/json").get_json()
+    ndjson = client.post("/wordsplit", data='"thisisatest"\n\n"one,two"\n"somewordstosplit"\n',
+                         content_type="application/x-ndjson").get_json()
+    items = client.post("/wordsplit?verbosity=2&passdisplay=1", data=json.dumps(["thisisatest", {"input": "thisisatest", "passdisplay": 3}]),
+                        content_type="application/json").get_json()
+    monkeypatch.setattr(config, "bulk_max_items", 2)
+    too_many = client.post("/wordsplit", data=json.dumps(["a", "b", "c"]), content_type="application/json").get_json()
+    monkeypatch.setattr(config, "bulk_max_body_bytes", 16)
+    too_large = client.post("/wordsplit", data=json.dumps(["thisisatest", "again"]), content_type="application/json").get_json()
+    print(f" Array: {[r['output'] for r in array['output']]}, passes: {[len(r['passes']) for r in items['output']]}")
+
+    # final assert
+    assert [r["output"] for r in array["output"]] == [__splitter.simple_split(s, cache=False).output for s in ["thisisatest", "one,two", "somewordstosplit"]]
+    assert array["output"][1]["output"] == "one two"
+    assert [r["input"] for r in array["output"]] == ["thisisatest", "one,two", "somewordstosplit"]
+    assert ndjson["output"] == array["output"] and (not array["errors"])
+    assert [len(r["passes"]) for r in items["output"]] == [1, 3]
+    assert ("output" not in too_many) and ("limit of 2" in too_many["errors"][0]["args"][0])
+    assert ("output" not in too_large) and ("limit of 16 bytes" in too_large["errors"][0]["args"][0])
+
+
+def test_streamed_outputs(monkeypatch):
+    """Tests that text and NDJSON outputs stream one line per input in order, and that a stream cut short by an error
+    ends with an errors line (NDJSON) or an error marker line (text)."""
+    print("\nTesting streamed outputs..")
+    from service import di
+
+    # vars
+    client = service_client()
+    inputs = ["thisisatest", "somewordstosplit", "onceuponatime"]
+    expected = [__splitter.simple_split(s, cache=False).output for s in inputs]
+    text = client.get("/wordsplit?output=text&cache=0&input=" + ",".join(inputs))
+    ndjson = client.get("/wordsplit?output=ndjson&cache=0&input=" + ",".join(inputs))
+    split = di.split_pool.split
+
+    def fail(requests, errors=None):
+        yield next(split(requests, errors))
+        raise RuntimeError("Split failed.")
+    monkeypatch.setattr(di.split_pool, "split", fail)
+    failed_text = client.get("/wordsplit?output=text&cache=0&input=" + ",".join(inputs)).get_data(as_text=True).splitlines()
+    failed_ndjson = [json.loads(line) for line in client.get("/wordsplit?output=ndjson&cache=0&input=" + ",".join(inputs)).get_data(as_text=True).splitlines()]
+    print(f" Text: {text.get_data(as_text=True).splitlines()}, failed text: {failed_text}")
+
+    # final assert
+    assert text.mimetype == "text/plain" and ndjson.mimetype == "application/x-ndjson"
+    assert text.get_data(as_text=True).splitlines() == expected
+    assert [json.loads(line)["output"] for line in ndjson.get_data(as_text=True).splitlines()] == expected
+    assert failed_text[0] == expected[0] and len(failed_text) == 2
+    assert json.loads(failed_text[1][len("#error "):]) == {"errors": [{"args": ["Split failed."]}]}
+    assert failed_ndjson[0]["output"] == expected[0] and failed_ndjson[1] == {"errors": [{"args": ["Split failed."]}]}
+
+
+def test_flask_routes():
+    """Tests the Flask routes: GET and POST splits, and response caching with ETags answered by 304 Not Modified."""
+    print("\nTesting Flask routes..")
+
+    # vars
+    client = service_client()
+    ping = client.get("/ping").get_data(as_text=True)
+    first = client.get("/wordsplit?input=thisisatest,somewordstosplit")
+    second = client.get("/wordsplit?input=thisisatest,somewordstosplit")
+    not_modified = client.get("/wordsplit?input=thisisatest,somewordstosplit", headers={"If-None-Match": first.headers["ETag"]})
+    uncached = client.get("/wordsplit?input=thisisatest,somewordstosplit&cache=0")
+    posted = client.post("/wordsplit", data=json.dumps(["thisisatest", "somewordstosplit"]), content_type="application/json")
+    tsv = client.get("/wordsplit?output=tsv&verbosity=1&input=thisisatest").get_data(as_text=True).splitlines()
+    print(f" Ping: {ping}, ETag: {first.headers['ETag']}, not modified: {not_modified.status_code}, TSV: {tsv}")
+
+    # final assert
+    assert ping == "Up"
+    assert first.status_code == 200 and first.mimetype == "application/json"
+    assert [r["output"] for r in first.get_json()["output"]] == [__splitter.simple_split(s, cache=False).output for s in ["thisisatest", "somewordstosplit"]]
+    assert second.get_data() == first.get_data() and second.headers["ETag"] == first.headers["ETag"]
+    assert not_modified.status_code == 304 and (not not_modified.get_data())
+    assert "ETag" not in uncached.headers and "ETag" not in posted.headers
+    assert posted.get_json()["output"] == first.get_json()["output"]
+    assert tsv[0].split("\t") == ["input", "output", "score", "termCount", "passCount", "elapsedMS", "truncated"]
+    assert tsv[1].split("\t")[:2] == ["thisisatest", first.get_json()["output"][0]["output"]]
+
+
+def test_response_cache_keys():
+    """Tests that responses aren't stored when cache admission is disabled, and that a reloaded overlay of the same
+    name isn't answered with responses cached for its previous content."""
+    print("\nTesting response cache keys..")
+
+    # vars
+    from service import di
+    client = service_client()
+    count = di.response_cache.count
+    unadmitted = client.get("/wordsplit?input=neveradmitted&cacheadmit=0")
+    unadmitted_count = di.response_cache.count
+    di.dictionary.add_overlay("reloaded", [Term("zorblax", 0.01, 1.0, {DictionarySource.Supplemental})])
+    before = client.get("/wordsplit?input=thezorblax&overlay=reloaded")
+    di.dictionary.add_overlay("reloaded", [Term("quuxle", 0.01, 1.0, {DictionarySource.Supplemental})])
+    after = client.get("/wordsplit?input=thezorblax&overlay=reloaded")
+    di.dictionary.remove_overlay("reloaded")
+    print(f" Score before reload: {before.get_json()['output'][0]['score']}, after: {after.get_json()['output'][0]['score']}")
+
+    # final assert
+    assert unadmitted.status_code == 200 and "ETag" not in unadmitted.headers
+    assert unadmitted_count == count
+    assert before.get_json()["output"][0]["output"] == "the zorblax"
+    assert after.get_json()["output"][0]["score"] < before.get_json()["output"][0]["score"]
+    assert after.headers["ETag"] != before.headers["ETag"]
+
+
+def test_asgi_app(monkeypatch):
+    """Tests the ASGI app, driven in-process: GET and POST splits matching the Flask routes, ETags and 304 Not
+    Modified, streamed outputs, and unknown routes and methods."""
+    print("\nTesting ASGI app..")
+    from service import asgi
+
+    # vars
+    client = service_client()
+    monkeypatch.setattr(asgi, "__initialized", True)
+    flask = client.get("/wordsplit?input=onceuponatime,thisisatest&verbosity=1")
+    status, headers, body = asgi_request("GET", "/wordsplit?input=onceuponatime,thisisatest&verbosity=1")
+    not_modified = asgi_request("GET", "/wordsplit?input=onceuponatime,thisisatest&verbosity=1", headers={"If-None-Match": headers["etag"]})
+    posted = asgi_request("POST", "/wordsplit?output=ndjson", b'"onceuponatime"\n{"input": "thisisatest"}\n', {"Content-Type": "application/x-ndjson"})
+    text = asgi_request("GET", "/wordsplit?output=text&input=onceuponatime,thisisatest")
+    binary = asgi_request("GET", "/wordsplit?output=binary&input=onceuponatime,thisisatest")
+    head = asgi_request("HEAD", "/wordsplit?output=text&input=onceuponatime")
+    print(f" Status: {status}, ETag: {headers['etag']}, not modified: {not_modified[0]}, text: {text[2]}")
+
+    # final assert
+    assert status == 200 and headers["content-type"] == "application/json"
+    assert body == flask.get_data() and headers["etag"] == flask.headers["ETag"]
+    assert not_modified[0] == 304 and (not not_modified[2])
+    expected = [r["output"] for r in flask.get_json()["output"]]
+    assert posted[0] == 200 and [json.loads(line)["output"] for line in posted[2].decode("utf-8").splitlines()] == expected
+    assert text[1]["content-type"] == "text/plain; charset=utf-8" and text[2].decode("utf-8").splitlines() == expected
+    assert binary[1]["content-type"] == binary_format.MIMETYPE
+    assert binary[2][4] == binary_format.RESULT and binary[2][5:22] == b"\x00\x00\x00\x0donceuponatime"
+    assert head[0] == 200 and (not head[2])
+    assert asgi_request("GET", "/nowhere")[0] == 404 and asgi_request("POST", "/ping")[0] == 405
+
+
+def test_prefork_recycling(tmp_path):
+    """Tests that the pre-fork master forks a worker that serves requests, replaces it once it reaches its maximum
+    requests, and stops gracefully on SIGTERM."""
+    print("\nTesting pre-fork worker recycling..")
+
+    # vars
+    with open("config.yml") as fi, open(tmp_path / "config.yml", "w") as fo:
+        settings = fi.read().replace("./dictionary.txt", os.path.abspath("dictionary.txt")).replace("./cache_snapshot.bin", "\"\"")
+        fo.write(settings)
+    with open("version") as fi, open(tmp_path / "version", "w") as fo:
+        fo.write(fi.read())
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    master = subprocess.Popen([sys.executable, "-u", "-c", f"from service.prefork import PreforkServer; PreforkServer('127.0.0.1', {port}, 1, 3).run()"],
+                              cwd=tmp_path, env=dict(os.environ, PYTHONPATH=os.getcwd()), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    lines: queue.Queue = queue.Queue()
+
+    def read_lines():
+        for line in master.stdout:
+            lines.put(line)
+    Thread(target=read_lines, daemon=True).start()
+
+    def next_worker():
+        while True:
+            match = re.search(r"Worker (\d+) \(slot 0\) serving", lines.get(timeout=30))
+            if match:
+                return int(match.group(1))
+
+    try:
+        first = next_worker()
+        pings = [urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=10).read() for _ in range(3)]
+        second = next_worker()
+        after = urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=10).read()
+        master.send_signal(signal.SIGTERM)
+        code = master.wait(timeout=30)
+    finally:
+        if master.poll() is None:
+            master.kill()
+    print(f" Workers: {first}, {second}, pings: {pings + [after]}, exit code: {code}")
+
+    # final assert
+    assert first != second
+    assert pings == [b"Up"] * 3 and after == b"Up"
+    assert code == 0
+
+
+def test_json_round_trip(monkeypatch):
+    """Tests that 'wordsplit' and error responses parse back to the values written, with quotes and backslashes in
+    inputs and error args, indented or compact, using orjson (if installed) or the standard json module."""
+    print("\nTesting JSON round trip..")
+    from service import command_writer
+    from service.command_writer import VerbosityLevel
+    from utils import json_writer
+
+    # vars
+    inputs = ['say"hello"world', "back\\slash\\", "tab\tquote\"end"]
+    results = [__splitter.full_split(s, False, 5) for s in inputs]
+    documents = []
+    for orjson in ([json_writer.orjson, None] if json_writer.orjson is not None else [None]):
+        monkeypatch.setattr(json_writer, "orjson", orjson)
+        for pretty in (True, False):
+            documents.append((json.loads(command_writer.word_split(VerbosityLevel.High, inputs, 5, False, None, None, results, 12,
+                                                                   [ValueError('bad "value"', "c:\\path", 7)], pretty)),
+                              json.loads(command_writer.error([ValueError('x"y', "z\\w"), KeyError("key")], "wordsplit", pretty))))
+    print(f" Documents: {len(documents)}, inputs: {documents[0][0]['input']['input']}")
+
+    # final assert
+    for split, error in documents:
+        assert split["input"]["input"] == ", ".join(inputs)
+        assert [r["input"] for r in split["output"]] == [r.input for r in results]
+        assert [r["output"] for r in split["output"]] == [r.output for r in results]
+        assert [len(r["passes"]) for r in split["output"]] == [len(r.passes) for r in results]
+        assert split["errors"] == [{"args": ['bad "value"', "c:\\path", 7]}]
+        assert split["info"]["elapsedMs"] == 12
+        assert error["info"]["command"] == "wordsplit"
+        assert error["errors"] == [{"args": ['x"y', "z\\w"]}, {"args": ["key"]}]
+    assert all(d == documents[0] for d in documents)
+
+
+def test_request_deadlines(monkeypatch):
+    """Tests through the request handlers that each input's deadline counts from the start of its own split, and that
+    results cut short by their deadline are reported as truncated at Low verbosity and in text output."""
+    print("\nTesting request deadlines..")
+    from service import di
+
+    # vars
+    client = service_client()
+    full_split = di.word_splitter.full_split
+    remaining: List[float] = []
+
+    def slow_split(*args):
+        remaining.append(args[9] - time.monotonic())
+        time.sleep(0.03)
+        return full_split(*args)
+    monkeypatch.setattr(di.word_splitter, "full_split", slow_split)
+    inputs = ["thisisatest", "somewordstosplit", "onceuponatime", "thequickbrownfox", "bestbuydeals"]
+    batch = client.post("/wordsplit?timeout=100&cache=0", data=json.dumps(inputs), content_type="application/json").get_json()
+    batch_remaining = list(remaining)
+    low = client.get("/wordsplit?timeout=10&cache=0&input=thisisatest").get_json()
+    text = client.get("/wordsplit?timeout=10&cache=0&output=text&input=thisisatest").get_data(as_text=True)
+    tsv = client.get("/wordsplit?timeout=10&cache=0&output=tsv&input=thisisatest").get_data(as_text=True).splitlines()
+    print(f" Remaining: {[round(r, 3) for r in batch_remaining]}, low: {low['output']}, text: {text!r}")
+
+    # final assert
+    assert len(batch_remaining) == len(inputs) and min(batch_remaining) > 0.05
+    assert all("truncated" not in r for r in batch["output"])
+    assert low["output"][0]["truncated"] is True
+    assert text == low["output"][0]["output"] + "\ttruncated\n"
+    assert tsv[0] == "input\toutput\tscore\ttruncated" and tsv[1].endswith("\t1")
@@ -21,7 +21,7 @@ def initialize():
     global __splitter
 
     __dictionary = Dictionary()
-    __cache = SplitCache(max_cache_items=1000, cleanup_secs=60.0)
+    __cache = SplitCache(max_cache_items=1000)
     __splitter = Splitter(dictionary=__dictionary, cache=__cache)
     __dictionary.load_data("dictionary.txt")
 
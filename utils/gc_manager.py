@@ -0,0 +1,93 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import gc
+import time
+from typing import List, Dict, Any
+from utils.json_writer import JsonWriter
+
+
+class GcManager:
+    """Manages the cyclic garbage collector.  The loaded dictionary holds millions of long-lived objects that
+    every full collection would otherwise walk, so once loading is complete they are moved into the permanent
+    generation.  Generation thresholds are tuned for the short-lived Pass/Split objects created per request,
+    and the duration of every collection after freezing is recorded for reporting."""
+
+    def __init__(self, threshold0: int = 50000, threshold1: int = 20, threshold2: int = 100) -> None:
+        """Class constructor."""
+        self.__threshold0: int = threshold0
+        self.__threshold1: int = threshold1
+        self.__threshold2: int = threshold2
+        self.__start: float = -1.0
+        self.__counts: List[int] = [0, 0, 0]
+        self.__collected: List[int] = [0, 0, 0]
+        self.__elapsed_sum: List[float] = [0.0, 0.0, 0.0]
+        self.__elapsed_max: List[float] = [0.0, 0.0, 0.0]
+
+    def apply_thresholds(self) -> None:
+        """Sets the configured collection thresholds."""
+        gc.set_threshold(self.__threshold0, self.__threshold1, self.__threshold2)
+
+    def disable(self) -> None:
+        """Disables automatic collection, used while bulk-loading data that contains no garbage cycles."""
+        gc.disable()
+
+    def enable(self) -> None:
+        """Re-enables automatic collection without freezing, such as when loading fails."""
+        self.apply_thresholds()
+        gc.enable()
+
+    def freeze(self) -> None:
+        """Collects once, then moves every surviving object into the permanent generation so future collections
+        ignore them.  Re-enables automatic collection, and starts recording collections.  Call after the dictionary
+        has finished loading."""
+        gc.collect()
+        gc.freeze()
+        self.apply_thresholds()
+        gc.enable()
+        if self.__callback not in gc.callbacks:
+            gc.callbacks.append(self.__callback)
+
+    def stop(self) -> None:
+        """Stops recording collections, removing the interpreter callback."""
+        if self.__callback in gc.callbacks:
+            gc.callbacks.remove(self.__callback)
+
+    def __callback(self, phase: str, info: Dict[str, Any]) -> None:
+        """Invoked by the interpreter before and after each collection.  Must not allocate heavily or take locks,
+        since it runs on whichever thread triggered the collection."""
+        if phase == "start":
+            self.__start = time.perf_counter()
+        elif (phase == "stop") and (self.__start != -1.0):
+            elapsed = (time.perf_counter() - self.__start) * 1000.0
+            self.__start = -1.0
+            generation = info["generation"]
+            self.__counts[generation] += 1
+            self.__collected[generation] += info["collected"]
+            self.__elapsed_sum[generation] += elapsed
+            if elapsed > self.__elapsed_max[generation]:
+                self.__elapsed_max[generation] = elapsed
+
+    def write_runtime_statistics(self, writer: JsonWriter) -> None:
+        """Writes runtime statistics."""
+        counts = list(self.__counts)
+        collected = list(self.__collected)
+        elapsed_sum = list(self.__elapsed_sum)
+        elapsed_max = list(self.__elapsed_max)
+        writer.write_start_object("garbageCollector")
+        writer.write_property_value("enabled", "1" if gc.isenabled() else "0")
+        writer.write_property_value("thresholds", ", ".join(str(t) for t in gc.get_threshold()))
+        writer.write_property_value("frozenObjects", gc.get_freeze_count())
+        writer.write_start_array("generations")
+        for i in range(3):
+            writer.write_start_object()
+            writer.write_property_value("generation", i)
+            writer.write_property_value("pauses", counts[i])
+            writer.write_property_value("collected", collected[i])
+            writer.write_property_value("pauseMsSum", round(elapsed_sum[i], 1))
+            writer.write_property_value("pauseMsAvg", round(elapsed_sum[i] / counts[i], 2) if counts[i] > 0 else 0.0)
+            writer.write_property_value("pauseMsMax", round(elapsed_max[i], 1))
+            writer.write_end_object()
+        writer.write_end_array()
+        writer.write_end_object()
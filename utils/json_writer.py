@@ -2,91 +2,84 @@
 Copyright (C) 2019-2020  John Hyland
 GNU GENERAL PUBLIC LICENSE Version 3"""
 
+import json
+from types import ModuleType
+from typing import Any, List, Optional, Union
+
+# the optional 'orjson' package, if installed
+orjson: Optional[ModuleType]
+try:
+    import orjson as _orjson
+    orjson = _orjson
+except ImportError:
+    orjson = None
+
+
 class JsonWriter:
-    """Simple JSON text writer, used for manual creation of a JSON string."""
+    """JSON writer, used for manual creation of a JSON string.  Nodes are written one at a time into native dicts and
+    lists, which are encoded once by to_string (using the optional 'orjson' package if installed, or the standard json
+    module), so values are escaped correctly and large documents are written in linear time.  Output is indented two
+    spaces, or compact (without whitespace) if pretty is false."""
 
-    def __init__(self) -> None:
+    def __init__(self, pretty: bool = True) -> None:
         """Class constructor."""
-        self.__json = ""
-        self.__level = 0
-        self.__last_end_level = -1
+        self.__pretty: bool = pretty
+        self.__root: Any = None
+        self.__stack: List[Union[dict, list]] = []
 
     def __repr__(self):
         """Print and debug display."""
-        return self.__json
+        return self.to_string()
 
-    def write_start_object(self, name=None):
+    def write_start_object(self, name: Optional[str] = None) -> None:
         """Writes object start, with optional name."""
-        if name is None:
-            self.__json += self.__comma__() + "\n" + self.__indent__() + "{"
-            self.__in_level__()
-        else:
-            self.__json += self.__comma__() + "\n" + self.__indent__() + "\"" + name + "\": {"
-            self.__in_level__()
+        self.__start(name, {})
 
-    def write_end_object(self):
+    def write_end_object(self) -> None:
         """Writes object end."""
-        self.__out_level__()
-        self.__last_end_level = self.__level
-        self.__json += "\n" + self.__indent__() + "}"
+        self.__stack.pop()
 
-    def write_start_array(self, name=None):
+    def write_start_array(self, name: Optional[str] = None) -> None:
         """Writes array start, with optional name."""
-        if name is None:
-            self.__json += self.__comma__() + "\n" + self.__indent__() + "["
-            self.__in_level__()
-        else:
-            self.__json += self.__comma__() + "\n" + self.__indent__() + "\"" + name + "\": ["
-            self.__in_level__()
+        self.__start(name, [])
 
-    def write_end_array(self):
+    def write_end_array(self) -> None:
         """Writes array end."""
-        self.__out_level__()
-        self.__last_end_level = self.__level
-        self.__json += "\n" + self.__indent__() + "]"
+        self.__stack.pop()
 
-    def write_property_value(self, name, value):
-        """Writes a simple property object with a name and value."""
-        self.__json += self.__comma__() + "\n" + self.__indent__() + "\"" + name + "\": " + self.__write_value(value)
-        self.__last_end_level = self.__level
+    def write_property_value(self, name: str, value: Any) -> None:
+        """Writes a property of the current object, with a name and value.  The value may be a simple value, or a
+        list or dict of values."""
+        self.__add(name, value)
 
-    def write_value(self, value):
-        """Writes a value at current location.  Performs limited type checking (adds quotes around strings),
-        might need more logic for advanced data-types."""
-        self.__json += self.__write_value(value)
+    def write_value(self, value: Any) -> None:
+        """Writes a value to the current array.  The value may be a simple value, or a list or dict of values."""
+        self.__add(None, value)
 
-    def to_string(self):
+    def to_string(self) -> str:
         """Returns the rendered JSON string."""
-        return self.__json.strip()
+        return JsonWriter.encode(self.__root, self.__pretty) if self.__root is not None else ""
 
-    def __indent__(self):
-        """Returns correct number of intent spaces."""
-        ind = ""
-        for _ in range(self.__level):
-            ind += "  "
-        return ind
-
-    def __comma__(self):
-        """Writes a comma if one is needed."""
-        if self.__level == self.__last_end_level:
-            return ","
-        return ""
-
-    def __in_level__(self):
-        """Increments level by one."""
-        self.__level += 1
+    @staticmethod
+    def encode(value: Any, pretty: bool = False) -> str:
+        """Encodes a value (of native types) as JSON, indented or compact.  Values of other types are written as
+        strings."""
+        if orjson is not None:
+            return orjson.dumps(value, default=str, option=orjson.OPT_INDENT_2 if pretty else 0).decode("utf-8")
+        if pretty:
+            return json.dumps(value, default=str, ensure_ascii=False, indent=2)
+        return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
 
-    def __out_level__(self):
-        """Decrements level by one."""
-        self.__level -= 1
+    def __start(self, name: Optional[str], node: Union[dict, list]) -> None:
+        """Adds a new object or array node and makes it current."""
+        self.__add(name, node)
+        self.__stack.append(node)
 
-    @staticmethod
-    def __write_value(value):
-        """Writes a single value, with correct output for different value types."""
-        val = ""
-        if isinstance(value, str):
-            val += "\""
-        val += str(value)
-        if isinstance(value, str):
-            val += "\""
-        return val
+    def __add(self, name: Optional[str], value: Any) -> None:
+        """Adds a value to the current node, by name if it's an object, or as the root if there's none."""
+        if not self.__stack:
+            self.__root = value
+        elif isinstance(self.__stack[-1], list):
+            self.__stack[-1].append(value)
+        else:
+            self.__stack[-1][name] = value
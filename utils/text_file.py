@@ -0,0 +1,66 @@
+"""PyCentipede - A Python-based word splitter
+Copyright (C) 2019-2020  John Hyland
+GNU GENERAL PUBLIC LICENSE Version 3"""
+
+import io
+import os
+import re
+import bz2
+import gzip
+import lzma
+from typing import Optional, TextIO
+
+
+__line_count_pattern = re.compile(r"^#\s*line_count\s*[:=]\s*(\d+)")
+
+
+def is_compressed(filename: str) -> bool:
+    """
+    Returns true if the filename has an extension of a supported compression format (.gz, .bz2, .xz, .zst).
+    :param filename: The file name or path.
+    :return: True if the file will be decompressed when opened.
+    """
+    return filename.lower().endswith((".gz", ".bz2", ".xz", ".zst"))
+
+
+def open_text(filename: str) -> TextIO:
+    """
+    Opens a UTF-8 text file for reading, decompressing it in streaming mode if the extension is .gz, .bz2,
+    .xz or .zst.  Zstandard support requires the optional 'zstandard' package.
+    :param filename: The file name or path.
+    :return: A text stream, to be read line by line.
+    """
+    lower = filename.lower()
+    if lower.endswith(".gz"):
+        return gzip.open(filename, "rt", encoding="utf-8")
+    if lower.endswith(".bz2"):
+        return bz2.open(filename, "rt", encoding="utf-8")
+    if lower.endswith(".xz"):
+        return lzma.open(filename, "rt", encoding="utf-8")
+    if lower.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("The 'zstandard' package is required to read .zst files.")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(filename, "rt", encoding="utf-8")
+
+
+def read_line_count(filename: str) -> Optional[int]:
+    """
+    Returns the line count stored alongside a file, without reading the whole file.  The count is read from a
+    sidecar file with '.lines' appended to the name, or from a '# line_count: N' header on the first line.
+    :param filename: The file name or path.
+    :return: The stored line count, or None if neither is present.
+    """
+    sidecar = filename + ".lines"
+    if os.path.isfile(sidecar):
+        with open(sidecar, "rt") as f:
+            return int(f.read().strip())
+    with open_text(filename) as f:
+        first_line = f.readline()
+    match = __line_count_pattern.match(first_line)
+    if match:
+        return int(match.group(1))
+    return None